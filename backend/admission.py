@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Per-request replacement for the inference executor (profiled requests run their
+# blocking work on their own profiled thread); None = the shared executor
+EXECUTOR_OVERRIDE = contextvars.ContextVar("admission_executor_override", default=None)
+
+
+class Overloaded(Exception):
+    """Request rejected by admission control"""
+
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class AdmissionController:
+    """
+    Bounded concurrency and wait queue for CPU-heavy request work.
+
+    At most `max_concurrency` requests hold a slot at a time; up to
+    `max_queue` more may wait for one. Anything beyond that is rejected
+    immediately (429), and a request that waits longer than
+    `queue_timeout_s` is rejected as well (503), both with a Retry-After
+    hint. Blocking work is run on a dedicated, sized thread pool so the
+    event loop stays free for health checks and I/O.
+    """
+
+    def __init__(self, max_concurrency=8, max_queue=32, threads=4, queue_timeout_s=10.0,
+                 retry_after_s=1.0, on_stage=None):
+        """
+        Args:
+            max_concurrency: requests allowed to run at the same time
+            max_queue: requests allowed to wait for a slot
+            threads: size of the executor running blocking work
+            queue_timeout_s: max time a request may wait for a slot (None = no limit)
+            retry_after_s: Retry-After hint returned with rejections
+            on_stage: optional callback(stage, seconds) for queue_wait / service times
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout_s = queue_timeout_s
+        self.retry_after_s = retry_after_s
+        self.on_stage = on_stage
+        self.executor = ThreadPoolExecutor(max_workers=max(1, int(threads)), thread_name_prefix="inference")
+
+        self._semaphore = None
+        self._loop = None
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._active = 0
+        self._admitted = 0
+        self._rejected_queue_full = 0
+        self._rejected_timeout = 0
+
+    def _get_semaphore(self):
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def _observe(self, stage, seconds):
+        if self.on_stage is not None:
+            self.on_stage(stage, seconds)
+
+    async def acquire(self):
+        """
+        Wait for a slot, or raise Overloaded if the wait queue is full or
+        the wait exceeds queue_timeout_s. Pair with release().
+        """
+        semaphore = self._get_semaphore()
+        if self._active + self._waiting >= self.max_concurrency + self.max_queue:
+            with self._lock:
+                self._rejected_queue_full += 1
+            raise Overloaded(429, "Server busy: request queue is full", self.retry_after_s)
+
+        queued = time.perf_counter()
+        self._waiting += 1
+        try:
+            if self.queue_timeout_s is None:
+                await semaphore.acquire()
+            else:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._rejected_timeout += 1
+            raise Overloaded(503, "Server busy: timed out waiting for a worker", self.retry_after_s)
+        finally:
+            self._waiting -= 1
+
+        self._active += 1
+        with self._lock:
+            self._admitted += 1
+        self._observe("queue_wait", time.perf_counter() - queued)
+        return time.perf_counter()
+
+    def release(self, admitted_at=None):
+        """Give back a slot taken with acquire()"""
+        self._active -= 1
+        self._semaphore.release()
+        if admitted_at is not None:
+            self._observe("service", time.perf_counter() - admitted_at)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for the duration of the with-block"""
+        admitted_at = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(admitted_at)
+
+    async def call(self, fn, *args, **kwargs):
+        """Run blocking fn(*args, **kwargs) on the inference executor"""
+        loop = asyncio.get_running_loop()
+        executor = EXECUTOR_OVERRIDE.get() or self.executor
+        if kwargs:
+            return await loop.run_in_executor(executor, lambda: fn(*args, **kwargs))
+        return await loop.run_in_executor(executor, fn, *args)
+
+    def stats(self):
+        """Current occupancy and rejection counters"""
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "threads": self.executor._max_workers,
+                "active": self._active,
+                "waiting": self._waiting,
+                "admitted": self._admitted,
+                "rejected_queue_full": self._rejected_queue_full,
+                "rejected_timeout": self._rejected_timeout,
+            }
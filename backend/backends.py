@@ -0,0 +1,291 @@
+import logging
+import os
+import threading
+import time
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("eager", "torchscript", "compile", "onnx")
+
+INPUT_NAMES = ["img", "edge", "ocr"]
+OUTPUT_NAMES = ["logits"]
+
+# Artifact metadata key holding the state_dict_fingerprint of the exported weights
+FINGERPRINT_KEY = "model_fingerprint"
+
+
+def check_artifact_fingerprint(artifact, recorded, expected):
+    """
+    Refuse an exported artifact built from other weights than the loaded
+    checkpoint (no check when `expected` is None).
+
+    Raises:
+        ValueError: the artifact records another fingerprint, or none
+    """
+    if expected is None:
+        return
+    if not recorded:
+        raise ValueError(f"{artifact} records no model fingerprint; re-export it with export_model.py")
+    if recorded != expected:
+        raise ValueError(
+            f"{artifact} was exported from model {recorded[:16]}, not the loaded {expected[:16]}; "
+            "re-export it with export_model.py"
+        )
+
+
+def example_inputs(img_size=256, max_ocr_tokens=64, batch_size=2):
+    """Dummy (img, edge, ocr) batch used for tracing, export and warmup"""
+    return (
+        torch.zeros((batch_size, 3, img_size, img_size), dtype=torch.float32),
+        torch.zeros((batch_size, 1, img_size, img_size), dtype=torch.float32),
+        torch.zeros((batch_size, max_ocr_tokens), dtype=torch.long),
+    )
+
+
+class InferenceBackend:
+    """
+    One way of executing ForgeryNet's forward pass.
+
+    Backends take the (img, edge, ocr) batch produced by
+    ModelLoader.prepare_batch and return a (B, num_classes) logits tensor.
+    Calls are timed per batch size so backends can be compared on the
+    same traffic via stats().
+    """
+
+    name = None
+    precision = "fp32"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = {}  # batch size -> [calls, total seconds, min, max]
+
+    def forward(self, img, edge, ocr):
+        raise NotImplementedError
+
+    def __call__(self, img, edge, ocr):
+        start = time.perf_counter()
+        logits = self.forward(img, edge, ocr)
+        self._record(img.shape[0], time.perf_counter() - start)
+        return logits
+
+    def _record(self, batch_size, seconds):
+        with self._lock:
+            state = self._latency.get(batch_size)
+            if state is None:
+                self._latency[batch_size] = [1, seconds, seconds, seconds]
+            else:
+                state[0] += 1
+                state[1] += seconds
+                state[2] = min(state[2], seconds)
+                state[3] = max(state[3], seconds)
+
+    def reset_stats(self):
+        """Forget recorded latencies (e.g. after warmup / compilation)"""
+        with self._lock:
+            self._latency.clear()
+
+    def stats(self):
+        """Per-batch-size call count and latency (ms)"""
+        with self._lock:
+            items = sorted(self._latency.items())
+        return {
+            "backend": self.name,
+            "precision": self.precision,
+            "batches": {
+                str(batch_size): {
+                    "calls": calls,
+                    "mean_ms": 1000 * total / calls,
+                    "min_ms": 1000 * low,
+                    "max_ms": 1000 * high,
+                    "per_image_ms": 1000 * total / calls / batch_size,
+                }
+                for batch_size, (calls, total, low, high) in items
+            },
+        }
+
+
+class EagerBackend(InferenceBackend):
+    """
+    PyTorch eager forward (the reference), optionally under bf16 autocast
+    and/or with channels_last inputs (see precision.py).
+    """
+
+    name = "eager"
+
+    def __init__(self, model, autocast_dtype=None, channels_last=False):
+        super().__init__()
+        self.model = model
+        self.autocast_dtype = autocast_dtype
+        self.channels_last = channels_last
+
+    def forward(self, img, edge, ocr):
+        if self.channels_last:
+            img = img.contiguous(memory_format=torch.channels_last)
+            edge = edge.contiguous(memory_format=torch.channels_last)
+        with torch.no_grad():
+            if self.autocast_dtype is None:
+                return self.model(img, edge, ocr)
+            with torch.autocast("cpu", dtype=self.autocast_dtype):
+                return self.model(img, edge, ocr).float()
+
+
+class TorchScriptBackend(InferenceBackend):
+    """
+    Traced and frozen TorchScript graph.
+
+    Loaded from an artifact written by export_model.py, or traced from the
+    eager model at startup when no artifact is given.
+    """
+
+    name = "torchscript"
+
+    def __init__(self, model=None, artifact=None, example=None, fingerprint=None):
+        super().__init__()
+        if artifact is not None:
+            logger.info(f"Loading TorchScript module from {artifact}")
+            extra_files = {FINGERPRINT_KEY: ""}
+            self.module = torch.jit.load(str(artifact), map_location="cpu", _extra_files=extra_files)
+            recorded = extra_files[FINGERPRINT_KEY]
+            if isinstance(recorded, bytes):
+                recorded = recorded.decode("utf-8")
+            check_artifact_fingerprint(artifact, recorded, fingerprint)
+        else:
+            logger.info("Tracing TorchScript module from the eager model")
+            self.module = trace_model(model, example)
+        self.module.eval()
+
+    def forward(self, img, edge, ocr):
+        with torch.no_grad():
+            return self.module(img, edge, ocr)
+
+
+class CompiledBackend(InferenceBackend):
+    """
+    torch.compile graph (inductor). The first call compiles for its batch
+    size; the first call with a different batch size recompiles once with
+    a dynamic batch dimension. Both can take minutes on CPU, so warm up
+    before serving.
+    """
+
+    name = "compile"
+
+    def __init__(self, model, mode=None):
+        super().__init__()
+        self.module = torch.compile(model, mode=mode)
+
+    def forward(self, img, edge, ocr):
+        with torch.no_grad():
+            return self.module(img, edge, ocr)
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+    """
+    ONNX model exported by export_model.py, run on ONNX Runtime's CPU
+    provider. The session is (re)created in each process that uses it, as
+    its thread pool does not survive the fork in serve_workers.py.
+    """
+
+    name = "onnx"
+
+    def __init__(self, artifact, threads=None, fingerprint=None):
+        super().__init__()
+        self.artifact = str(artifact)
+        self.threads = threads
+        self._session = None
+        self._session_pid = None
+        session = self.get_session()  # fail at startup on a bad artifact
+        recorded = session.get_modelmeta().custom_metadata_map.get(FINGERPRINT_KEY)
+        check_artifact_fingerprint(artifact, recorded, fingerprint)
+
+    def get_session(self):
+        """ONNX Runtime session owned by the current process"""
+        if self._session is None or self._session_pid != os.getpid():
+            try:
+                import onnxruntime as ort
+            except ImportError as e:
+                raise RuntimeError("INFERENCE_BACKEND=onnx requires the onnxruntime package") from e
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            options.intra_op_num_threads = self.threads or torch.get_num_threads()
+            options.inter_op_num_threads = 1
+            logger.info(
+                f"Creating ONNX Runtime session for {self.artifact} ({options.intra_op_num_threads} threads)"
+            )
+            self._session = ort.InferenceSession(self.artifact, options, providers=["CPUExecutionProvider"])
+            self._session_pid = os.getpid()
+        return self._session
+
+    def forward(self, img, edge, ocr):
+        outputs = self.get_session().run(OUTPUT_NAMES, {
+            "img": img.detach().cpu().numpy(),
+            "edge": edge.detach().cpu().numpy(),
+            "ocr": ocr.detach().cpu().numpy(),
+        })
+        return torch.from_numpy(outputs[0])
+
+
+def save_torchscript(module, path, fingerprint=None):
+    """Save a TorchScript module, recording the fingerprint of its weights"""
+    extra_files = {FINGERPRINT_KEY: fingerprint} if fingerprint else None
+    torch.jit.save(module, str(path), _extra_files=extra_files)
+
+
+def trace_model(model, example=None):
+    """Trace and freeze an eval-mode ForgeryNet into a TorchScript module"""
+    example = example if example is not None else example_inputs(model.img_size, model.max_ocr_tokens)
+    with torch.no_grad():
+        traced = torch.jit.trace(model.eval(), example, check_trace=False)
+    return torch.jit.freeze(traced)
+
+
+def export_onnx(model, path, example=None, opset=17, fingerprint=None):
+    """
+    Export an eval-mode ForgeryNet to ONNX with a dynamic batch dimension,
+    recording `fingerprint` (of its weights) in the model metadata.
+    """
+    example = example if example is not None else example_inputs(model.img_size, model.max_ocr_tokens)
+    dynamic_axes = {name: {0: "batch"} for name in INPUT_NAMES + OUTPUT_NAMES}
+    with torch.no_grad():
+        torch.onnx.export(
+            model.eval(), example, str(path),
+            input_names=INPUT_NAMES,
+            output_names=OUTPUT_NAMES,
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False,
+        )
+    if fingerprint:
+        import onnx
+        proto = onnx.load(str(path))
+        onnx.helper.set_model_props(proto, {FINGERPRINT_KEY: fingerprint})
+        onnx.save(proto, str(path))
+
+
+def create_backend(name, model, artifact=None, threads=None, precision=None, fingerprint=None):
+    """
+    Build the named execution backend for a loaded eval-mode ForgeryNet.
+
+    Args:
+        name: one of BACKENDS
+        model: ForgeryNet with weights loaded
+        artifact: exported file for "torchscript" (optional) or "onnx" (required)
+        threads: ONNX Runtime intra-op threads (default: torch's setting)
+        precision: optional precision.PrecisionPlan (eager only)
+        fingerprint: state_dict_fingerprint of `model`; an artifact exported
+            from other weights is refused (None = no check)
+    """
+    if name == "eager":
+        if precision is not None:
+            return EagerBackend(precision.module, precision.autocast_dtype, precision.channels_last)
+        return EagerBackend(model)
+    if name == "torchscript":
+        return TorchScriptBackend(model, artifact=artifact, fingerprint=fingerprint)
+    if name == "compile":
+        return CompiledBackend(model)
+    if name == "onnx":
+        if artifact is None:
+            raise ValueError("The onnx backend needs an exported model: run export_model.py --format onnx")
+        return OnnxRuntimeBackend(artifact, threads=threads, fingerprint=fingerprint)
+    raise ValueError(f"Unknown inference backend {name!r}; expected one of {BACKENDS}")
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching queue for model inference.
+
+    Concurrent callers submit single items; a background worker collects
+    them for up to `max_wait_ms` (or until `max_batch_size` items are
+    queued), runs them through `run_batch` in one call and hands each
+    caller its own row of the result.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_wait_ms=5.0, executor=None):
+        """
+        Args:
+            run_batch: callable taking a list of items and returning a list
+                       of results in the same order (runs in `executor`)
+            max_batch_size: upper bound on items per batch
+            max_wait_ms: how long the first item of a batch may wait for company
+            executor: concurrent.futures executor for run_batch (None = loop default)
+        """
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.executor = executor
+
+        self._queue = None
+        self._worker = None
+        self._loop = None
+
+        self._lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._items = 0
+        self._batches = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+            logger.info(
+                f"[MicroBatcher] Started (max_batch_size={self.max_batch_size}, "
+                f"max_wait_ms={self.max_wait * 1000:.1f})"
+            )
+
+    async def submit(self, item):
+        """Queue one item and wait for its result"""
+        self._ensure_started()
+        future = self._loop.create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - self._loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (cancelled) do not need a slot in the batch
+            batch = [entry for entry in batch if not entry[1].done()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            items = [entry[0] for entry in batch]
+            try:
+                results = await self._loop.run_in_executor(self.executor, self.run_batch, items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"run_batch returned {len(results)} results for {len(items)} items"
+                    )
+            except Exception as e:
+                logger.error(f"[MicroBatcher] Batch of {len(items)} failed: {e}", exc_info=True)
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finished = time.perf_counter()
+
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+            with self._lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] += 1
+                self._total_wait += sum(started - queued for _, _, queued in batch)
+                self._total_run += finished - started
+
+    @property
+    def queue_depth(self):
+        """Number of items waiting for a batch slot"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def stats(self):
+        """Snapshot of queue depth and achieved batch sizes"""
+        with self._lock:
+            batches = self._batches
+            items = self._items
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self.queue_depth,
+                "batches": batches,
+                "items": items,
+                "mean_batch_size": items / batches if batches else 0.0,
+                "batch_size_histogram": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+                "mean_queue_wait_ms": 1000 * self._total_wait / items if items else 0.0,
+                "mean_batch_run_ms": 1000 * self._total_run / batches if batches else 0.0,
+            }
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Parity check and per-batch latency for every inference backend.
+
+Exports the checkpoint to TorchScript / ONNX in a temporary directory,
+runs the same random batches through each backend and compares logits
+with eager PyTorch. Exits with status 1 if any available backend is
+outside the tolerance.
+
+    python benchmarks/bench_backends.py --batch-sizes 1,4,8 --repeats 10
+    python benchmarks/bench_backends.py --model-path none   # random weights
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import torch
+
+from backends import BACKENDS, create_backend, example_inputs
+from export_model import export
+from model_loader import ModelLoader
+
+
+def random_batch(model_loader, batch_size, seed):
+    generator = torch.Generator().manual_seed(seed)
+    img, edge, ocr = example_inputs(model_loader.img_size, model_loader.max_ocr_tokens, batch_size)
+    img.normal_(generator=generator)
+    edge.bernoulli_(0.1, generator=generator)
+    return img, edge, ocr
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=str(BACKEND_DIR / "best_model (1).pth"),
+                        help='checkpoint, or "none" for random weights')
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--batch-sizes", default="1,4,8")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--atol", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    model_path = None if args.model_path.lower() == "none" else args.model_path
+    model_loader = ModelLoader(model_path)
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    batches = {b: random_batch(model_loader, b, seed=b) for b in batch_sizes}
+    reference = {b: model_loader.backend(*batch) for b, batch in batches.items()}
+
+    results = []
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.backends.split(","):
+            try:
+                artifact = None
+                if name in ("torchscript", "onnx"):
+                    artifact = Path(tmp) / f"model.{name}"
+                    export(model_loader, name, artifact)
+                backend = create_backend(name, model_loader.model, artifact=artifact,
+                                         fingerprint=model_loader.fingerprint)
+            except Exception as e:
+                print(f"{name:12s} unavailable: {e}")
+                results.append({"backend": name, "error": str(e)})
+                continue
+
+            max_diff = 0.0
+            for b, batch in batches.items():
+                # First call per shape pays for compilation / graph optimization
+                start = time.perf_counter()
+                logits = backend(*batch)
+                first_ms = 1000 * (time.perf_counter() - start)
+                max_diff = max(max_diff, (logits.float() - reference[b]).abs().max().item())
+                print(f"{name:12s} batch {b:3d}: first call {first_ms:8.1f} ms")
+
+            backend.reset_stats()
+            for b, batch in batches.items():
+                for _ in range(args.repeats):
+                    backend(*batch)
+            stats = backend.stats()
+            ok = max_diff <= args.atol
+            failed |= not ok
+            for b in batch_sizes:
+                s = stats["batches"][str(b)]
+                print(f"{name:12s} batch {b:3d}: mean {s['mean_ms']:8.1f} ms  "
+                      f"({s['per_image_ms']:6.1f} ms/image)")
+            print(f"{name:12s} max |logit diff| vs eager: {max_diff:.2e} {'OK' if ok else 'MISMATCH'}")
+            results.append({"backend": name, "max_abs_diff": max_diff, "parity_ok": ok, **stats})
+
+    print(json.dumps(results, indent=2))
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark upload decoding: tempfile + full decode vs. in-memory reduced decode.
+
+Each variant runs in a fresh subprocess so peak RSS is measured per path.
+
+    python benchmarks/bench_decode.py --width 5000 --height 7000 --repeat 5
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from PIL import Image
+
+from image_io import decode_image
+
+MODEL_INPUT = 256
+
+
+def make_document(width, height, fmt):
+    """Synthetic scan: light paper, dark text-like strokes, a little noise"""
+    rng = np.random.default_rng(0)
+    page = np.full((height, width, 3), 235, dtype=np.uint8)
+    for _ in range(max(1, height // 40)):
+        y = int(rng.integers(0, height - 8))
+        x0 = int(rng.integers(0, width // 4))
+        x1 = int(rng.integers(width // 2, width))
+        page[y:y + 6, x0:x1] = 30
+    page = np.clip(page.astype(np.int16) + rng.integers(-12, 12, page.shape), 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(page).save(buffer, format=fmt, quality=90)
+    return buffer.getvalue()
+
+
+def old_path(data):
+    """Previous /predict path: tempfile write, full decode, resize"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
+        tmp.write(data)
+        tmp_path = tmp.name
+    try:
+        img = Image.open(tmp_path).convert("RGB")
+        model_input = img.resize((MODEL_INPUT, MODEL_INPUT), Image.BILINEAR)
+    finally:
+        os.unlink(tmp_path)
+    return img, model_input
+
+
+def new_path(data):
+    """In-memory reduced decode (overlay-sized image), resize"""
+    img = decode_image(data)
+    model_input = img.resize((MODEL_INPUT, MODEL_INPUT), Image.BILINEAR)
+    return img, model_input
+
+
+def _peak_rss_mb():
+    # VmHWM is per address space; ru_maxrss would carry the parent's peak across fork+exec
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_variant(name, data, repeat, queue):
+    fn = old_path if name == "tempfile_full_decode" else new_path
+    baseline = _peak_rss_mb()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        img, _ = fn(data)
+        times.append(time.perf_counter() - start)
+        del img
+    queue.put({
+        "variant": name,
+        "mean_ms": 1000 * sum(times) / len(times),
+        "min_ms": 1000 * min(times),
+        "peak_rss_increase_mb": _peak_rss_mb() - baseline,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--width", type=int, default=5000)
+    parser.add_argument("--height", type=int, default=7000)
+    parser.add_argument("--formats", default="JPEG,PNG,TIFF")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    results = []
+    for fmt in args.formats.split(","):
+        data = make_document(args.width, args.height, fmt)
+        for name in ("tempfile_full_decode", "memory_reduced_decode"):
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_variant, args=(name, data, args.repeat, queue))
+            proc.start()
+            result = queue.get()
+            proc.join()
+            result.update({"format": fmt, "size": [args.width, args.height], "encoded_mb": len(data) / 2**20})
+            results.append(result)
+            print(
+                f"{fmt:5s} {name:24s} mean {result['mean_ms']:8.1f} ms  "
+                f"min {result['min_ms']:8.1f} ms  peak RSS +{result['peak_rss_increase_mb']:7.1f} MB"
+            )
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Logits parity and latency of the inference-frozen ForgeryNet (freeze.py).
+
+Compares the frozen module with the original on synthetic documents
+(the all-zero OCR input ModelLoader always uses), on random OCR tokens
+(the folded branch added back) and on Grad-CAM heatmaps, then times both
+per batch size. Exits with status 1 if any logit differs by more than
+--atol.
+
+    python benchmarks/bench_freeze.py --model-path none --batch-sizes 1,8
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import numpy as np
+import torch
+
+from backends import EagerBackend
+from bench_precision import recalibrate_batchnorm, synthetic_documents
+from freeze import freeze_for_inference
+from gradcam import Explainer
+from model_loader import ModelLoader
+
+
+def time_backend(backend, batch, repeats):
+    backend(*batch)
+    backend.reset_stats()
+    for _ in range(repeats):
+        backend(*batch)
+    return backend.stats()["batches"][str(batch[0].shape[0])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=str(BACKEND_DIR / "best_model (1).pth"),
+                        help='checkpoint, or "none" for random weights')
+    parser.add_argument("--docs", type=int, default=8)
+    parser.add_argument("--batch-sizes", default="1,8")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--atol", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    docs = synthetic_documents(args.docs)
+    if args.model_path.lower() == "none":
+        torch.manual_seed(0)
+        model_loader = ModelLoader(None)
+        recalibrate_batchnorm(model_loader, docs)
+    else:
+        model_loader = ModelLoader(args.model_path)
+    original = model_loader.model
+
+    start = time.perf_counter()
+    frozen = freeze_for_inference(original)
+    freeze_s = time.perf_counter() - start
+
+    img, edge, ocr = model_loader.prepare_batch(docs)
+    tokens = torch.randint(1, 128, ocr.shape, generator=torch.Generator().manual_seed(0))
+    tokens[:, tokens.shape[1] // 2:] = 0  # padded tail, like real OCR
+    with torch.no_grad():
+        diffs = {
+            "zero_ocr": (frozen(img, edge, ocr) - original(img, edge, ocr)).abs().max().item(),
+            "ocr_tokens": (frozen(img, edge, tokens) - original(img, edge, tokens)).abs().max().item(),
+        }
+    _, _, heat_original = Explainer(original).explain((img, edge, ocr))
+    _, _, heat_frozen = Explainer(frozen).explain((img, edge, ocr))
+    diffs["gradcam"] = float(np.abs(heat_frozen - heat_original).max())
+
+    ok = diffs["zero_ocr"] <= args.atol and diffs["ocr_tokens"] <= args.atol
+    print(f"freeze took {freeze_s:.2f}s: {frozen.fused} conv+BN fused, {frozen.stripped} identities removed")
+    print(f"max |logit diff|  zero OCR {diffs['zero_ocr']:.2e}  OCR tokens {diffs['ocr_tokens']:.2e}  "
+          f"max |heatmap diff| {diffs['gradcam']:.2e}  {'OK' if ok else 'MISMATCH'}")
+
+    latency = []
+    for b in (int(x) for x in args.batch_sizes.split(",")):
+        batch = (img[:b], edge[:b], ocr[:b])
+        base = time_backend(EagerBackend(original), batch, args.repeats)
+        fast = time_backend(EagerBackend(frozen), batch, args.repeats)
+        print(f"batch {b:3d}: original {base['mean_ms']:8.2f} ms  frozen {fast['mean_ms']:8.2f} ms  "
+              f"({100 * (1 - fast['mean_ms'] / base['mean_ms']):+.1f}% faster)")
+        latency.append({"batch_size": b, "original_ms": base["mean_ms"], "frozen_ms": fast["mean_ms"]})
+
+    print(json.dumps({"parity_ok": ok, **diffs, "latency": latency}, indent=2))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
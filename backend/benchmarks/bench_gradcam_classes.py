@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+All-classes Grad-CAM: one forward + one batched backward vs. a loop.
+
+Compares, per document and for K = all classes (or --top-k):
+  loop      K x Explainer.explain(class_idx=c): K forwards + K backwards
+  retained  one forward, K backwards over a retained graph
+  batched   Explainer.explain_classes: one forward, one vectorized backward
+
+and checks the batched heatmaps against the loop.
+
+    python benchmarks/bench_gradcam_classes.py --model-path none --docs 4
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import numpy as np
+import torch
+
+from bench_precision import recalibrate_batchnorm, synthetic_documents
+from gradcam import cam_from_gradients
+from model_loader import ModelLoader
+
+
+def run_loop(model_loader, inputs, class_ids):
+    return np.stack([model_loader.explainer.explain(inputs, class_idx=c)[2][0] for c in class_ids])
+
+
+def run_retained(model_loader, inputs, class_ids):
+    logits, activ = model_loader.explainer.forward(inputs)
+    heatmaps = []
+    for i, c in enumerate(class_ids):
+        grads, = torch.autograd.grad(logits[0, c], activ, retain_graph=i < len(class_ids) - 1)
+        heatmaps.append(cam_from_gradients(activ.detach(), grads, inputs[0].shape[2:])[0])
+    return np.stack(heatmaps)
+
+
+def run_batched(model_loader, inputs, class_ids):
+    _, _, heatmaps = model_loader.explainer.explain_classes(inputs, class_ids=class_ids)
+    return heatmaps[0]
+
+
+def timed(fn, repeats):
+    fn()  # warm
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, 1000 * float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=str(BACKEND_DIR / "best_model (1).pth"),
+                        help='checkpoint, or "none" for random weights')
+    parser.add_argument("--docs", type=int, default=4)
+    parser.add_argument("--top-k", type=int, default=None, help="explain k classes instead of all")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    docs = synthetic_documents(args.docs)
+    if args.model_path.lower() == "none":
+        torch.manual_seed(0)
+        model_loader = ModelLoader(None)
+        recalibrate_batchnorm(model_loader, docs)
+    else:
+        model_loader = ModelLoader(args.model_path)
+
+    num_classes = model_loader.model.num_classes
+    results = []
+    for index, doc in enumerate(docs):
+        inputs = model_loader.prepare_batch([doc])
+        if args.top_k:
+            with torch.no_grad():
+                class_ids = torch.topk(model_loader.model(*inputs), args.top_k, dim=1).indices[0].tolist()
+        else:
+            class_ids = list(range(num_classes))
+
+        reference, loop_ms = timed(lambda: run_loop(model_loader, inputs, class_ids), args.repeats)
+        retained, retained_ms = timed(lambda: run_retained(model_loader, inputs, class_ids), args.repeats)
+        batched, batched_ms = timed(lambda: run_batched(model_loader, inputs, class_ids), args.repeats)
+        max_diff = max(np.abs(batched - reference).max(), np.abs(retained - reference).max())
+        print(
+            f"doc {index}: K={len(class_ids)}  loop {loop_ms:7.1f} ms  retained {retained_ms:7.1f} ms  "
+            f"batched {batched_ms:7.1f} ms  ({loop_ms / batched_ms:.1f}x vs loop)  max|diff| {max_diff:.1e}"
+        )
+        results.append({
+            "k": len(class_ids), "loop_ms": loop_ms, "retained_ms": retained_ms,
+            "batched_ms": batched_ms, "max_abs_diff": float(max_diff),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
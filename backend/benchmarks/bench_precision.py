@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Accuracy drift, latency and memory of each precision mode against fp32.
+
+Sample documents come from --calibration-dir (or are synthesized). The
+first half calibrates static int8, the second half is used to measure
+drift. Each mode runs in a fresh subprocess so peak RSS is not shared
+between modes.
+
+    python benchmarks/bench_precision.py --calibration-dir samples/ \\
+        --modes "fp32;bf16;dynamic_int8;channels_last,static_int8"
+
+With --model-path none a random-weight model is used. Its BatchNorm
+statistics are first re-estimated on the sample documents; otherwise the
+backbone's activations vanish and every mode trivially agrees with fp32.
+"""
+
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import numpy as np
+import torch
+from PIL import Image, ImageDraw
+
+DEFAULT_MODES = "fp32;channels_last;bf16;dynamic_int8;static_int8;channels_last,static_int8,dynamic_int8"
+
+
+def synthetic_documents(count, seed=0):
+    """Pages with text-like lines, a photo block and a stamp, at varied sizes"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        width, height = int(rng.integers(600, 1200)), int(rng.integers(800, 1600))
+        page = Image.new("RGB", (width, height), tuple(int(v) for v in rng.integers(225, 255, 3)))
+        draw = ImageDraw.Draw(page)
+        y = 40
+        while y < height - 40:
+            x = 40
+            while x < width - 80:
+                word = int(rng.integers(20, 90))
+                draw.rectangle([x, y, x + word, y + 10], fill=tuple(int(v) for v in rng.integers(0, 80, 3)))
+                x += word + int(rng.integers(8, 20))
+            y += int(rng.integers(18, 30))
+        photo = rng.integers(0, 255, (height // 5, width // 4, 3), dtype=np.uint8)
+        page.paste(Image.fromarray(photo), (width // 2, height // 6))
+        cx, cy, r = width * 3 // 4, height * 4 // 5, width // 10
+        draw.ellipse([cx - r, cy - r, cx + r, cy + r], outline=(180, 20, 20), width=6)
+        images.append(page)
+    return images
+
+
+def load_images(args):
+    if args.calibration_dir:
+        from precision import load_calibration_images
+        return load_calibration_images(args.calibration_dir, limit=args.samples)
+    return synthetic_documents(args.samples)
+
+
+def recalibrate_batchnorm(model_loader, images, batch_size=8):
+    """Re-estimate BatchNorm running statistics on `images` (cumulative average)"""
+    bn_layers = [m for m in model_loader.model.modules() if isinstance(m, torch.nn.modules.batchnorm._BatchNorm)]
+    for bn in bn_layers:
+        bn.reset_running_stats()
+        bn.momentum = None
+        bn.train()
+    with torch.no_grad():
+        for i in range(0, len(images), batch_size):
+            img, _, _ = model_loader.prepare_batch(images[i:i + batch_size])
+            model_loader.model.back(img)
+    for bn in bn_layers:
+        bn.eval()
+
+
+def peak_rss_mb():
+    for line in Path("/proc/self/status").read_text().splitlines():
+        if line.startswith("VmHWM:"):
+            return int(line.split()[1]) / 1024
+    return None
+
+
+def run_child(args):
+    """Measure one precision mode (runs in its own process)"""
+    from model_loader import ModelLoader
+
+    images = load_images(args)
+    calibration, evaluation = images[: len(images) // 2], images[len(images) // 2:]
+    baseline_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    model_loader = ModelLoader(args.model_path, precision=args.child, calibration_images=calibration)
+    setup_s = time.perf_counter() - start
+    drift = model_loader.measure_drift(evaluation)
+
+    batch = model_loader.prepare_batch(evaluation[: args.batch_size])
+    model_loader.backend(*batch)
+    model_loader.backend.reset_stats()
+    for _ in range(args.repeats):
+        model_loader.backend(*batch)
+    latency = model_loader.backend.stats()["batches"][str(batch[0].shape[0])]
+
+    # Weights actually used for predictions (packed int8 params included)
+    module = model_loader.backend.model
+    buffer = io.BytesIO()
+    torch.save(module.state_dict(), buffer)
+
+    print(json.dumps({
+        "mode": args.child,
+        "applied": model_loader.backend.precision,
+        "setup_s": setup_s,
+        **drift,
+        "batch_size": batch[0].shape[0],
+        "mean_ms": latency["mean_ms"],
+        "per_image_ms": latency["per_image_ms"],
+        "weights_mb": buffer.tell() / 2**20,
+        "peak_rss_delta_mb": peak_rss_mb() - baseline_rss,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=str(BACKEND_DIR / "best_model (1).pth"),
+                        help='checkpoint, or "none" for random weights')
+    parser.add_argument("--calibration-dir", default=None, help="folder of sample documents")
+    parser.add_argument("--samples", type=int, default=32)
+    parser.add_argument("--modes", default=DEFAULT_MODES,
+                        help="modes separated by ';', combined with ','")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.model_path = None if args.model_path.lower() == "none" else args.model_path
+        run_child(args)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = args.model_path
+        if model_path.lower() == "none":
+            from model_loader import ModelLoader
+            torch.manual_seed(0)
+            model_loader = ModelLoader(None)
+            recalibrate_batchnorm(model_loader, load_images(args))
+            model_path = str(Path(tmp) / "random.pt")
+            torch.save(model_loader.model.state_dict(), model_path)
+            del model_loader
+
+        modes = args.modes.split(";")
+        results = []
+        for mode in modes:
+            cmd = [sys.executable, __file__, "--child", mode, "--model-path", model_path,
+                   "--samples", str(args.samples), "--batch-size", str(args.batch_size),
+                   "--repeats", str(args.repeats)]
+            if args.calibration_dir:
+                cmd += ["--calibration-dir", args.calibration_dir]
+            proc = subprocess.run(cmd, capture_output=True, text=True, cwd=BACKEND_DIR,
+                                  env=dict(os.environ, PYTHONWARNINGS="ignore"))
+            if proc.returncode != 0:
+                print(f"{mode:40s} FAILED: {(proc.stderr.strip().splitlines() or ['?'])[-1]}")
+                continue
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(r)
+            print(
+                f"{mode:40s} top1 {r['top1_agreement']:6.1%}  max|dlogit| {r['max_abs_logit_diff']:.2e}  "
+                f"max|dprob| {r['max_abs_prob_diff']:.2e}  {r['per_image_ms']:6.1f} ms/img  "
+                f"weights {r['weights_mb']:5.1f} MB  peak RSS +{r['peak_rss_delta_mb']:6.1f} MB"
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
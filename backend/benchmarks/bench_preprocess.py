@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Parity check and benchmark for the batched preprocessing stage.
+
+Compares Preprocessor against ModelLoader's reference path
+(transform + extract_edges) on synthetic documents: outputs must be
+bit-identical, and the script exits non-zero if they are not.
+
+    python benchmarks/bench_preprocess.py --batch-sizes 1,8,32 --repeat 5
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import cv2
+import torch
+from PIL import Image
+from torchvision import transforms
+
+from preprocessing import IMAGENET_MEAN, IMAGENET_STD, Preprocessor
+
+IMG_SIZE = 256
+
+
+def reference_transform():
+    return transforms.Compose([
+        transforms.Resize((IMG_SIZE, IMG_SIZE)),
+        transforms.ToTensor(),
+        transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD)
+    ])
+
+
+def reference_edges(pil_img):
+    """Copy of ModelLoader.extract_edges"""
+    gray = cv2.cvtColor(np.array(pil_img.resize((IMG_SIZE, IMG_SIZE))), cv2.COLOR_RGB2GRAY)
+    median = np.median(gray)
+    lower = int(max(0, 0.7 * median))
+    upper = int(min(255, 1.3 * median))
+    edge = cv2.Canny(gray, lower, upper).astype("float32") / 255.0
+    return torch.from_numpy(edge).unsqueeze(0).float()
+
+
+def reference_batch(images, transform):
+    """Previous per-image path followed by torch.stack"""
+    img_batch = torch.stack([transform(img) for img in images])
+    edge_batch = torch.stack([reference_edges(img) for img in images])
+    return img_batch, edge_batch
+
+
+def make_documents(count, seed=0):
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        height = int(rng.integers(600, 1024))
+        width = int(rng.integers(500, 1024))
+        page = np.full((height, width, 3), 230, dtype=np.uint8)
+        for _ in range(height // 30):
+            y = int(rng.integers(0, height - 6))
+            page[y:y + 4, int(rng.integers(0, width // 3)):int(rng.integers(width // 2, width))] = 40
+        page = np.clip(page.astype(np.int16) + rng.integers(-20, 20, page.shape), 0, 255).astype(np.uint8)
+        images.append(Image.fromarray(page))
+    return images
+
+
+def check_parity(images, preprocessor, transform):
+    ref_img, ref_edge = reference_batch(images, transform)
+    new_img, new_edge = preprocessor(images)
+    return {
+        "img_max_abs_diff": (ref_img - new_img).abs().max().item(),
+        "edge_pixel_agreement": (ref_edge == new_edge).float().mean().item(),
+        "identical": torch.equal(ref_img, new_img) and torch.equal(ref_edge, new_edge),
+    }
+
+
+def time_fn(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return 1000 * min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-sizes", default="1,8,32")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    transform = reference_transform()
+    variants = {
+        "exact": Preprocessor(IMG_SIZE),
+        "shared_resize": Preprocessor(IMG_SIZE, shared_resize=True),
+    }
+
+    parity_images = make_documents(16, seed=1)
+    parity = check_parity(parity_images, variants["exact"], transform)
+    shared_parity = check_parity(parity_images, variants["shared_resize"], transform)
+    print(f"Parity (exact): {parity}")
+    print(f"Parity (shared_resize): {shared_parity}")
+
+    results = {"parity": parity, "shared_resize_parity": shared_parity, "timings": []}
+    for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+        images = make_documents(batch_size)
+        ref_ms = time_fn(lambda: reference_batch(images, transform), args.repeat)
+        row = {"batch_size": batch_size, "reference_ms_per_image": ref_ms / batch_size}
+        line = f"batch {batch_size:3d}: reference {ref_ms / batch_size:6.2f} ms/img"
+        for name, preprocessor in variants.items():
+            out = preprocessor.allocate(batch_size)
+            new_ms = time_fn(lambda: preprocessor(images, out=out), args.repeat)
+            row[f"{name}_ms_per_image"] = new_ms / batch_size
+            row[f"{name}_speedup"] = ref_ms / new_ms
+            line += f", {name} {new_ms / batch_size:6.2f} ms/img ({ref_ms / new_ms:.2f}x)"
+        results["timings"].append(row)
+        print(line)
+
+    print(json.dumps(results, indent=2))
+    if not parity["identical"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Benchmark model cold start: the original path versus ModelLoader's.
+
+Each variant runs in a fresh subprocess and reports time to import torch,
+time to get a model with loaded weights, and time to the first
+prediction:
+
+  legacy     ForgeryNet() (pretrained backbone download, B0 fallback,
+             channel probe) + eager torch.load + load_state_dict
+  fast       ModelLoader on the given checkpoint
+  converted  ModelLoader on the checkpoint after convert_checkpoint.py
+
+    python benchmarks/bench_startup.py --model-path "best_model (1).pth"
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {backend!r})
+import torch
+from PIL import Image
+from model_loader import ForgeryNet, ModelLoader
+from preprocessing import Preprocessor
+imported = time.perf_counter()
+
+variant, path = {variant!r}, {path!r}
+if variant == "legacy":
+    model = ForgeryNet()
+    model.load_state_dict(torch.load(path, map_location="cpu", weights_only=False))
+    model.eval()
+    loaded = time.perf_counter()
+    loader = ModelLoader.__new__(ModelLoader)
+    loader.model, loader.device, loader.max_ocr_tokens = model, torch.device("cpu"), 64
+    loader.preprocessor, loader.on_stage = Preprocessor(256), None
+    loader.class_names = [str(i) for i in range(7)]
+else:
+    loader = ModelLoader(path)
+    loaded = time.perf_counter()
+
+loader.predict_images([Image.new("RGB", (256, 256), (255, 255, 255))])
+first = time.perf_counter()
+print(json.dumps({{
+    "import_s": imported - start,
+    "load_s": loaded - imported,
+    "first_prediction_s": first - loaded,
+    "total_s": first - start,
+}}))
+"""
+
+
+def run_variant(variant, path, timeout):
+    code = CHILD.format(backend=str(BACKEND_DIR), variant=variant, path=str(path))
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    try:
+        proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                              timeout=timeout, env=env, cwd=BACKEND_DIR)
+    except subprocess.TimeoutExpired:
+        return {"variant": variant, "error": f"timed out after {timeout}s"}
+    if proc.returncode != 0:
+        last = (proc.stderr.strip().splitlines() or ["failed"])[-1]
+        return {"variant": variant, "error": last}
+    return {"variant": variant, **json.loads(proc.stdout.strip().splitlines()[-1])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default=str(BACKEND_DIR / "best_model (1).pth"))
+    parser.add_argument("--variants", default="legacy,fast,converted")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        converted = Path(tmp) / "model.pt"
+        for variant in args.variants.split(","):
+            path = args.model_path
+            if variant == "converted":
+                from convert_checkpoint import convert
+                convert(args.model_path, converted)
+                path = converted
+            runs = [run_variant(variant, path, args.timeout) for _ in range(args.repeats)]
+            ok = [r for r in runs if "error" not in r]
+            if not ok:
+                result = runs[-1]
+                print(f"{variant:10s} FAILED: {result['error']}")
+            else:
+                # Best of N: the least noisy estimate of cold start on this machine
+                result = min(ok, key=lambda r: r["total_s"])
+                print(
+                    f"{variant:10s} import {result['import_s']:6.2f}s  load {result['load_s']:6.2f}s  "
+                    f"first prediction {result['first_prediction_s']:6.2f}s  total {result['total_s']:6.2f}s"
+                )
+            results.append(result)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite for the inference hot path, with regression check.
+
+Runs without the real checkpoint: a randomly initialized ForgeryNet of
+the same shapes (BatchNorm statistics re-estimated on synthetic pages, so
+activations and heatmaps look like a trained model's rather than
+degenerate). For every page size and batch size it times:
+
+  decode           image_io.decode_image on the JPEG upload
+  transform        ModelLoader.transform (resize + normalize)
+  extract_edges    ModelLoader.extract_edges (Canny)
+  predict          ModelLoader.predict (single image, reference path)
+  predict_images   ModelLoader.predict_images (batched serving path)
+  gradcam          GradCAM.__call__ (legacy hook-based)
+  explain          Explainer.explain on preprocessed inputs (batched serving path)
+  overlay          create_heatmap_overlay at the decoded page size
+  base64           heatmap_to_base64 of that overlay
+  e2e_predict      POST /predict in-process (inline Grad-CAM, PNG)
+  e2e_predict_nogradcam   POST /predict?gradcam=false
+
+and writes p50 / p95 / p99 / mean latency, throughput (images/s) and the
+peak RSS during each case as JSON. With --baseline, every case is
+compared with the same case of an earlier run and the script exits with
+status 1 if any got slower than --threshold (relative) and --min-delta-ms
+(absolute, so sub-millisecond jitter does not fail the run).
+
+    python benchmarks/bench_suite.py --out baseline.json
+    python benchmarks/bench_suite.py --baseline baseline.json --out current.json
+    python benchmarks/bench_suite.py --stages decode,predict_images --sizes 2480x3508 --batch-sizes 1,8,16
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from bench_decode import make_document
+from bench_precision import recalibrate_batchnorm, synthetic_documents
+from gradcam import Explainer, GradCAM, create_heatmap_overlay, heatmap_to_base64
+from image_io import decode_image
+from model_loader import ModelLoader
+
+# Stages timed once per page (batch size 1) and once per batch size
+PAGE_STAGES = ("decode", "transform", "extract_edges", "predict", "gradcam", "overlay", "base64",
+               "e2e_predict", "e2e_predict_nogradcam")
+BATCH_STAGES = ("predict_images", "explain")
+STAGES = PAGE_STAGES + BATCH_STAGES
+
+
+def _reset_peak_rss():
+    """Reset the kernel's peak-RSS counter (Linux >= 4.0); False if unsupported"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(fn, items, repeat, warmup):
+    """
+    Time `fn` after `warmup` untimed calls.
+
+    Returns:
+        dict with p50 / p95 / p99 / mean / min milliseconds, throughput
+        (items per second at the mean) and peak RSS (MB) while it ran
+    """
+    for _ in range(warmup):
+        fn()
+    per_case_rss = _reset_peak_rss()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(1000 * (time.perf_counter() - start))
+    samples = np.array(samples)
+    mean_ms = float(samples.mean())
+    return {
+        "repeat": repeat,
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "mean_ms": mean_ms,
+        "min_ms": float(samples.min()),
+        "throughput_per_s": items * 1000 / mean_ms if mean_ms > 0 else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_rss_scope": "case" if per_case_rss else "process",
+    }
+
+
+class ImageOnly(nn.Module):
+    """ForgeryNet with fixed edge / OCR inputs, for the single-input legacy GradCAM"""
+
+    def __init__(self, model, edge, ocr):
+        super().__init__()
+        self.model = model
+        self.edge = edge
+        self.ocr = ocr
+
+    def forward(self, img):
+        return self.model(img, self.edge, self.ocr)
+
+
+def write_random_checkpoint(model_loader, directory):
+    """Save the (recalibrated) random weights where main_inference_fixed can load them"""
+    path = Path(directory) / "random_forgerynet.pth"
+    torch.save(model_loader.model.state_dict(), str(path))
+    return path
+
+
+def load_app(model_path):
+    """
+    Import the FastAPI app in-process on `model_path`, with the result
+    cache off (every request must run the model) and minimal warmup.
+    """
+    os.environ["MODEL_PATH"] = str(model_path)
+    os.environ.setdefault("RESULT_CACHE_ENTRIES", "0")
+    os.environ.setdefault("WARMUP_BATCH_SIZE", "1")
+    import main_inference_fixed
+    # Loaded up front: the client is used without lifespan, which would load it in the background
+    if main_inference_fixed.load_model() is None:
+        raise RuntimeError("main_inference_fixed failed to load the benchmark model")
+    from fastapi.testclient import TestClient
+    return TestClient(main_inference_fixed.app)
+
+
+def run_suite(args):
+    stages = args.stages.split(",") if args.stages else list(STAGES)
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages {sorted(unknown)}; expected some of {', '.join(STAGES)}")
+    sizes = [tuple(int(v) for v in size.split("x")) for size in args.sizes.split(",")]
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    torch.manual_seed(args.seed)
+    if args.model_path.lower() == "none":
+        model_loader = ModelLoader(None)
+        recalibrate_batchnorm(model_loader, synthetic_documents(args.calibration_docs, seed=args.seed))
+    else:
+        model_loader = ModelLoader(args.model_path)
+    model = model_loader.model
+
+    client = None
+    workdir = tempfile.TemporaryDirectory(prefix="bench_suite_")
+    if any(stage.startswith("e2e_") for stage in stages):
+        checkpoint = args.model_path
+        if checkpoint.lower() == "none":
+            checkpoint = write_random_checkpoint(model_loader, workdir.name)
+        client = load_app(checkpoint)
+
+    results = []
+
+    def record(stage, size, batch_size, fn, repeat=None, **extra):
+        name = f"{stage}/{size[0]}x{size[1]}/b{batch_size}"
+        result = measure(fn, batch_size, repeat or args.repeat, args.warmup)
+        result.update({"name": name, "stage": stage, "page_size": list(size), "batch_size": batch_size, **extra})
+        results.append(result)
+        print(
+            f"{name:42s} p50 {result['p50_ms']:9.2f}  p95 {result['p95_ms']:9.2f}  p99 {result['p99_ms']:9.2f} ms  "
+            f"{result['throughput_per_s']:8.1f}/s  RSS {result['peak_rss_mb']:7.0f} MB",
+            flush=True,
+        )
+
+    for size in sizes:
+        data = make_document(size[0], size[1], "JPEG")
+        page = decode_image(data)
+        decoded = {"decoded_size": list(page.size)}
+
+        if "decode" in stages:
+            record("decode", size, 1, lambda: decode_image(data), upload_bytes=len(data), **decoded)
+        if "transform" in stages:
+            record("transform", size, 1, lambda: model_loader.transform(page), **decoded)
+        if "extract_edges" in stages:
+            record("extract_edges", size, 1, lambda: model_loader.extract_edges(page), **decoded)
+        if "predict" in stages:
+            record("predict", size, 1, lambda: model_loader.predict(page), **decoded)
+
+        img, edge, ocr = model_loader.prepare_batch([page])
+        heatmap = Explainer(model).explain((img, edge, ocr))[2][0]
+        if "gradcam" in stages:
+            cam = GradCAM(ImageOnly(model, edge, ocr), model.back[-1])
+            try:
+                record("gradcam", size, 1, lambda: cam(img), **decoded)
+            finally:
+                cam.remove_hooks()
+                model.zero_grad(set_to_none=True)
+        overlay = create_heatmap_overlay(page, heatmap)
+        if "overlay" in stages:
+            record("overlay", size, 1, lambda: create_heatmap_overlay(page, heatmap), **decoded)
+        if "base64" in stages:
+            record("base64", size, 1, lambda: heatmap_to_base64(overlay), **decoded)
+
+        for stage, query in (("e2e_predict", ""), ("e2e_predict_nogradcam", "?gradcam=false")):
+            if stage not in stages:
+                continue
+
+            def post(query=query):
+                response = client.post(f"/predict{query}", files={"file": ("page.jpg", data, "image/jpeg")})
+                response.raise_for_status()
+            record(stage, size, 1, post, upload_bytes=len(data), **decoded)
+
+        for batch_size in batch_sizes:
+            pages = [page] * batch_size
+            if "predict_images" in stages:
+                record("predict_images", size, batch_size, lambda: model_loader.predict_images(pages), **decoded)
+            if "explain" in stages:
+                inputs = model_loader.prepare_batch(pages)
+                explainer = Explainer(model)
+                record("explain", size, batch_size, lambda: explainer.explain(inputs), **decoded)
+
+    workdir.cleanup()
+    return results
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "model": "random" if args.model_path.lower() == "none" else args.model_path,
+        "args": vars(args),
+    }
+
+
+def compare(results, baseline, metric, threshold, min_delta_ms):
+    """
+    Compare each case with the baseline run.
+
+    Returns:
+        list of comparison rows; a row is a regression when the metric grew
+        by more than `threshold` (fraction) and more than `min_delta_ms`
+    """
+    previous = {r["name"]: r for r in baseline["results"]}
+    rows = []
+    for result in results:
+        before = previous.get(result["name"])
+        if before is None:
+            rows.append({"name": result["name"], "status": "new"})
+            continue
+        delta = result[metric] - before[metric]
+        ratio = result[metric] / before[metric] if before[metric] > 0 else float("inf")
+        regression = ratio > 1 + threshold and delta > min_delta_ms
+        improvement = ratio < 1 - threshold and -delta > min_delta_ms
+        rows.append({
+            "name": result["name"],
+            "baseline_ms": before[metric],
+            "current_ms": result[metric],
+            "ratio": ratio,
+            "status": "regression" if regression else "improvement" if improvement else "ok",
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model-path", default="none", help='checkpoint, or "none" for random weights (default)')
+    parser.add_argument("--sizes", default="1240x1754,2480x3508", help="page sizes WxH (A4 at 150 / 300 DPI)")
+    parser.add_argument("--batch-sizes", default="1,8")
+    parser.add_argument("--stages", help=f"comma-separated subset of: {', '.join(STAGES)}")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--calibration-docs", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write results JSON here (usable as a later --baseline)")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--metric", choices=("p50_ms", "p95_ms", "p99_ms", "mean_ms", "min_ms"), default="p50_ms")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown counted as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    # The model and server log every request at INFO
+    logging.disable(logging.INFO)
+
+    report = {"environment": environment(args), "results": run_suite(args)}
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare(report["results"], baseline, args.metric, args.threshold, args.min_delta_ms)
+        report["comparison"] = {
+            "baseline": args.baseline,
+            "baseline_environment": baseline.get("environment"),
+            "metric": args.metric,
+            "threshold": args.threshold,
+            "min_delta_ms": args.min_delta_ms,
+            "cases": rows,
+        }
+        print(f"\nCompared with {args.baseline} ({args.metric}, threshold {args.threshold:.0%}):")
+        for row in rows:
+            if row["status"] == "new":
+                print(f"  {row['name']:42s} new")
+            else:
+                print(f"  {row['name']:42s} {row['baseline_ms']:9.2f} -> {row['current_ms']:9.2f} ms  "
+                      f"x{row['ratio']:.2f}  {row['status']}")
+        regressions = [row["name"] for row in rows if row["status"] == "regression"]
+        old_env, new_env = baseline.get("environment", {}), report["environment"]
+        for key in ("torch", "processor", "cpu_count", "torch_threads"):
+            if old_env.get(key) != new_env[key]:
+                print(f"  warning: {key} differs from the baseline ({old_env.get(key)} vs {new_env[key]})")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+    else:
+        print(json.dumps(report, indent=2))
+
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
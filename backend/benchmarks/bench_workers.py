@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Benchmark memory and throughput of serve_workers.py versus worker count.
+
+For each worker count and mode (shared weights vs. independent copies)
+the server is started on a local port, total RSS and PSS of the process
+tree are read from /proc, and /predict?gradcam=false is driven by
+concurrent clients for a fixed duration.
+
+    python benchmarks/bench_workers.py --workers 1,2,4 --duration 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def make_upload(width=1240, height=1754):
+    """A4-at-150-DPI-sized synthetic page as JPEG bytes"""
+    rng = np.random.default_rng(0)
+    page = np.full((height, width, 3), 235, dtype=np.uint8)
+    page = np.clip(page.astype(np.int16) + rng.integers(-15, 15, page.shape), 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(page).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def multipart_body(data, filename="page.jpg"):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def process_tree(pid):
+    pids = [pid]
+    for task in Path(f"/proc/{pid}/task").glob("*"):
+        try:
+            children = (task / "children").read_text().split()
+        except OSError:
+            continue
+        for child in children:
+            pids.extend(process_tree(int(child)))
+    return pids
+
+
+def memory_mb(pid):
+    """Total RSS and PSS (MB) of a process and its descendants"""
+    rss = pss = 0
+    for p in process_tree(pid):
+        try:
+            for line in Path(f"/proc/{p}/smaps_rollup").read_text().splitlines():
+                if line.startswith("Rss:"):
+                    rss += int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    pss += int(line.split()[1])
+        except OSError:
+            continue
+    return rss / 1024, pss / 1024
+
+
+def wait_ready(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/ready", timeout=2) as resp:
+                if json.load(resp).get("ready"):
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def drive_load(url, body, content_type, concurrency, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client():
+        while time.time() < stop_at:
+            request = urllib.request.Request(
+                url + "/predict?gradcam=false", data=body,
+                headers={"Content-Type": content_type}, method="POST"
+            )
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=120) as resp:
+                    resp.read()
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            except (urllib.error.URLError, ConnectionError, OSError):
+                with lock:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - started
+
+    latencies.sort()
+    pick = lambda q: 1000 * latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+    }
+
+
+def run_case(workers, mode, args, body, content_type):
+    port = args.port
+    env = dict(os.environ, RESULT_CACHE_ENTRIES="0", INFERENCE_MAX_QUEUE="1000")
+    if args.model_path:
+        env["MODEL_PATH"] = args.model_path
+    cmd = [sys.executable, "serve_workers.py", "--workers", str(workers), "--port", str(port),
+           "--host", "127.0.0.1", "--mode", mode]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        if not wait_ready(url, args.startup_timeout):
+            raise RuntimeError(f"server with {workers} workers ({mode}) did not become ready")
+        # Every worker must have served once before memory is sampled
+        drive_load(url, body, content_type, concurrency=workers * 2, duration=2)
+        rss, pss = memory_mb(proc.pid)
+        load = drive_load(url, body, content_type, args.concurrency or workers * 2, args.duration)
+        return {"workers": workers, "mode": mode, "rss_mb": rss, "pss_mb": pss, **load}
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--modes", default="shared,independent")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=None, help="clients (default: 2 per worker)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model-path", default=None, help="checkpoint (default: server's MODEL_PATH)")
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    args = parser.parse_args()
+
+    body, content_type = multipart_body(make_upload())
+    results = []
+    for mode in args.modes.split(","):
+        for workers in [int(w) for w in args.workers.split(",")]:
+            result = run_case(workers, mode, args, body, content_type)
+            results.append(result)
+            print(
+                f"{mode:11s} workers={workers}: RSS {result['rss_mb']:7.1f} MB, PSS {result['pss_mb']:7.1f} MB, "
+                f"{result['throughput_rps']:6.2f} req/s, p50 {result['p50_ms'] or 0:7.1f} ms, "
+                f"errors {result['errors']}"
+            )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
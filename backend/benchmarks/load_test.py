@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Load generator for the inference API, in-process or over HTTP.
+
+Drives main_inference_fixed.app (or temp_server.app, the stub whose
+/predict does no work, to measure pure framework overhead) through
+httpx's ASGI transport in this process, or a server at --url, or a local
+uvicorn started with --serve. Two arrival models:
+
+  closed loop  --concurrency N clients, each sending its next request as
+               soon as the previous one finished
+  open loop    --rate R requests/s arriving independently of completions
+               (Poisson by default), the way real traffic does; arrivals
+               beyond --max-outstanding are dropped and counted
+
+Requests are drawn from --mix (predict = inline Grad-CAM,
+predict_nogradcam, health) with synthetic document scans of --sizes as
+uploads (distinct images, and the result cache is disabled in-process,
+so uploads are not answered from the cache). The report has throughput,
+latency percentiles per request kind, status counts with 429 / 503 /
+error rates, and a timeline per --interval with event-loop lag. In-process
+the lag is the app's own loop (the load generator shares it, so its
+overhead is included); over HTTP it is only the load generator's loop.
+
+    python benchmarks/load_test.py --concurrency 8 --duration 30
+    python benchmarks/load_test.py --rate 4 --mix predict=0.2,predict_nogradcam=0.7,health=0.1
+    python benchmarks/load_test.py --target stub --concurrency 64 --duration 10
+    python benchmarks/load_test.py --serve --port 8765 --concurrency 16 --out load.json
+    python benchmarks/load_test.py --url http://10.0.0.5:8000 --rate 10
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from itertools import cycle
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+import httpx
+import numpy as np
+
+from bench_precision import synthetic_documents
+
+# Request kinds available to --mix: (method, path, sends an upload)
+REQUEST_KINDS = {
+    "predict": ("POST", "/predict", True),
+    "predict_nogradcam": ("POST", "/predict?gradcam=false", True),
+    "health": ("GET", "/health", False),
+}
+
+# Modules serving each --target
+TARGETS = {
+    "app": "main_inference_fixed",
+    "stub": "temp_server",
+}
+
+
+def parse_mix(spec):
+    """'predict=0.5,health=0.5' -> (kinds, normalized weights)"""
+    weights = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in REQUEST_KINDS:
+            raise SystemExit(f"Unknown request kind {kind!r} in --mix; expected some of {', '.join(REQUEST_KINDS)}")
+        weights[kind] = float(weight) if weight else 1.0
+    total = sum(weights.values())
+    if total <= 0:
+        raise SystemExit("--mix weights must sum to more than 0")
+    return list(weights), [w / total for w in weights.values()]
+
+
+def make_uploads(sizes, per_size, seed=0):
+    """Distinct synthetic scans as JPEG bytes, `per_size` for each (width, height)"""
+    uploads = []
+    for index, (width, height) in enumerate(sizes):
+        for page in synthetic_documents(per_size, seed=seed + index):
+            buffer = io.BytesIO()
+            page.resize((width, height)).save(buffer, format="JPEG", quality=90)
+            uploads.append((f"page_{width}x{height}_{len(uploads)}.jpg", buffer.getvalue()))
+    random.Random(seed).shuffle(uploads)
+    return uploads
+
+
+def percentiles(latencies_s):
+    if not latencies_s:
+        return {"count": 0}
+    ms = 1000 * np.asarray(latencies_s)
+    return {
+        "count": len(ms),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+class LoadRun:
+    """One load test: sends requests, records (start, kind, status, latency) and loop lag"""
+
+    def __init__(self, client, kinds, weights, uploads, timeout_s, seed=0):
+        self.client = client
+        self.kinds = kinds
+        self.weights = weights
+        self.uploads = cycle(uploads)
+        self.timeout_s = timeout_s
+        self.rng = random.Random(seed)
+        self.records = []  # (start offset s, kind, status or None, latency s, error)
+        self.loop_lag = []  # (offset s, lag s)
+        self.dropped = 0
+        self.outstanding = 0
+        self.max_outstanding_seen = 0
+        self.t0 = None
+
+    def _now(self):
+        return time.perf_counter() - self.t0
+
+    async def send(self):
+        kind = self.rng.choices(self.kinds, self.weights)[0]
+        method, path, upload = REQUEST_KINDS[kind]
+        files = None
+        if upload:
+            name, data = next(self.uploads)
+            files = {"file": (name, data, "image/jpeg")}
+        self.outstanding += 1
+        self.max_outstanding_seen = max(self.max_outstanding_seen, self.outstanding)
+        start = self._now()
+        status, error = None, None
+        try:
+            response = await self.client.request(method, path, files=files, timeout=self.timeout_s)
+            status = response.status_code
+        except Exception as e:
+            error = type(e).__name__
+        finally:
+            self.outstanding -= 1
+        self.records.append((start, kind, status, self._now() - start, error))
+
+    async def monitor_lag(self, interval_s, stop):
+        loop = asyncio.get_running_loop()
+        while not stop.is_set():
+            start = loop.time()
+            await asyncio.sleep(interval_s)
+            self.loop_lag.append((self._now(), max(0.0, loop.time() - start - interval_s)))
+
+    async def closed_loop(self, concurrency, duration_s):
+        async def client():
+            while self._now() < duration_s:
+                # In-process, a request that never blocks (the stub) completes without
+                # suspending; yield so clients interleave and the lag probe gets to run
+                await asyncio.sleep(0)
+                await self.send()
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    async def open_loop(self, rate, duration_s, arrival, max_outstanding):
+        tasks = set()
+        next_arrival = 0.0
+        while next_arrival < duration_s:
+            delay = next_arrival - self._now()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.outstanding >= max_outstanding:
+                self.dropped += 1
+            else:
+                task = asyncio.create_task(self.send())
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            next_arrival += self.rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def run(self, args):
+        stop = asyncio.Event()
+        self.t0 = time.perf_counter()
+        lag_task = asyncio.create_task(self.monitor_lag(args.lag_interval, stop))
+        total_s = args.warmup + args.duration
+        if args.rate:
+            await self.open_loop(args.rate, total_s, args.arrival, args.max_outstanding)
+        else:
+            await self.closed_loop(args.concurrency, total_s)
+        stop.set()
+        await lag_task
+        return self.report(args)
+
+    def report(self, args):
+        measured = [r for r in self.records if r[0] >= args.warmup]
+        elapsed = max((r[0] + r[3] for r in measured), default=args.warmup) - args.warmup
+
+        def summary(records):
+            statuses = {}
+            for _, _, status, _, error in records:
+                key = str(status) if status is not None else f"error:{error}"
+                statuses[key] = statuses.get(key, 0) + 1
+            ok = [r[3] for r in records if r[2] is not None and r[2] < 400]
+            n = len(records)
+            rejected_429 = statuses.get("429", 0)
+            timed_out_503 = statuses.get("503", 0)
+            errors = sum(c for k, c in statuses.items() if not k.isdigit() or (int(k) >= 400 and k not in ("429", "503")))
+            return {
+                "requests": n,
+                "throughput_rps": len(ok) / elapsed if elapsed > 0 else None,
+                "statuses": statuses,
+                "rate_429": rejected_429 / n if n else None,
+                "rate_503": timed_out_503 / n if n else None,
+                "error_rate": errors / n if n else None,
+                "latency_ok": percentiles(ok),
+                "latency_all": percentiles([r[3] for r in records]),
+            }
+
+        timeline = []
+        total_s = args.warmup + args.duration
+        for window_start in np.arange(0, total_s, args.interval):
+            window_end = window_start + args.interval
+            done = [r for r in self.records if window_start <= r[0] + r[3] < window_end]
+            lags = [lag for t, lag in self.loop_lag if window_start <= t < window_end]
+            ok = [r[3] for r in done if r[2] is not None and r[2] < 400]
+            timeline.append({
+                "t_s": float(window_start),
+                "warmup": bool(window_start < args.warmup),
+                "completed": len(done),
+                "ok_rps": len(ok) / args.interval,
+                "p50_ms": float(1000 * np.percentile(ok, 50)) if ok else None,
+                "p95_ms": float(1000 * np.percentile(ok, 95)) if ok else None,
+                "status_429": sum(r[2] == 429 for r in done),
+                "errors": sum(r[2] is None or (r[2] >= 400 and r[2] != 429) for r in done),
+                "loop_lag_mean_ms": float(1000 * np.mean(lags)) if lags else None,
+                "loop_lag_max_ms": float(1000 * np.max(lags)) if lags else None,
+            })
+
+        lags = [lag for t, lag in self.loop_lag if t >= args.warmup]
+        return {
+            "mode": "open" if args.rate else "closed",
+            "measured_s": elapsed,
+            "overall": summary(measured),
+            "by_kind": {kind: summary([r for r in measured if r[1] == kind]) for kind in self.kinds},
+            "client_dropped": self.dropped,
+            "max_outstanding": self.max_outstanding_seen,
+            "loop_lag": {
+                "interval_ms": 1000 * args.lag_interval,
+                **{k.replace("_ms", "_lag_ms"): v for k, v in percentiles(lags).items() if k != "count"},
+            },
+            "timeline": timeline,
+        }
+
+
+def load_in_process(target, model_path, keep_cache):
+    """
+    Import the target app in this process. For "app", the result cache is
+    disabled unless `keep_cache`, and model_path "none" serves random
+    weights written to a temporary checkpoint.
+    """
+    if target == "app":
+        if not keep_cache:
+            os.environ.setdefault("RESULT_CACHE_ENTRIES", "0")
+        if model_path and model_path.lower() == "none":
+            from bench_precision import recalibrate_batchnorm
+            from bench_suite import write_random_checkpoint
+            from model_loader import ModelLoader
+            loader = ModelLoader(None)
+            recalibrate_batchnorm(loader, synthetic_documents(8))
+            model_path = write_random_checkpoint(loader, tempfile.mkdtemp(prefix="load_test_"))
+            del loader
+        if model_path:
+            os.environ["MODEL_PATH"] = str(model_path)
+    module = __import__(TARGETS[target])
+    if target == "app" and module.load_model() is None:
+        print("warning: the model did not load; /predict is served in compatibility mode")
+    return module.app
+
+
+def start_server(target, port, model_path, keep_cache, timeout_s):
+    """Start `uvicorn <target>:app` on localhost and wait until it answers"""
+    env = dict(os.environ)
+    if target == "app":
+        if not keep_cache:
+            env.setdefault("RESULT_CACHE_ENTRIES", "0")
+        if model_path:
+            env["MODEL_PATH"] = model_path
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{TARGETS[target]}:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    probe = "/ready" if target == "app" else "/health"
+    deadline = time.time() + timeout_s
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {proc.returncode}")
+        try:
+            if httpx.get(url + probe, timeout=2).status_code == 200:
+                return proc, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f"{url}{probe} not ready after {timeout_s:.0f}s")
+
+
+def print_report(report):
+    overall = report["overall"]
+    print(f"\n{report['mode']} loop, {report['measured_s']:.1f}s measured: {overall['requests']} requests, "
+          f"{overall['throughput_rps'] or 0:.2f} ok req/s, 429 {overall['rate_429'] or 0:.1%}, "
+          f"503 {overall['rate_503'] or 0:.1%}, errors {overall['error_rate'] or 0:.1%}, "
+          f"client-dropped {report['client_dropped']}")
+    for kind, summary in report["by_kind"].items():
+        latency = summary["latency_ok"]
+        if latency["count"]:
+            print(f"  {kind:18s} n={summary['requests']:5d}  p50 {latency['p50_ms']:8.1f}  p95 {latency['p95_ms']:8.1f}  "
+                  f"p99 {latency['p99_ms']:8.1f} ms  statuses {summary['statuses']}")
+        else:
+            print(f"  {kind:18s} n={summary['requests']:5d}  statuses {summary['statuses']}")
+    lag = report["loop_lag"]
+    if "p50_lag_ms" in lag:
+        print(f"  event-loop lag     p50 {lag['p50_lag_ms']:8.1f}  p99 {lag['p99_lag_ms']:8.1f}  "
+              f"max {lag['max_lag_ms']:8.1f} ms")
+    print("  timeline:  t(s)  ok/s   p50(ms)   p95(ms)  429  err  lag max(ms)")
+    for row in report["timeline"]:
+        fmt = lambda v: f"{v:9.1f}" if v is not None else "        -"
+        print(f"           {row['t_s']:5.0f} {row['ok_rps']:5.1f} {fmt(row['p50_ms'])} {fmt(row['p95_ms'])} "
+              f"{row['status_429']:4d} {row['errors']:4d} {fmt(row['loop_lag_max_ms'])}"
+              f"{'  (warmup)' if row['warmup'] else ''}")
+
+
+async def run(args, app=None, url=None):
+    kinds, weights = parse_mix(args.mix)
+    sizes = [tuple(int(v) for v in size.split("x")) for size in args.sizes.split(",")]
+    uploads = make_uploads(sizes, args.images_per_size, seed=args.seed)
+    if app is not None:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest")
+    else:
+        limit = args.max_outstanding if args.rate else args.concurrency
+        client = httpx.AsyncClient(base_url=url, limits=httpx.Limits(max_connections=limit))
+    async with client:
+        return await LoadRun(client, kinds, weights, uploads, args.timeout, seed=args.seed).run(args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", choices=sorted(TARGETS), default="app",
+                        help="app to serve in-process or with --serve (stub = temp_server, no model)")
+    parser.add_argument("--url", help="drive an already running server instead")
+    parser.add_argument("--serve", action="store_true", help="start a local uvicorn for --target")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--model-path", help='checkpoint for --target app ("none" = random weights)')
+    parser.add_argument("--keep-cache", action="store_true", help="leave the result cache enabled")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed loop: concurrent clients")
+    parser.add_argument("--rate", type=float, help="open loop: arrivals per second (overrides --concurrency)")
+    parser.add_argument("--arrival", choices=("poisson", "uniform"), default="poisson")
+    parser.add_argument("--max-outstanding", type=int, default=256, help="open loop: in-flight cap")
+    parser.add_argument("--mix", default="predict=0.3,predict_nogradcam=0.6,health=0.1")
+    parser.add_argument("--sizes", default="1240x1754,2480x3508", help="upload page sizes WxH")
+    parser.add_argument("--images-per-size", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds excluded from the summary")
+    parser.add_argument("--interval", type=float, default=5, help="timeline window (s)")
+    parser.add_argument("--lag-interval", type=float, default=0.05, help="event-loop probe period (s)")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout (s)")
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the report JSON here")
+    args = parser.parse_args()
+
+    proc = None
+    app = None
+    url = args.url
+    if args.serve and not url:
+        proc, url = start_server(args.target, args.port, args.model_path, args.keep_cache, args.startup_timeout)
+    elif not url:
+        import logging
+        # The app logs every request at INFO, which would dominate the measurement
+        logging.disable(logging.INFO)
+        app = load_in_process(args.target, args.model_path, args.keep_cache)
+
+    try:
+        report = asyncio.run(run(args, app=app, url=url))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    report["config"] = {
+        "target": url or f"in-process:{args.target}",
+        **{k: v for k, v in vars(args).items() if k not in ("url", "out")},
+    }
+    print_report(report)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+import asyncio
+import io
+import itertools
+import json
+import logging
+import tarfile
+import time
+import zipfile
+from collections import Counter
+from pathlib import PurePosixPath
+
+from image_io import DEFAULT_MAX_SIDE, decode_image
+from upload_limits import UploadRejected, inspect_image
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+TAR_CONTENT_TYPES = {
+    "application/x-tar",
+    "application/tar",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-gtar",
+    "application/x-compressed-tar",
+}
+
+
+def is_archive_content_type(content_type):
+    """True if the request body is a ZIP or TAR archive"""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return media_type in ZIP_CONTENT_TYPES or media_type in TAR_CONTENT_TYPES
+
+
+def is_zip_content_type(content_type):
+    """True for ZIP, whose central directory (at the end) is needed before any member is read"""
+    return (content_type or "").split(";")[0].strip().lower() in ZIP_CONTENT_TYPES
+
+
+class BodyReader(io.RawIOBase):
+    """
+    Blocking, non-seekable file object over an async byte stream such as
+    Starlette's request.stream(), so tarfile's streaming mode can read an
+    archive while it uploads. Each read waits for the next chunk on
+    `loop`; only use it from a worker thread, never from the loop itself.
+    """
+
+    def __init__(self, chunks, loop):
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+        self._buffer = b""
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    async def _next_chunk(self):
+        try:
+            return await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self._eof = True
+            return b""
+
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            self._buffer = asyncio.run_coroutine_threadsafe(self._next_chunk(), self._loop).result()
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def _is_image_name(name):
+    path = PurePosixPath(name)
+    if any(part.startswith(".") or part == "__MACOSX" for part in path.parts):
+        return False
+    return path.suffix.lower() in IMAGE_EXTENSIONS
+
+
+def _oversized(name, size, max_member_bytes):
+    logger.warning(f"[Bulk] Skipping {name}: {size} bytes uncompressed")
+    return UploadRejected(413, f"Archive member is {size} bytes; the per-file limit is {max_member_bytes} bytes")
+
+
+def iter_archive(fileobj, content_type, max_member_bytes=None):
+    """
+    Yield (name, bytes) for every image member of a ZIP or TAR archive.
+
+    TAR archives (optionally gzip/bz2/xz compressed) are read sequentially
+    in streaming mode, so `fileobj` can be a BodyReader over the upload;
+    ZIP needs its central directory, so `fileobj` must be seekable.
+
+    Args:
+        fileobj: binary file object positioned at the start of the archive
+        content_type: request Content-Type used to pick the archive format
+        max_member_bytes: members whose uncompressed size is larger are not
+            extracted (zip bombs); they are yielded with an UploadRejected
+            in place of their bytes
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+
+    if media_type in ZIP_CONTENT_TYPES:
+        with zipfile.ZipFile(fileobj) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not _is_image_name(info.filename):
+                    continue
+                if max_member_bytes is not None and info.file_size > max_member_bytes:
+                    yield info.filename, _oversized(info.filename, info.file_size, max_member_bytes)
+                    continue
+                yield info.filename, zf.read(info)
+    elif media_type in TAR_CONTENT_TYPES:
+        with tarfile.open(fileobj=fileobj, mode="r|*") as tf:
+            for member in tf:
+                if not member.isfile() or not _is_image_name(member.name):
+                    continue
+                if max_member_bytes is not None and member.size > max_member_bytes:
+                    yield member.name, _oversized(member.name, member.size, max_member_bytes)
+                    continue
+                yield member.name, tf.extractfile(member).read()
+    else:
+        raise ValueError(f"Unsupported archive type: {content_type}")
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def run_bulk_prediction(model_loader, entries, batch_size=8, gradcam=False, executor=None,
+                              max_files=None, max_side=DEFAULT_MAX_SIDE, image_limits=None):
+    """
+    Predict over many uploaded images, yielding one NDJSON line per file.
+
+    Files are decoded concurrently in chunks of `batch_size`, each chunk
+    runs through the model as one batch, and decoding of the next chunk
+    overlaps with inference of the current one. A final summary line is
+    emitted after the last file.
+
+    Args:
+        model_loader: ModelLoader instance
+        entries: iterable of (filename, bytes); advanced on `executor`, so it
+            may block on upload data (e.g. iter_archive over a BodyReader)
+        batch_size: images per forward pass
+        gradcam: include a base64 PNG Grad-CAM overlay for each file
+        executor: concurrent.futures executor for decode/inference (None = loop default)
+        max_files: stop with an error line after this many files (None = no limit)
+        max_side: longest side images are decoded to (see image_io.decode_image)
+        image_limits: keyword arguments for upload_limits.inspect_image, checked
+            on each file's header before decoding (None = no check)
+
+    Yields:
+        bytes: newline-terminated JSON objects
+    """
+    loop = asyncio.get_running_loop()
+    start_time = time.time()
+    class_counts = Counter()
+    processed = 0
+    errors = 0
+    truncated = False
+
+    def infer(images):
+        if gradcam:
+            return model_loader.explain_images(images)
+        return model_loader.predict_images(images), None
+
+    def render(img, heatmap):
+        from gradcam import create_heatmap_overlay, heatmap_to_base64
+        return heatmap_to_base64(create_heatmap_overlay(img, heatmap))
+
+    def load(data):
+        if isinstance(data, UploadRejected):
+            raise data
+        if image_limits is not None:
+            inspect_image(data, **image_limits)
+        return decode_image(data, max_side)
+
+    async def decode_chunk(chunk):
+        tasks = [loop.run_in_executor(executor, load, data) for _, data in chunk]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    if max_files is not None:
+        # One extra entry tells us the limit was exceeded
+        entries = itertools.islice(entries, max_files + 1)
+
+    index = 0
+    read_error = None
+    chunks = _chunks(entries, max(1, batch_size))
+
+    async def advance():
+        # Reads (and for archives decompresses) upload data: off the event loop
+        nonlocal read_error
+        try:
+            return await loop.run_in_executor(executor, next, chunks, None)
+        except Exception as e:
+            logger.error(f"[Bulk] Reading the upload failed: {e}")
+            read_error = e
+            return None
+
+    current = await advance()
+    pending = asyncio.ensure_future(decode_chunk(current)) if current else None
+
+    while current is not None:
+        decoded = await pending
+        upcoming = await advance()
+        if max_files is not None and index + len(current) > max_files:
+            keep = max_files - index
+            current, decoded, upcoming = current[:keep], decoded[:keep], None
+            truncated = True
+        pending = asyncio.ensure_future(decode_chunk(upcoming)) if upcoming else None
+
+        lines = [None] * len(current)
+        ok_rows = []
+        for row, ((name, _), result) in enumerate(zip(current, decoded)):
+            if isinstance(result, UploadRejected):
+                errors += 1
+                lines[row] = {"index": index + row, "filename": name, "error": f"Rejected: {result.detail}"}
+            elif isinstance(result, Exception):
+                errors += 1
+                lines[row] = {"index": index + row, "filename": name, "error": f"Could not decode image: {result}"}
+            else:
+                ok_rows.append(row)
+
+        if ok_rows:
+            try:
+                predictions, heatmaps = await loop.run_in_executor(
+                    executor, infer, [decoded[row] for row in ok_rows]
+                )
+                for k, row in enumerate(ok_rows):
+                    prediction = predictions[k]
+                    class_counts[prediction["class_name"]] += 1
+                    line = {"index": index + row, "filename": current[row][0], "prediction": prediction}
+                    if heatmaps is not None:
+                        line["gradcam"] = await loop.run_in_executor(
+                            executor, render, decoded[row], heatmaps[k]
+                        )
+                        line["gradcam_shape"] = list(heatmaps[k].shape)
+                    lines[row] = line
+            except Exception as e:
+                logger.error(f"[Bulk] Batch inference failed: {e}", exc_info=True)
+                for row in ok_rows:
+                    errors += 1
+                    lines[row] = {"index": index + row, "filename": current[row][0], "error": f"Prediction failed: {e}"}
+
+        for line in lines:
+            yield (json.dumps(line) + "\n").encode("utf-8")
+
+        processed += len(current)
+        index += len(current)
+        current = upcoming
+
+    if truncated:
+        errors += 1
+        error = {"error": f"Too many files: only the first {max_files} were processed"}
+        yield (json.dumps(error) + "\n").encode("utf-8")
+    if read_error is not None:
+        errors += 1
+        error = {"error": f"Could not read the upload after {processed} files: {read_error}"}
+        yield (json.dumps(error) + "\n").encode("utf-8")
+
+    total_time = time.time() - start_time
+    logger.info(f"[Bulk] Processed {processed} files ({errors} errors) in {total_time:.3f}s")
+    summary = {
+        "summary": {
+            "files": processed,
+            "errors": errors,
+            "truncated": truncated,
+            "class_counts": dict(class_counts),
+            "total_time_s": round(total_time, 3),
+        }
+    }
+    yield (json.dumps(summary) + "\n").encode("utf-8")
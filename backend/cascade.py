@@ -0,0 +1,214 @@
+import logging
+import random
+import threading
+from collections import deque
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torchvision import models
+
+from backends import InferenceBackend
+
+logger = logging.getLogger(__name__)
+
+# Final feature channels of each supported screening backbone
+SCREENING_ARCHS = {
+    "mobilenet_v3_small": 576,
+    "efficientnet_b0": 1280,
+}
+
+# Margins at which /stats/cascade reports escalation rate and agreement
+REPORT_MARGINS = (0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99)
+
+
+class ScreeningNet(nn.Module):
+    """
+    Cheap first cascade stage: a small backbone on a downscaled copy of
+    ForgeryNet's preprocessed image input, with a linear classifier over
+    the same classes. Trained by distillation from the full model
+    (distill_screening.py).
+    """
+
+    def __init__(self, arch="mobilenet_v3_small", input_size=160, num_classes=7):
+        super().__init__()
+        if arch not in SCREENING_ARCHS:
+            raise ValueError(f"Unknown screening architecture {arch!r}; expected one of {tuple(SCREENING_ARCHS)}")
+        self.arch = arch
+        self.input_size = input_size
+        self.num_classes = num_classes
+        self.features = getattr(models, arch)(weights=None).features
+        self.pool = nn.AdaptiveAvgPool2d(1)
+        self.classifier = nn.Linear(SCREENING_ARCHS[arch], num_classes)
+
+    def forward(self, img):
+        if img.shape[-1] != self.input_size or img.shape[-2] != self.input_size:
+            img = F.interpolate(img, size=(self.input_size, self.input_size), mode="bilinear",
+                                align_corners=False, antialias=True)
+        x = self.pool(self.features(img)).flatten(1)
+        return self.classifier(x)
+
+
+def save_screening_model(model, path, teacher_fingerprint=None, report=None):
+    """Write a screening checkpoint (architecture, weights, teacher it was distilled from)"""
+    torch.save({
+        "arch": model.arch,
+        "input_size": model.input_size,
+        "num_classes": model.num_classes,
+        "teacher_fingerprint": teacher_fingerprint,
+        "report": report,
+        "state_dict": model.state_dict(),
+    }, str(path))
+
+
+def load_screening_model(path, device="cpu"):
+    """
+    Load a checkpoint written by save_screening_model.
+
+    Returns:
+        tuple (eval-mode ScreeningNet, checkpoint metadata dict)
+    """
+    checkpoint = torch.load(str(path), map_location=device, weights_only=True)
+    model = ScreeningNet(checkpoint["arch"], checkpoint["input_size"], checkpoint["num_classes"])
+    model.load_state_dict(checkpoint["state_dict"])
+    model.to(device).eval()
+    meta = {k: v for k, v in checkpoint.items() if k != "state_dict"}
+    return model, meta
+
+
+class ScreeningBackend(InferenceBackend):
+    """First cascade stage as a timed backend (ignores the edge / OCR inputs)"""
+
+    name = "screening"
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, img, edge, ocr):
+        with torch.no_grad():
+            return self.model(img)
+
+
+def top2_margin(probs):
+    """Top-1 minus top-2 probability per row of a (B, C) tensor"""
+    top = torch.topk(probs, 2, dim=1).values
+    return top[:, 0] - top[:, 1]
+
+
+class Cascade:
+    """
+    Confidence-gated two-stage inference.
+
+    Every batch is first scored by the screening stage. A row exits there
+    when its predicted class is one of `exit_classes` and the margin
+    between its two most likely classes is at least `margin`; all other
+    rows are escalated to the full model (and Grad-CAM). A random
+    `shadow_rate` fraction of exiting rows also runs the full model,
+    purely to measure agreement on the traffic that exits.
+
+    The last `history` screened rows are kept as (margin, screening class,
+    full-model class or None) so stats() can show, for candidate margins,
+    the escalation rate and how often the screening stage agrees with the
+    full model: the numbers needed to set the threshold safely.
+    """
+
+    def __init__(self, screening, class_names, margin=0.9, exit_classes=("positive",), shadow_rate=0.0,
+                 history=10000):
+        """
+        Args:
+            screening: ScreeningNet (eval mode)
+            class_names: class names, index = class id
+            margin: minimum top-1 minus top-2 probability to exit early
+            exit_classes: class names allowed to exit at the screening stage
+            shadow_rate: fraction of exiting rows also checked with the full model
+            history: screened rows kept for the threshold report
+        """
+        unknown = set(exit_classes) - set(class_names)
+        if unknown:
+            raise ValueError(f"Unknown cascade exit classes {sorted(unknown)}")
+        self.backend = ScreeningBackend(screening)
+        self.class_names = class_names
+        self.margin = margin
+        self.exit_classes = tuple(exit_classes)
+        self.exit_ids = {class_names.index(name) for name in exit_classes}
+        self.shadow_rate = shadow_rate
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history)
+        self.counters = {"screened": 0, "exited": 0, "escalated": 0, "shadowed": 0, "agreed": 0, "compared": 0}
+
+    def screen(self, batch):
+        """
+        Score a preprocessed (img, edge, ocr) batch with the screening stage.
+
+        Returns:
+            tuple (logits (B, C), exits: list of bool, needs_full: list of bool)
+            where needs_full marks escalated rows plus shadowed exits
+        """
+        logits = self.backend(*batch).float()
+        probs = torch.softmax(logits, dim=1)
+        margins = top2_margin(probs).tolist()
+        classes = probs.argmax(dim=1).tolist()
+        exits = [c in self.exit_ids and m >= self.margin for c, m in zip(classes, margins)]
+        needs_full = [not e or (self.shadow_rate > 0 and random.random() < self.shadow_rate) for e in exits]
+        with self._lock:
+            self.counters["screened"] += len(exits)
+            self.counters["exited"] += sum(exits)
+            self.counters["escalated"] += len(exits) - sum(exits)
+            self.counters["shadowed"] += sum(e and f for e, f in zip(exits, needs_full))
+        return logits, exits, needs_full
+
+    def record(self, screening_logits, full_class_ids):
+        """
+        Remember screened rows for the threshold report.
+
+        Args:
+            screening_logits: (B, C) screening logits
+            full_class_ids: per row, the full model's class id, or None if it did not run
+        """
+        probs = torch.softmax(screening_logits.float(), dim=1)
+        margins = top2_margin(probs).tolist()
+        classes = probs.argmax(dim=1).tolist()
+        with self._lock:
+            for margin, screened, full in zip(margins, classes, full_class_ids):
+                self._history.append((margin, screened, full))
+                if full is not None:
+                    self.counters["compared"] += 1
+                    self.counters["agreed"] += int(screened == full)
+
+    def reset_stats(self):
+        """Forget counters, history and screening latencies (e.g. after warmup)"""
+        with self._lock:
+            self._history.clear()
+            for key in self.counters:
+                self.counters[key] = 0
+        self.backend.reset_stats()
+
+    def stats(self):
+        """Escalation rate, agreement, per-stage latency and a margin -> (escalation, agreement) table"""
+        with self._lock:
+            counters = dict(self.counters)
+            history = list(self._history)
+        screened = counters["screened"]
+
+        table = []
+        for margin in sorted(set(REPORT_MARGINS) | {self.margin}):
+            exits = [(s, f) for m, s, f in history if s in self.exit_ids and m >= margin]
+            known = [(s, f) for s, f in exits if f is not None]
+            table.append({
+                "margin": margin,
+                "escalation_rate": 1 - len(exits) / len(history) if history else None,
+                # Agreement of exiting rows with the full model, where it ran (escalated or shadowed)
+                "exit_agreement": sum(s == f for s, f in known) / len(known) if known else None,
+                "exit_agreement_samples": len(known),
+            })
+        return {
+            "margin": self.margin,
+            "exit_classes": list(self.exit_classes),
+            "shadow_rate": self.shadow_rate,
+            **counters,
+            "escalation_rate": counters["escalated"] / screened if screened else None,
+            "agreement": counters["agreed"] / counters["compared"] if counters["compared"] else None,
+            "screening_latency": self.backend.stats(),
+            "thresholds": table,
+        }
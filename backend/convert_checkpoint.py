@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+One-time conversion of a training checkpoint into a fast-loading format.
+
+The notebook's `.pth` may be a full pickle (optimizer state, wrapper
+dicts, objects that need `weights_only=False`). This writes only the
+model's state_dict, with contiguous tensors, either as a torch zip file
+that ModelLoader memory-maps with `weights_only=True`, or as
+`.safetensors` when that package is installed.
+
+    python convert_checkpoint.py "best_model (1).pth" best_model.pt
+    python convert_checkpoint.py "best_model (1).pth" best_model.safetensors
+
+Point MODEL_PATH at the output file.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+
+from model_loader import checkpoint_architecture, load_state_dict_file, state_dict_fingerprint, unwrap_state_dict
+
+
+def convert(src, dst):
+    """Convert checkpoint `src` into `dst`; returns the architecture dict"""
+    checkpoint = torch.load(src, map_location="cpu", weights_only=False)
+    state_dict = {
+        name: tensor.detach().contiguous()
+        for name, tensor in unwrap_state_dict(checkpoint).items()
+    }
+    arch = checkpoint_architecture(state_dict)
+
+    tmp = f"{dst}.tmp"
+    if str(dst).endswith(".safetensors"):
+        from safetensors.torch import save_file
+        save_file(state_dict, tmp)
+    else:
+        torch.save(state_dict, tmp)
+    os.replace(tmp, dst)
+
+    # Round trip through the fast path and compare
+    reloaded, checkpoint_format = load_state_dict_file(dst)
+    if state_dict_fingerprint(reloaded) != state_dict_fingerprint(state_dict):
+        raise RuntimeError(f"{dst} does not reproduce the weights of {src}")
+    if checkpoint_format == "pickle":
+        raise RuntimeError(f"{dst} cannot be memory-mapped")
+    return arch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a checkpoint for fast, memory-mapped loading")
+    parser.add_argument("src", help="checkpoint saved by the training notebook")
+    parser.add_argument("dst", help="output file (.pt or .safetensors)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    arch = convert(args.src, args.dst)
+    size_mb = os.path.getsize(args.dst) / 2**20
+    print(f"Wrote {args.dst} ({size_mb:.1f} MB) in {time.perf_counter() - start:.2f}s")
+    print(f"Architecture: {arch}")
+
+
+if __name__ == "__main__":
+    main()
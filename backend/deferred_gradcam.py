@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    __slots__ = ("result_id", "content", "cache_key", "created", "heatmap", "encoded", "task", "size")
+
+    def __init__(self, result_id, content, cache_key):
+        self.result_id = result_id
+        self.content = content
+        self.cache_key = cache_key
+        self.created = time.monotonic()
+        self.heatmap = None
+        self.encoded = {}  # variant -> payload bytes
+        self.task = None
+        self.size = len(content)
+
+
+class DeferredGradCAM:
+    """
+    Grad-CAM computed after the prediction has been returned.
+
+    /predict?explain=deferred stores the upload under a result ID and
+    answers with the prediction only. The heatmap is computed the first
+    time /gradcam/{id} asks for it (concurrent requests for the same ID
+    share one computation), or ahead of time by a low-priority background
+    worker that only runs while the server is idle. Each requested payload
+    format is encoded once from the held heatmap and upload. Entries expire
+    after `ttl_s` and the store is bounded by entry count and bytes held
+    (upload + heatmap + encoded payloads), oldest first.
+    """
+
+    def __init__(self, compute, encode, max_entries=1024, max_bytes=256 * 1024 * 1024, ttl_s=600.0,
+                 precompute=False, is_idle=None, idle_poll_s=0.05):
+        """
+        Args:
+            compute: async fn(content, cache_key) -> (H, W) uint8 heatmap
+            encode: async fn(content, cache_key, heatmap, variant) -> payload bytes
+            max_entries: max result IDs held
+            max_bytes: max upload + heatmap + payload bytes held
+            ttl_s: seconds a result ID stays valid
+            precompute: compute heatmaps in the background when idle
+            is_idle: fn() -> bool, True when foreground work leaves room for precompute
+            idle_poll_s: how often the background worker re-checks is_idle
+        """
+        self.compute = compute
+        self.encode = encode
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.precompute = precompute
+        self.is_idle = is_idle or (lambda: True)
+        self.idle_poll_s = idle_poll_s
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+        self._loop = None
+        self.counters = {
+            "submitted": 0, "computed_on_demand": 0, "precomputed": 0, "encoded": 0, "served": 0,
+            "expired": 0, "evicted": 0, "failed": 0,
+        }
+
+    def _grow(self, entry, nbytes):
+        """Account bytes added to an entry (ignored once it has left the store)"""
+        entry.size += nbytes
+        if self._entries.get(entry.result_id) is entry:
+            self._bytes += nbytes
+
+    def _drop(self, result_id, reason):
+        entry = self._entries.pop(result_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+            self.counters[reason] += 1
+
+    def _purge(self):
+        """Drop expired entries, then the oldest until within bounds"""
+        now = time.monotonic()
+        with self._lock:
+            for result_id in [rid for rid, e in self._entries.items() if now - e.created > self.ttl_s]:
+                self._drop(result_id, "expired")
+            for result_id in list(self._entries):
+                if len(self._entries) <= self.max_entries and self._bytes <= self.max_bytes:
+                    break
+                task = self._entries[result_id].task
+                if task is not None and not task.done():
+                    continue  # being computed; someone is waiting for it
+                self._drop(result_id, "evicted")
+
+    def _lookup(self, result_id):
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None and time.monotonic() - entry.created > self.ttl_s:
+                self._drop(result_id, "expired")
+                entry = None
+            return entry
+
+    def submit(self, content, cache_key=None):
+        """Hold an upload for later explanation; returns its result ID"""
+        result_id = uuid.uuid4().hex
+        entry = _Entry(result_id, content, cache_key)
+        with self._lock:
+            self._entries[result_id] = entry
+            self._bytes += entry.size
+            self.counters["submitted"] += 1
+        self._purge()
+        if self.precompute:
+            self._enqueue(result_id)
+        return result_id
+
+    async def get(self, result_id, variant):
+        """
+        Heatmap payload for a result ID, computing the heatmap on first
+        request and encoding each variant once.
+
+        Returns:
+            tuple (payload bytes, heatmap shape)
+
+        Raises:
+            KeyError: unknown or expired ID
+        """
+        entry = self._lookup(result_id)
+        if entry is None:
+            raise KeyError(result_id)
+        if entry.heatmap is None:
+            if entry.task is None:
+                entry.task = asyncio.ensure_future(self._run(entry, "computed_on_demand"))
+            # shield: a client disconnect must not cancel a computation others may share
+            await asyncio.shield(entry.task)
+
+        payload = entry.encoded.get(variant)
+        if payload is None:
+            payload = await self.encode(entry.content, entry.cache_key, entry.heatmap, variant)
+            with self._lock:
+                if variant not in entry.encoded:
+                    entry.encoded[variant] = payload
+                    self._grow(entry, len(payload))
+                    self.counters["encoded"] += 1
+            self._purge()
+        with self._lock:
+            self.counters["served"] += 1
+        return payload, list(entry.heatmap.shape)
+
+    async def _run(self, entry, counter):
+        try:
+            heatmap = await self.compute(entry.content, entry.cache_key)
+        except Exception:
+            with self._lock:
+                self.counters["failed"] += 1
+            entry.task = None  # let a later request retry
+            raise
+        with self._lock:
+            entry.heatmap = heatmap
+            self._grow(entry, heatmap.nbytes)
+            self.counters[counter] += 1
+        self._purge()
+        return heatmap
+
+    def _enqueue(self, result_id):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._loop is not loop or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._precompute_worker())
+        self._queue.put_nowait(result_id)
+
+    async def _precompute_worker(self):
+        while True:
+            result_id = await self._queue.get()
+            # Low priority: only start while foreground requests leave capacity
+            while not self.is_idle():
+                await asyncio.sleep(self.idle_poll_s)
+            entry = self._lookup(result_id)
+            if entry is None or entry.heatmap is not None or entry.task is not None:
+                continue
+            entry.task = asyncio.ensure_future(self._run(entry, "precomputed"))
+            try:
+                await asyncio.shield(entry.task)
+            except Exception as e:
+                logger.warning(f"Background Grad-CAM for {result_id[:8]} failed: {e}")
+
+    def stats(self):
+        """Entries/bytes held and lifecycle counters"""
+        self._purge()
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "pending": sum(1 for e in self._entries.values() if e.heatmap is None),
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_s": self.ttl_s,
+                "precompute": self.precompute,
+                "backlog": self._queue.qsize() if self._queue is not None else 0,
+                **self.counters,
+            }
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Distill the cheap screening stage of the inference cascade from ForgeryNet.
+
+The full model labels a folder of sample documents once (soft targets);
+a small backbone is then trained to match them. A held-out split reports
+agreement and, for candidate margins, the fraction of documents that
+would be escalated and how often early exits agree with the full model.
+
+    python distill_screening.py --images samples/ --out screening.pt
+    python distill_screening.py --images samples/ --arch efficientnet_b0 --input-size 192 --epochs 20
+
+Serve with CASCADE_MODEL_PATH=<out> (and CASCADE_MARGIN from the report).
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import torch
+import torch.nn.functional as F
+from torchvision import models
+
+from cascade import REPORT_MARGINS, SCREENING_ARCHS, ScreeningNet, save_screening_model, top2_margin
+from model_loader import ModelLoader
+from precision import load_calibration_images
+
+DEFAULT_MODEL_PATH = Path(__file__).parent / "best_model (1).pth"
+
+
+def teacher_logits(model_loader, images, batch_size):
+    """Full-model logits for every image (eval mode, no grad)"""
+    logits = []
+    for offset in range(0, len(images), batch_size):
+        batch = model_loader.prepare_batch(images[offset:offset + batch_size])
+        logits.append(model_loader.backend(*batch).float())
+    return torch.cat(logits)
+
+
+def screening_report(student_logits, teacher_logits, exit_ids):
+    """Agreement overall, and escalation rate / exit agreement per candidate margin"""
+    student_probs = torch.softmax(student_logits, dim=1)
+    student_classes = student_probs.argmax(dim=1)
+    teacher_classes = teacher_logits.argmax(dim=1)
+    margins = top2_margin(student_probs)
+    exit_class = torch.tensor([c in exit_ids for c in student_classes.tolist()])
+    table = []
+    for margin in REPORT_MARGINS:
+        exits = exit_class & (margins >= margin)
+        n_exit = int(exits.sum())
+        table.append({
+            "margin": margin,
+            "escalation_rate": 1 - n_exit / len(margins),
+            "exit_agreement": (student_classes[exits] == teacher_classes[exits]).float().mean().item()
+            if n_exit else None,
+        })
+    return {
+        "n": len(margins),
+        "agreement": (student_classes == teacher_classes).float().mean().item(),
+        "thresholds": table,
+    }
+
+
+def distill(model_loader, images, arch="mobilenet_v3_small", input_size=160, epochs=10, batch_size=16,
+            lr=1e-3, temperature=2.0, holdout=0.2, pretrained=False, exit_classes=("positive",), seed=0):
+    """
+    Train a ScreeningNet on the full model's soft predictions.
+
+    Returns:
+        tuple (eval-mode ScreeningNet, held-out report dict)
+    """
+    random.seed(seed)
+    torch.manual_seed(seed)
+    order = list(range(len(images)))
+    random.shuffle(order)
+    n_holdout = max(1, int(len(images) * holdout))
+    eval_idx, train_idx = order[:n_holdout], order[n_holdout:]
+
+    start = time.perf_counter()
+    targets = teacher_logits(model_loader, images, batch_size)
+    print(f"Teacher labelled {len(images)} images in {time.perf_counter() - start:.1f}s")
+
+    student = ScreeningNet(arch, input_size, model_loader.num_classes)
+    if pretrained:
+        try:
+            student.features = getattr(models, arch)(weights="DEFAULT").features
+        except Exception as e:
+            print(f"ImageNet weights unavailable ({e}); training from scratch")
+    optimizer = torch.optim.AdamW(student.parameters(), lr=lr)
+
+    for epoch in range(epochs):
+        student.train()
+        random.shuffle(train_idx)
+        total = 0.0
+        for offset in range(0, len(train_idx), batch_size):
+            rows = train_idx[offset:offset + batch_size]
+            img, _, _ = model_loader.prepare_batch([images[i] for i in rows])
+            logits = student(img)
+            loss = F.kl_div(
+                F.log_softmax(logits / temperature, dim=1),
+                F.softmax(targets[rows] / temperature, dim=1),
+                reduction="batchmean",
+            ) * temperature ** 2
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(rows)
+        print(f"epoch {epoch + 1}/{epochs}: distillation loss {total / max(1, len(train_idx)):.4f}")
+
+    student.eval()
+    with torch.no_grad():
+        student_logits = torch.cat([
+            student(model_loader.prepare_batch([images[i] for i in eval_idx[o:o + batch_size]])[0])
+            for o in range(0, len(eval_idx), batch_size)
+        ])
+    exit_ids = {model_loader.class_names.index(name) for name in exit_classes}
+    return student, screening_report(student_logits, targets[eval_idx], exit_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distill the cascade screening stage from ForgeryNet")
+    parser.add_argument("--model-path", default=os.environ.get("MODEL_PATH", str(DEFAULT_MODEL_PATH)))
+    parser.add_argument("--images", required=True, help="folder of sample documents")
+    parser.add_argument("--limit", type=int, default=2000, help="max images used")
+    parser.add_argument("--arch", choices=sorted(SCREENING_ARCHS), default="mobilenet_v3_small")
+    parser.add_argument("--input-size", type=int, default=160)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--pretrained", action="store_true", help="start from ImageNet weights (downloads)")
+    parser.add_argument("--exit-classes", default="positive", help="comma-separated, for the report")
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    model_loader = ModelLoader(args.model_path)
+    images = load_calibration_images(args.images, limit=args.limit)
+    student, report = distill(
+        model_loader, images,
+        arch=args.arch,
+        input_size=args.input_size,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        lr=args.lr,
+        pretrained=args.pretrained,
+        exit_classes=args.exit_classes.split(","),
+    )
+    save_screening_model(student, args.out, teacher_fingerprint=model_loader.fingerprint, report=report)
+    print(json.dumps(report, indent=2))
+    print(f"Wrote {args.out} ({os.path.getsize(args.out) / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Export the checkpoint to the artifacts used by the non-eager backends.
+
+    python export_model.py --format torchscript --out forgerynet.ts
+    python export_model.py --format onnx --out forgerynet.onnx
+
+Serve with INFERENCE_BACKEND=torchscript|onnx and
+INFERENCE_BACKEND_ARTIFACT=<out>. The artifact records the fingerprint of
+the checkpoint it was exported from; the server falls back to eager
+PyTorch when it is served with a different checkpoint. Check parity and latency with
+benchmarks/bench_backends.py.
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from backends import export_onnx, save_torchscript, trace_model
+from model_loader import ModelLoader
+
+DEFAULT_MODEL_PATH = Path(__file__).parent / "best_model (1).pth"
+
+
+def export(model_loader, fmt, out):
+    """
+    Write `model_loader.model` to `out` as "torchscript" or "onnx", with the
+    fingerprint of its weights so the server refuses it for another checkpoint
+    """
+    model = model_loader.model
+    if fmt == "torchscript":
+        save_torchscript(trace_model(model), out, fingerprint=model_loader.fingerprint)
+    elif fmt == "onnx":
+        export_onnx(model, out, fingerprint=model_loader.fingerprint)
+    else:
+        raise ValueError(f"Unknown export format {fmt!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export ForgeryNet for the TorchScript / ONNX Runtime backends")
+    parser.add_argument("--model-path", default=os.environ.get("MODEL_PATH", str(DEFAULT_MODEL_PATH)))
+    parser.add_argument("--format", choices=["torchscript", "onnx"], required=True)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    model_loader = ModelLoader(args.model_path)
+    start = time.perf_counter()
+    export(model_loader, args.format, args.out)
+    size_mb = os.path.getsize(args.out) / 2**20
+    print(f"Wrote {args.out} ({args.format}, {size_mb:.1f} MB) in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
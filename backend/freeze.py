@@ -0,0 +1,146 @@
+import copy
+import logging
+
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+from torchvision.ops import StochasticDepth
+
+logger = logging.getLogger(__name__)
+
+# Modules that are the identity in eval mode
+EVAL_IDENTITIES = (nn.Dropout, StochasticDepth)
+
+
+def fuse_conv_bn(module):
+    """
+    Fold every BatchNorm2d that directly follows a Conv2d inside an
+    nn.Sequential into the convolution (eval-mode statistics), in place.
+
+    Returns:
+        number of pairs fused
+    """
+    fused = 0
+    for seq in [m for m in module.modules() if isinstance(m, nn.Sequential)]:
+        names = list(seq._modules)
+        for conv_name, bn_name in zip(names, names[1:]):
+            conv, bn = seq._modules[conv_name], seq._modules[bn_name]
+            if isinstance(conv, nn.Conv2d) and isinstance(bn, nn.BatchNorm2d):
+                seq._modules[conv_name] = fuse_conv_bn_eval(conv, bn)
+                seq._modules[bn_name] = nn.Identity()
+                fused += 1
+    return fused
+
+
+def strip_eval_identities(module):
+    """Replace Dropout / StochasticDepth (identity in eval mode) by nn.Identity, in place"""
+    stripped = 0
+    for name, child in module.named_children():
+        if isinstance(child, EVAL_IDENTITIES):
+            setattr(module, name, nn.Identity())
+            stripped += 1
+        else:
+            stripped += strip_eval_identities(child)
+    return stripped
+
+
+class FrozenForgeryNet(nn.Module):
+    """
+    Inference-only ForgeryNet with eval-time constants folded away.
+
+    - Backbone (and any other Sequential) Conv2d + BatchNorm2d pairs are
+      fused into single convolutions; Dropout and StochasticDepth are
+      removed.
+    - The OCR branch of all-zero token ids (what ModelLoader always feeds)
+      is a constant 32-d vector, so its contribution through the first
+      classifier layer is folded into that layer's bias and the layer only
+      multiplies the [image, edge] features. Real OCR tokens are still
+      supported: the (small) OCR branch always runs, and for rows with any
+      non-zero token its difference from the constant is added back,
+      giving the same logits as the original model. The row selection is
+      a tensor op (torch.where), not a Python branch on the data, so traced
+      TorchScript / ONNX graphs and torch.compile keep both paths.
+
+    Keeps ForgeryNet's attribute names (back, cbam, ocr_head, classifier,
+    ...) and forward_features / forward_head, so Grad-CAM, precision modes
+    and the eager backend work on it unchanged.
+    """
+
+    def __init__(self, model):
+        """
+        Args:
+            model: eval-mode ForgeryNet (copied, not modified)
+        """
+        super().__init__()
+        model = copy.deepcopy(model).eval()
+        self.img_size = model.img_size
+        self.num_classes = model.num_classes
+        self.max_ocr_tokens = model.max_ocr_tokens
+
+        self.fused = fuse_conv_bn(model)
+        self.stripped = strip_eval_identities(model)
+
+        self.back = model.back
+        self.cbam = model.cbam
+        self.pool = model.pool
+        self.edge_branch = model.edge_branch
+        self.ocr_emb = model.ocr_emb
+        self.ocr_pool = model.ocr_pool
+        self.ocr_head = model.ocr_head
+
+        first, *rest = model.classifier
+        device = first.weight.device
+        with torch.no_grad():
+            ocr_const = model.ocr_features(torch.zeros((1, self.max_ocr_tokens), dtype=torch.long, device=device))[0]
+            ocr_dim = ocr_const.shape[0]
+            split = first.in_features - ocr_dim  # [image, edge] | [ocr]
+            folded = nn.Linear(split, first.out_features, device=device)
+            folded.weight.copy_(first.weight[:, :split])
+            folded.bias.copy_(first.bias + first.weight[:, split:] @ ocr_const)
+        self.register_buffer("ocr_const", ocr_const.clone())
+        self.register_buffer("ocr_weight", first.weight[:, split:].detach().clone())
+        self.classifier = nn.Sequential(folded, *[m for m in rest if not isinstance(m, nn.Identity)])
+
+    def ocr_features(self, ocr):
+        """32-d OCR branch output for (B, max_ocr_tokens) token ids"""
+        o = self.ocr_emb(ocr)
+        o = o.permute(0, 2, 1)
+        o = self.ocr_pool(o).squeeze(-1)
+        return self.ocr_head(o.float())
+
+    def forward(self, img, edge, ocr=None):
+        return self.forward_head(self.forward_features(img), edge, ocr)
+
+    def forward_features(self, img):
+        """Backbone feature maps (output of back[-1], the Grad-CAM layer)"""
+        return self.back(img)
+
+    def forward_head(self, x, edge, ocr=None):
+        """Head with the constant OCR contribution pre-folded (real tokens added back per row)"""
+        x = self.cbam(x)
+        x = self.pool(x).view(x.size(0), -1)
+        e = self.edge_branch(edge)
+
+        layers = iter(self.classifier)
+        h = next(layers)(torch.cat([x, e], dim=1))
+        if ocr is not None:
+            live = (self.ocr_features(ocr) - self.ocr_const) @ self.ocr_weight.t()
+            h = h + torch.where(ocr.any(dim=1, keepdim=True), live, torch.zeros_like(live))
+        for layer in layers:
+            h = layer(h)
+        return h
+
+
+def freeze_for_inference(model):
+    """
+    Specialized inference copy of an eval-mode ForgeryNet (see FrozenForgeryNet).
+
+    Returns:
+        FrozenForgeryNet in eval mode
+    """
+    frozen = FrozenForgeryNet(model).eval()
+    logger.info(
+        f"Frozen for inference: {frozen.fused} conv+BN pairs fused, {frozen.stripped} eval-identity "
+        f"modules removed, constant OCR branch folded into the classifier bias"
+    )
+    return frozen
@@ -7,6 +7,7 @@ import numpy as np
 import cv2
 from PIL import Image
 import base64
+import time
 from io import BytesIO
 
 
@@ -143,6 +144,160 @@ class GradCAM:
         return gcam_map
 
 
+class Explainer:
+    """
+    Long-lived Grad-CAM explainer bound to a loaded model.
+
+    The model's forward is split at the explained layer instead of hooked:
+    model.forward_features(img) runs without autograd, its output becomes
+    a fresh leaf tensor, and model.forward_head(features, *rest) records
+    autograd for the head only. No hooks are registered and nothing is
+    stored on the instance between calls (grad mode is thread-local), so
+    one explainer can serve several threads at once, alongside plain
+    predictions on the same model, with batched inputs.
+    """
+
+    def __init__(self, model):
+        """
+        Args:
+            model: eval-mode model with forward_features(img) and
+                forward_head(features, *other_inputs), e.g. ForgeryNet
+        """
+        for name in ("forward_features", "forward_head"):
+            if not callable(getattr(model, name, None)):
+                raise TypeError(f"{type(model).__name__} has no {name}(); cannot split it for Grad-CAM")
+        self.model = model
+
+    def forward(self, inputs):
+        """
+        Forward pass with autograd only downstream of the features.
+
+        Args:
+            inputs: tuple of batched input tensors (B, ...), image first
+
+        Returns:
+            tuple (logits, activations): logits attached to the head's graph,
+            activations the (B, C, h, w) leaf they are differentiated against
+        """
+        img, *rest = inputs
+        with torch.no_grad():
+            features = self.model.forward_features(img)
+        activ = features.detach().requires_grad_(True)
+        with torch.enable_grad():
+            logits = self.model.forward_head(activ, *rest)
+        return logits, activ
+
+    def explain(self, inputs, class_idx=None, timings=None):
+        """
+        Single-pass prediction + Grad-CAM: one forward, one backward from
+        the target logits to the feature maps (no retained graph).
+
+        Args:
+            inputs: tuple of batched input tensors (B, ...) on the model device
+            class_idx: target class (int, list of ints per row, or None = predicted)
+            timings: optional dict, filled with "forward" and "gradcam_backward" seconds
+
+        Returns:
+            tuple (logits, class_ids, heatmaps):
+                - logits: detached (B, num_classes) tensor
+                - class_ids: list of explained class indices
+                - heatmaps: (B, H, W) numpy array at input resolution, values in [0, 1]
+        """
+        start = time.perf_counter()
+        logits, activ = self.forward(inputs)
+        forward_done = time.perf_counter()
+
+        if class_idx is None:
+            class_ids = torch.argmax(logits.detach(), dim=1)
+        elif isinstance(class_idx, int):
+            class_ids = torch.full((logits.shape[0],), class_idx, dtype=torch.long, device=logits.device)
+        else:
+            class_ids = torch.as_tensor(class_idx, dtype=torch.long, device=logits.device)
+
+        # Rows are independent in eval mode, so one backward of the summed
+        # target scores yields each row's own gradients
+        score = logits.gather(1, class_ids.view(-1, 1)).sum()
+        grads, = torch.autograd.grad(score, activ)
+
+        heatmaps = cam_from_gradients(activ.detach(), grads, inputs[0].shape[2:])
+        if timings is not None:
+            timings["forward"] = forward_done - start
+            timings["gradcam_backward"] = time.perf_counter() - forward_done
+        return logits.detach(), class_ids.tolist(), heatmaps
+
+    def explain_classes(self, inputs, class_ids=None, top_k=None, timings=None):
+        """
+        Grad-CAM heatmaps for several classes per image from one forward.
+
+        The gradients of all K requested class logits with respect to the
+        feature maps are computed in a single vectorized backward (batched
+        vector-Jacobian products, one one-hot grad_output per class),
+        instead of K separate forward + backward passes.
+
+        Args:
+            inputs: tuple of batched input tensors (B, ...) on the model device
+            class_ids: classes to explain, the same for every row (None = all)
+            top_k: explain each row's k highest-scoring classes instead
+            timings: optional dict, filled with "forward" and "gradcam_backward" seconds
+
+        Returns:
+            tuple (logits, class_ids, heatmaps):
+                - logits: detached (B, num_classes) tensor
+                - class_ids: (B, K) list of explained class indices per row
+                - heatmaps: (B, K, H, W) numpy array, values in [0, 1] per map
+        """
+        start = time.perf_counter()
+        logits, activ = self.forward(inputs)
+        forward_done = time.perf_counter()
+
+        batch_size, num_classes = logits.shape
+        if top_k is not None:
+            targets = torch.topk(logits.detach(), min(top_k, num_classes), dim=1).indices
+        else:
+            if class_ids is None:
+                class_ids = range(num_classes)
+            targets = torch.as_tensor(list(class_ids), dtype=torch.long, device=logits.device)
+            targets = targets.expand(batch_size, -1)
+        k = targets.shape[1]
+
+        # grad_outputs[j] selects class targets[:, j] in every row
+        grad_outputs = torch.zeros((k, batch_size, num_classes), dtype=logits.dtype, device=logits.device)
+        grad_outputs.scatter_(2, targets.t().unsqueeze(2), 1.0)
+        grads, = torch.autograd.grad(logits, activ, grad_outputs=grad_outputs, is_grads_batched=True)
+
+        # (K, B, C, h, w) -> (B * K, C, h, w), row-major over (image, class)
+        grads = grads.transpose(0, 1).reshape(batch_size * k, *activ.shape[1:])
+        activations = activ.detach().repeat_interleave(k, dim=0)
+        heatmaps = cam_from_gradients(activations, grads, inputs[0].shape[2:])
+        if timings is not None:
+            timings["forward"] = forward_done - start
+            timings["gradcam_backward"] = time.perf_counter() - forward_done
+        return logits.detach(), targets.tolist(), heatmaps.reshape(batch_size, k, *heatmaps.shape[1:])
+
+
+def cam_from_gradients(activations, gradients, size):
+    """
+    Combine activations and gradients into normalized Grad-CAM maps.
+
+    Args:
+        activations: (B, C, h, w) tensor
+        gradients: (B, C, h, w) tensor
+        size: (H, W) output size
+
+    Returns:
+        heatmaps: (B, H, W) numpy array, values in [0, 1] per row
+    """
+    weights = torch.mean(gradients, dim=(2, 3), keepdim=True)
+    gcam_map = F.relu(torch.sum(weights * activations, dim=1, keepdim=True))
+    gcam_map = F.interpolate(gcam_map, size=tuple(size), mode='bilinear', align_corners=False)
+    gcam_map = gcam_map[:, 0].cpu().numpy()
+
+    gcam_map -= gcam_map.min(axis=(1, 2), keepdims=True)
+    peak = gcam_map.max(axis=(1, 2), keepdims=True)
+    np.divide(gcam_map, peak, out=gcam_map, where=peak > 0)
+    return gcam_map
+
+
 def create_heatmap_overlay(original_image, heatmap, alpha=0.4, colormap=cv2.COLORMAP_JET):
     """
     Create overlay of heatmap on original image.
@@ -199,6 +354,80 @@ def heatmap_to_base64(overlay_image):
     return base64_str
 
 
+# Heatmap payloads and their media types
+HEATMAP_FORMATS = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg",
+    "raw": "application/octet-stream",
+}
+
+
+def quantize_heatmap(heatmap):
+    """Heatmap in [0, 1] (float) as uint8 0-255; uint8 input is returned as is"""
+    if heatmap.dtype == np.uint8:
+        return heatmap
+    return np.round(np.clip(heatmap, 0.0, 1.0) * 255).astype(np.uint8)
+
+
+def heatmap_variant(fmt, quality=None):
+    """Cache variant name for a heatmap payload ("png", "raw", "webp-q80", ...)"""
+    return fmt if fmt in ("png", "raw") else f"{fmt}-q{quality}"
+
+
+def heatmap_overlay(heatmap, original_image):
+    """Colour overlay of a float or uint8 heatmap on the original image (PIL Image)"""
+    if heatmap.dtype == np.uint8:
+        heatmap = heatmap.astype(np.float32) / 255.0
+    return create_heatmap_overlay(original_image, heatmap)
+
+
+def encode_overlay(overlay_img, fmt="png", quality=80):
+    """
+    Encode an overlay from heatmap_overlay as "png", "webp" or "jpeg" bytes.
+
+    Args:
+        overlay_img: PIL Image
+        fmt: "png" / "webp" / "jpeg"
+        quality: 1-100 for webp / jpeg
+
+    Returns:
+        bytes
+    """
+    buffer = BytesIO()
+    if fmt == "png":
+        overlay_img.save(buffer, format="PNG")
+    elif fmt == "webp":
+        overlay_img.save(buffer, format="WEBP", quality=quality)
+    elif fmt == "jpeg":
+        overlay_img.save(buffer, format="JPEG", quality=quality)
+    else:
+        raise ValueError(f"Cannot encode an overlay as {fmt!r}; expected png, webp or jpeg")
+    return buffer.getvalue()
+
+
+def encode_heatmap(heatmap, original_image=None, fmt="png", quality=80):
+    """
+    Encode a Grad-CAM heatmap for transport (heatmap_overlay + encode_overlay).
+
+    Args:
+        heatmap: (H, W) numpy array, float in [0, 1] or uint8
+        original_image: PIL Image to overlay on (not needed for "raw")
+        fmt: "raw" = the heatmap itself as row-major uint8 bytes at model
+             resolution (H * W bytes, no overlay); "png" / "webp" / "jpeg"
+             = colour overlay on the original image
+        quality: 1-100 for webp / jpeg
+
+    Returns:
+        bytes
+    """
+    if fmt not in HEATMAP_FORMATS:
+        raise ValueError(f"Unknown heatmap format {fmt!r}; expected one of {tuple(HEATMAP_FORMATS)}")
+    if fmt == "raw":
+        return quantize_heatmap(heatmap).tobytes()
+    return encode_overlay(heatmap_overlay(heatmap, original_image), fmt, quality)
+
+
 def generate_gradcam(model, input_tensor, original_image, target_layer, class_idx=None):
     """
     Complete Grad-CAM pipeline: generate heatmap and overlay.
@@ -0,0 +1,60 @@
+import logging
+from io import BytesIO
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Longest side kept after decoding uploads: enough for the 256px model
+# input and a readable Grad-CAM overlay, far below a 300 DPI scan
+DEFAULT_MAX_SIDE = 1024
+
+# Modes Image.reduce() can work on directly
+_REDUCIBLE_MODES = {"L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "I", "F"}
+
+
+def decode_image(data, max_side=DEFAULT_MAX_SIDE):
+    """
+    Decode uploaded bytes into an RGB PIL Image of bounded size.
+
+    JPEGs are decoded in draft mode, where libjpeg scales by 1/2, 1/4 or
+    1/8 during decoding, so the full-resolution bitmap is never built.
+    Other formats (PNG, TIFF, ...) have to be decoded in full but are
+    shrunk with Image.reduce (integer box filter) before colour
+    conversion. A final resize brings the longest side to `max_side`.
+
+    Args:
+        data: encoded image bytes
+        max_side: longest side of the returned image (None = full resolution)
+
+    Returns:
+        PIL Image in RGB mode
+    """
+    img = Image.open(BytesIO(data))
+    width, height = img.size
+    longest = max(width, height)
+
+    if max_side is None or longest <= max_side:
+        img.load()
+        return img.convert("RGB")
+
+    scale = max_side / longest
+    target = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+    if img.format == "JPEG":
+        # Picks the largest DCT scaling that still yields >= target
+        img.draft("RGB", target)
+        img.load()
+    else:
+        img.load()
+        factor = longest // max_side
+        if factor >= 2 and img.mode in _REDUCIBLE_MODES:
+            img = img.reduce(factor)
+
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    if img.size != target:
+        img = img.resize(target, Image.BILINEAR, reducing_gap=None)
+
+    logger.info(f"Decoded {width}x{height} image to {img.size[0]}x{img.size[1]}")
+    return img
@@ -0,0 +1,568 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TERMINAL_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    params TEXT NOT NULL,
+    payload_path TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    available_at REAL NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    owner TEXT,
+    heartbeat_at REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created_at);
+CREATE INDEX IF NOT EXISTS jobs_expiry ON jobs (expires_at);
+"""
+
+
+class JobCancelled(Exception):
+    """Raised from a progress callback when the running job was cancelled"""
+
+
+class JobStore:
+    """
+    Persistent job queue in a local SQLite database.
+
+    Rows hold the job state and JSON params / results; uploads are kept
+    as files under `<root>/payloads` until the job finishes. The database
+    runs in WAL mode and claims use BEGIN IMMEDIATE, so several worker
+    threads and several server processes on the same box can share one
+    store. A running job records its owner: a boot ID drawn once per
+    process, the pid, the worker and the claim number. recover() puts
+    back in the queue the jobs of any other boot (a crashed or restarted
+    server, even one that had the same pid, e.g. PID 1 in a container)
+    and the jobs of this process whose heartbeat is older than the lease.
+    """
+
+    def __init__(self, root, result_ttl_s=86400.0, retry_delay_s=5.0):
+        """
+        Args:
+            root: directory for jobs.sqlite3 and the payload files
+            result_ttl_s: seconds finished jobs (and their results) are kept
+            retry_delay_s: delay before the first retry, doubled per attempt
+        """
+        self.root = Path(root)
+        self.payload_dir = self.root / "payloads"
+        self.payload_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.root / "jobs.sqlite3"
+        self.result_ttl_s = result_ttl_s
+        self.retry_delay_s = retry_delay_s
+        self._boot = (None, None)
+        self._local = threading.local()
+        self._inherited = []
+        self._connection().executescript(SCHEMA)
+        logger.info(f"Job store at {self.path}")
+
+    @property
+    def boot_id(self):
+        """Random ID of the current process (drawn again after a fork)"""
+        if self._boot[0] != os.getpid():
+            self._boot = (os.getpid(), uuid.uuid4().hex[:12])
+        return self._boot[1]
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is not None and self._local.pid != os.getpid():
+            # Inherited across fork(): SQLite connections must not be used (or closed) in the child
+            self._inherited.append(db)
+            db = None
+        if db is None:
+            # One connection per thread and process; autocommit, transactions are explicit
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    @staticmethod
+    def _row(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def _delete_payload(self, path):
+        if path:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def submit(self, kind, params, payload=None, payload_file=None, priority=0, max_attempts=3):
+        """
+        Queue a job.
+
+        Args:
+            kind: handler name
+            params: JSON-serializable handler arguments
+            payload: upload bytes, stored as a file until the job finishes
+            payload_file: path of an upload already on disk (in payload_dir,
+                so it can be renamed), taken over instead of payload
+            priority: higher runs first; equal priorities run oldest first
+            max_attempts: runs allowed before a crashing job is failed
+
+        Returns:
+            job ID
+        """
+        job_id = uuid.uuid4().hex
+        payload_path = None
+        if payload is not None or payload_file is not None:
+            payload_path = self.payload_dir / f"{job_id}.bin"
+            if payload_file is None:
+                payload_file = payload_path.with_suffix(".tmp")
+                payload_file.write_bytes(payload)
+            os.replace(payload_file, payload_path)
+            payload_path = str(payload_path)
+        now = time.time()
+        try:
+            with self._transaction() as db:
+                db.execute(
+                    "INSERT INTO jobs (id, kind, status, priority, params, payload_path, max_attempts, "
+                    "available_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, QUEUED, priority, json.dumps(params), payload_path, max_attempts, now, now)
+                )
+        except Exception:
+            self._delete_payload(payload_path)
+            raise
+        logger.info(f"Job {job_id} queued: {kind}, priority {priority}")
+        return job_id
+
+    def get(self, job_id):
+        """Job as a dict (params and result decoded), or None"""
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row)
+
+    def queue_position(self, job_id):
+        """Number of queued jobs that will be claimed before this one"""
+        row = self._connection().execute(
+            "SELECT COUNT(*) FROM jobs AS other, jobs AS job WHERE job.id = ? AND other.status = ? "
+            "AND other.id != job.id AND (other.priority > job.priority OR "
+            "(other.priority = job.priority AND other.created_at < job.created_at))",
+            (job_id, QUEUED)
+        ).fetchone()
+        return row[0]
+
+    def count(self, status):
+        return self._connection().execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def claim(self, worker_name):
+        """
+        Atomically take the next runnable job (highest priority, then
+        oldest) and mark it running.
+
+        Returns:
+            job dict with an "owner" token to pass back, or None if the
+            queue is empty
+        """
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT id, attempts FROM jobs WHERE status = ? AND available_at <= ? "
+                "ORDER BY priority DESC, created_at LIMIT 1",
+                (QUEUED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            owner = f"{self.boot_id}:{os.getpid()}:{worker_name}:{row['attempts'] + 1}"
+            db.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, owner = ?, started_at = ?, "
+                "heartbeat_at = ?, progress = 0, message = NULL WHERE id = ?",
+                (RUNNING, owner, now, now, row["id"])
+            )
+            job = self._row(db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+        return job
+
+    def update_progress(self, job_id, owner, progress, message=None):
+        """
+        Record progress (0..1) and refresh the heartbeat of a running job.
+
+        Returns:
+            True if cancellation was requested, or the job is no longer
+            owned by this claim (requeued after its lease expired)
+        """
+        with self._transaction() as db:
+            updated = db.execute(
+                "UPDATE jobs SET progress = ?, message = ?, heartbeat_at = ? "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (min(max(progress, 0.0), 1.0), message, time.time(), job_id, owner, RUNNING)
+            ).rowcount
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return not updated or row is None or bool(row["cancel_requested"])
+
+    def _finish(self, db, job_id, owner, status, result=None, error=None):
+        now = time.time()
+        row = db.execute(
+            "SELECT payload_path FROM jobs WHERE id = ? AND owner = ? AND status = ?", (job_id, owner, RUNNING)
+        ).fetchone()
+        if row is None:
+            return False
+        db.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, progress = CASE WHEN ? THEN 1 ELSE progress END, "
+            "finished_at = ?, expires_at = ?, payload_path = NULL WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, status == SUCCEEDED,
+             now, now + self.result_ttl_s, job_id)
+        )
+        self._delete_payload(row["payload_path"])
+        return True
+
+    def complete(self, job_id, owner, result):
+        """Store the result of a job run by this claim; ignored if it lost the claim"""
+        with self._transaction() as db:
+            return self._finish(db, job_id, owner, SUCCEEDED, result=result)
+
+    def cancelled(self, job_id, owner):
+        """Mark a running job that stopped on a cancel request as cancelled"""
+        with self._transaction() as db:
+            return self._finish(db, job_id, owner, CANCELLED, error="Cancelled")
+
+    def fail(self, job_id, owner, error, retry=True):
+        """
+        Record a failed run: requeued with exponential backoff while
+        attempts remain (and retry is True), failed otherwise.
+
+        Returns:
+            new status, or None if this claim no longer owns the job
+        """
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT attempts, max_attempts, cancel_requested FROM jobs "
+                "WHERE id = ? AND owner = ? AND status = ?",
+                (job_id, owner, RUNNING)
+            ).fetchone()
+            if row is None:
+                return None
+            if retry and not row["cancel_requested"] and row["attempts"] < row["max_attempts"]:
+                self._requeue(db, job_id, row["attempts"], error)
+                return QUEUED
+            self._finish(db, job_id, owner, CANCELLED if row["cancel_requested"] else FAILED, error=error)
+            return CANCELLED if row["cancel_requested"] else FAILED
+
+    def _requeue(self, db, job_id, attempts, error, delay=None):
+        if delay is None:
+            delay = self.retry_delay_s * 2 ** max(attempts - 1, 0)
+        db.execute(
+            "UPDATE jobs SET status = ?, owner = NULL, available_at = ?, progress = 0, "
+            "message = ?, error = ? WHERE id = ?",
+            (QUEUED, time.time() + delay, f"Retrying in {delay:.0f}s", error, job_id)
+        )
+
+    def cancel(self, job_id):
+        """
+        Cancel a job: a queued job is cancelled at once, a running job is
+        flagged and stops at its next progress report. Finished jobs are
+        left as they are.
+
+        Returns:
+            the job after the request, or None if unknown
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT status, payload_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row["status"] == QUEUED:
+                now = time.time()
+                db.execute(
+                    "UPDATE jobs SET status = ?, cancel_requested = 1, error = ?, finished_at = ?, "
+                    "expires_at = ?, payload_path = NULL WHERE id = ?",
+                    (CANCELLED, "Cancelled", now, now + self.result_ttl_s, job_id)
+                )
+                self._delete_payload(row["payload_path"])
+            elif row["status"] == RUNNING:
+                db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+        logger.info(f"Job {job_id} cancel requested ({row['status']})")
+        return self.get(job_id)
+
+    def recover(self, lease_s):
+        """
+        Requeue running jobs claimed by another boot (the process that ran
+        them is gone: only one process runs the workers of a store, see
+        JobWorkerPool) or whose heartbeat is older than lease_s. Counts as
+        a failed attempt: jobs out of attempts are failed instead.
+
+        Returns:
+            number of jobs requeued or failed
+        """
+        now = time.time()
+        recovered = 0
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT id, owner, attempts, max_attempts, heartbeat_at, cancel_requested FROM jobs WHERE status = ?",
+                (RUNNING,)
+            ).fetchall()
+            for row in rows:
+                ours = row["owner"].split(":", 1)[0] == self.boot_id
+                if ours and row["heartbeat_at"] >= now - lease_s:
+                    continue
+                reason = f"No heartbeat for {lease_s:.0f}s" if ours else "Worker process exited"
+                if not row["cancel_requested"] and row["attempts"] < row["max_attempts"]:
+                    # The job did not fail, its process went away: no backoff
+                    self._requeue(db, row["id"], row["attempts"], reason, delay=None if ours else 0)
+                    logger.warning(f"Job {row['id']} requeued: {reason} (attempt {row['attempts']})")
+                else:
+                    status = CANCELLED if row["cancel_requested"] else FAILED
+                    self._finish(db, row["id"], row["owner"], status, error=reason)
+                    logger.warning(f"Job {row['id']} {status}: {reason}")
+                recovered += 1
+        return recovered
+
+    def purge_expired(self):
+        """Delete finished jobs past their TTL; returns how many"""
+        now = time.time()
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT id, payload_path FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (now,)
+            ).fetchall()
+            db.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+        for row in rows:
+            self._delete_payload(row["payload_path"])
+        if rows:
+            logger.info(f"Purged {len(rows)} expired jobs")
+        return len(rows)
+
+    def stats(self):
+        db = self._connection()
+        counts = {status: 0 for status in (QUEUED, RUNNING) + TERMINAL_STATUSES}
+        for row in db.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status"):
+            counts[row["status"]] = row["n"]
+        oldest = db.execute("SELECT MIN(created_at) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+        return {
+            "jobs": counts,
+            "oldest_queued_age_s": time.time() - oldest if oldest is not None else None,
+            "path": str(self.path),
+        }
+
+
+class JobWorkerPool:
+    """
+    Threads running queued jobs from a JobStore.
+
+    Each worker claims one job at a time and calls
+    `handler(job, progress)`, where `progress(fraction, message=None)`
+    records progress and raises JobCancelled once the job is cancelled.
+    The handler's return value is stored as the result. Exceptions in
+    `permanent_errors` fail the job at once; any other exception is
+    retried up to the job's max_attempts. A janitor thread requeues jobs
+    of dead workers and purges expired results.
+
+    Only one process runs the workers of a store at a time: start() takes
+    an exclusive lock on `<root>/workers.lock`, and in the other server
+    processes (serve_workers.py children) the pool stands by until the
+    lock holder exits. Every process can still submit and query jobs.
+    """
+
+    def __init__(self, store, handler, workers=1, lease_s=900.0, poll_s=1.0, janitor_interval_s=60.0,
+                 permanent_errors=(ValueError,)):
+        """
+        Args:
+            store: JobStore
+            handler: callable(job dict, progress) -> JSON-serializable result
+            workers: number of worker threads
+            lease_s: running jobs without a heartbeat for this long are requeued
+            poll_s: idle workers look for new jobs this often (submit() wakes them too)
+            janitor_interval_s: how often recovery and expiry run
+            permanent_errors: exception types that are not retried
+        """
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self.janitor_interval_s = janitor_interval_s
+        self.permanent_errors = tuple(permanent_errors)
+        self._wakeup = threading.Condition()
+        self._pending_wakeups = 0
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock_file = None
+        self.active = False
+        self._running = {}
+        self._lock = threading.Lock()
+        self._completed = 0
+        self._failed = 0
+        self._retried = 0
+        self._cancelled = 0
+
+    def start(self):
+        """Start the workers if this process gets the queue lock, or stand by for it"""
+        if self._acquire_lock(blocking=False):
+            self._start_threads()
+        else:
+            logger.info("Job queue run by another process; standing by")
+            threading.Thread(target=self._standby, name="job-standby", daemon=True).start()
+
+    def _acquire_lock(self, blocking):
+        try:
+            import fcntl
+        except ImportError:
+            # No flock (Windows): one server process per JOBS_DIR
+            return True
+        if self._lock_file is None:
+            self._lock_file = open(self.store.root / "workers.lock", "a+")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return False
+        return True
+
+    def _standby(self):
+        self._acquire_lock(blocking=True)
+        if not self._stopping.is_set():
+            logger.info("Job queue lock acquired; taking over")
+            self._start_threads()
+
+    def _start_threads(self):
+        """Recover jobs left running by previous processes, then start the threads"""
+        self.active = True
+        recovered = self.store.recover(self.lease_s)
+        purged = self.store.purge_expired()
+        logger.info(f"Job workers starting: {self.workers} threads, {recovered} jobs recovered, {purged} purged")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, args=(f"job-worker-{i}",), name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        janitor = threading.Thread(target=self._janitor, name="job-janitor", daemon=True)
+        janitor.start()
+        self._threads.append(janitor)
+
+    def stop(self, timeout=None):
+        """Stop claiming jobs, wait for the threads (running jobs finish first) and release the lock"""
+        self._stopping.set()
+        self.notify(len(self._threads))
+        for thread in self._threads:
+            thread.join(timeout)
+        if self.active and self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self.active = False
+
+    def notify(self, count=1):
+        """Wake idle workers after a submit"""
+        with self._wakeup:
+            self._pending_wakeups += count
+            self._wakeup.notify(count)
+
+    def _wait(self):
+        with self._wakeup:
+            if self._pending_wakeups == 0:
+                self._wakeup.wait(self.poll_s)
+            self._pending_wakeups = max(self._pending_wakeups - 1, 0)
+
+    def _work(self, name):
+        while not self._stopping.is_set():
+            try:
+                job = self.store.claim(name)
+            except Exception as e:
+                logger.error(f"{name}: claiming a job failed: {e}", exc_info=True)
+                job = None
+            if job is None:
+                self._wait()
+                continue
+            self._run(name, job)
+
+    def _run(self, name, job):
+        job_id, owner = job["id"], job["owner"]
+        logger.info(f"{name}: job {job_id} ({job['kind']}) attempt {job['attempts']}/{job['max_attempts']}")
+        with self._lock:
+            self._running[job_id] = name
+
+        def progress(fraction, message=None):
+            if self.store.update_progress(job_id, owner, fraction, message):
+                raise JobCancelled(job_id)
+
+        start = time.perf_counter()
+        try:
+            if job["cancel_requested"]:
+                raise JobCancelled(job_id)
+            result = self.handler(job, progress)
+            self.store.complete(job_id, owner, result)
+            with self._lock:
+                self._completed += 1
+            logger.info(f"{name}: job {job_id} succeeded in {time.perf_counter() - start:.3f}s")
+        except JobCancelled:
+            self.store.cancelled(job_id, owner)
+            with self._lock:
+                self._cancelled += 1
+            logger.info(f"{name}: job {job_id} cancelled after {time.perf_counter() - start:.3f}s")
+        except Exception as e:
+            permanent = isinstance(e, self.permanent_errors)
+            if not permanent:
+                logger.error(f"{name}: job {job_id} failed: {e}", exc_info=True)
+            error = f"{type(e).__name__}: {e}"
+            status = self.store.fail(job_id, owner, error, retry=not permanent)
+            with self._lock:
+                if status == QUEUED:
+                    self._retried += 1
+                else:
+                    self._failed += 1
+            logger.warning(f"{name}: job {job_id} {status}: {error}")
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+
+    def _janitor(self):
+        while not self._stopping.wait(self.janitor_interval_s):
+            try:
+                if self.store.recover(self.lease_s):
+                    self.notify(self.workers)
+                self.store.purge_expired()
+            except Exception as e:
+                logger.error(f"Job janitor failed: {e}", exc_info=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "workers": self.workers,
+                "running": dict(self._running),
+                "completed": self._completed,
+                "failed": self._failed,
+                "retried": self._retried,
+                "cancelled": self._cancelled,
+                "lease_s": self.lease_s,
+            }
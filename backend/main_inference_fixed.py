@@ -7,13 +7,29 @@ init_compatibility()
 # Now import the rest
 from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pathlib import Path
+import asyncio
+import base64
+import contextvars
+import hmac
 import tempfile
+import threading
 import os
 import logging
 import time
 import uuid
+from contextlib import asynccontextmanager, nullcontext
+from typing import Optional
+
+from admission import EXECUTOR_OVERRIDE, AdmissionController, Overloaded
+from upload_limits import (
+    PDF_HEADER_WINDOW, BodySizeLimitMiddleware, UploadRejected, copy_pdf_upload, inspect_image, is_pdf, read_upload
+)
+from metrics import (
+    ERRORS, IN_FLIGHT, MODEL_LOADED, MODEL_READY, PREDICTIONS, REGISTRY, REQUEST_SECONDS, STAGE_SECONDS,
+    observe_stage
+)
 
 # ============================================================
 # LOGGING SETUP
@@ -50,37 +66,224 @@ logging.getLogger().addFilter(request_filter)
 # CONFIGURATION
 # ============================================================
 
-MODEL_PATH = Path(__file__).parent / "best_model (1).pth"
+MODEL_PATH = Path(os.environ.get("MODEL_PATH", Path(__file__).parent / "best_model (1).pth"))
 IMG_SIZE = 256
 
+# Micro-batching: concurrent /predict calls are grouped into one forward pass
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+
+# Bulk endpoint limits
+BULK_MAX_FILES = int(os.environ.get("BULK_MAX_FILES", "1000"))
+BULK_SPOOL_MAX_MEMORY = 32 * 1024 * 1024  # ZIP bodies above this spill to disk (TAR is streamed)
+
+# Upload limits: request bodies over these sizes get 413 while still streaming in, and
+# images are checked from their header (format sniffed from magic bytes, pixel and
+# frame counts) before any decoding, so bad or oversized inputs cost almost nothing
+UPLOAD_MAX_MB = float(os.environ.get("UPLOAD_MAX_MB", "50"))  # per image (also archive members)
+PDF_UPLOAD_MAX_MB = float(os.environ.get("PDF_UPLOAD_MAX_MB", "200"))
+BULK_UPLOAD_MAX_MB = float(os.environ.get("BULK_UPLOAD_MAX_MB", "2048"))  # whole /predict_batch body
+UPLOAD_MAX_MEGAPIXELS = float(os.environ.get("UPLOAD_MAX_MEGAPIXELS", "89"))  # decompression-bomb guard
+UPLOAD_MAX_FRAMES = int(os.environ.get("UPLOAD_MAX_FRAMES", "64"))
+UPLOAD_IMAGE_FORMATS = tuple(os.environ.get("UPLOAD_IMAGE_FORMATS", "JPEG,PNG,TIFF,WEBP,BMP").upper().split(","))
+UPLOAD_MAX_BYTES = int(UPLOAD_MAX_MB * 1024 * 1024)
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries and part headers around the file
+IMAGE_LIMITS = {
+    "allowed_formats": UPLOAD_IMAGE_FORMATS,
+    "max_pixels": int(UPLOAD_MAX_MEGAPIXELS * 1e6),
+    "max_frames": UPLOAD_MAX_FRAMES,
+}
+
+# One shared resize for both input branches (faster, not bit-identical to training preprocessing)
+PREPROCESS_SHARED_RESIZE = os.environ.get("PREPROCESS_SHARED_RESIZE", "0") == "1"
+
+# Uploads are decoded at reduced resolution (longest side, pixels)
+DECODE_MAX_SIDE = int(os.environ.get("DECODE_MAX_SIDE", "1024"))
+
+# Result cache: predictions/heatmaps keyed by upload hash + model fingerprint + serving config
+RESULT_CACHE_ENTRIES = int(os.environ.get("RESULT_CACHE_ENTRIES", "1024"))
+RESULT_CACHE_HEATMAP_MB = int(os.environ.get("RESULT_CACHE_HEATMAP_MB", "256"))
+RESULT_CACHE_DIR = os.environ.get("RESULT_CACHE_DIR")  # unset = memory tier only
+RESULT_CACHE_DISK_MB = int(os.environ.get("RESULT_CACHE_DISK_MB", "1024"))  # least recently used files are deleted past this
+
+# Deferred Grad-CAM (/predict?explain=deferred): result IDs held for /gradcam/{id}
+GRADCAM_DEFERRED_ENTRIES = int(os.environ.get("GRADCAM_DEFERRED_ENTRIES", "1024"))
+GRADCAM_DEFERRED_MB = int(os.environ.get("GRADCAM_DEFERRED_MB", "256"))
+GRADCAM_DEFERRED_TTL_S = float(os.environ.get("GRADCAM_DEFERRED_TTL_S", "600"))
+GRADCAM_PRECOMPUTE = os.environ.get("GRADCAM_PRECOMPUTE", "0") == "1"  # compute in background when idle
+
+# Default webp/jpeg quality for heatmap payloads (?heatmap_format=, see gradcam.HEATMAP_FORMATS)
+HEATMAP_QUALITY = int(os.environ.get("HEATMAP_QUALITY", "80"))
+
+# Tiled high-resolution mode (/predict?tiled=true): overlapping model-size tiles of the page
+TILED_MAX_SIDE = int(os.environ.get("TILED_MAX_SIDE", "3508"))  # A4 at 300 DPI
+TILE_SCALE = float(os.environ.get("TILE_SCALE", "1.0"))  # page resize before tiling
+TILE_OVERLAP = float(os.environ.get("TILE_OVERLAP", "0.25"))
+TILE_MAX_TILES = int(os.environ.get("TILE_MAX_TILES", "32"))  # most detailed tiles kept per page
+TILE_MIN_EDGE_DENSITY = float(os.environ.get("TILE_MIN_EDGE_DENSITY", "0.02"))  # below = blank
+TILE_BATCH_SIZE = int(os.environ.get("TILE_BATCH_SIZE", "8"))
+TILE_AGGREGATION = os.environ.get("TILE_AGGREGATION", "max")  # max | mean
+
+# PDF pages are rendered with their longest side at this many pixels
+PDF_MAX_SIDE = int(os.environ.get("PDF_MAX_SIDE", "1024"))
+
+# Execution backend for predictions: eager | torchscript | compile | onnx
+# (artifacts from export_model.py; Grad-CAM always runs eager)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "eager")
+INFERENCE_BACKEND_ARTIFACT = os.environ.get("INFERENCE_BACKEND_ARTIFACT")
+
+# Precision modes for the eager backend, comma-separated:
+# fp32 | channels_last | bf16 | dynamic_int8 | static_int8 (needs calibration images)
+INFERENCE_PRECISION = os.environ.get("INFERENCE_PRECISION", "fp32")
+PRECISION_CALIBRATION_DIR = os.environ.get("PRECISION_CALIBRATION_DIR")  # sample documents
+PRECISION_CALIBRATION_SAMPLES = int(os.environ.get("PRECISION_CALIBRATION_SAMPLES", "64"))
+
+# Serve an inference-specialized copy of ForgeryNet (freeze.py: conv+BN fused, constant
+# OCR branch folded into the classifier bias); same logits, applied before precision modes
+INFERENCE_FREEZE = os.environ.get("INFERENCE_FREEZE", "0") == "1"
+
+# Confidence-gated cascade: a screening model (distill_screening.py) answers confident
+# documents of CASCADE_EXIT_CLASSES without the full model or Grad-CAM; unset = disabled
+CASCADE_MODEL_PATH = os.environ.get("CASCADE_MODEL_PATH")
+CASCADE_MARGIN = float(os.environ.get("CASCADE_MARGIN", "0.9"))  # top-1 minus top-2 probability
+CASCADE_EXIT_CLASSES = os.environ.get("CASCADE_EXIT_CLASSES", "positive").split(",")
+CASCADE_SHADOW_RATE = float(os.environ.get("CASCADE_SHADOW_RATE", "0.0"))  # exits re-checked by the full model
+
+# Load the model after the server starts accepting connections: /health answers at once,
+# /ready and the inference endpoints return 503 (with Retry-After) until load and warmup
+# finish. 0 = load at import, before the server starts
+MODEL_LOAD_BACKGROUND = os.environ.get("MODEL_LOAD_BACKGROUND", "1") == "1"
+MODEL_LOAD_RETRY_AFTER_S = int(os.environ.get("MODEL_LOAD_RETRY_AFTER_S", "5"))
+
+# Warmup before reporting ready: batches of blank images (0 disables), plus one Grad-CAM pass
+WARMUP_BATCH_SIZE = int(os.environ.get("WARMUP_BATCH_SIZE", "1"))
+WARMUP_ITERATIONS = int(os.environ.get("WARMUP_ITERATIONS", "1"))
+WARMUP_GRADCAM = os.environ.get("WARMUP_GRADCAM", "1") == "1"
+
+# Opt-in profiling of single /predict calls (?profile=true or "X-Profile: 1"): torch.profiler,
+# cProfile and tracemalloc output goes to PROFILING_DIR/<trace id>. Ignored unless
+# PROFILING_ENABLED=1; when PROFILING_TOKEN is set it must be sent as X-Profile-Token
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")
+PROFILING_DIR = Path(os.environ.get("PROFILING_DIR", LOG_DIR / "profiles"))
+
+# Asynchronous jobs (/jobs) for analyses longer than an HTTP timeout: a SQLite queue and the
+# uploads live under JOBS_DIR, run by JOB_WORKERS threads sharing the loaded model (0 disables
+# the endpoints). With several server processes one of them runs the workers at a time. Jobs
+# left running by a crash or restart are retried on the next start
+JOBS_DIR = Path(os.environ.get("JOBS_DIR", Path(__file__).parent / "jobs"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "1"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+JOB_RESULT_TTL_S = float(os.environ.get("JOB_RESULT_TTL_S", "86400"))  # finished jobs kept this long
+JOB_LEASE_S = float(os.environ.get("JOB_LEASE_S", "900"))  # running jobs without progress this long are retried
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", "1000"))
+
 # ============================================================
 # INITIALIZE APP
 # ============================================================
 
+# orjson serializes the large heatmap strings several times faster than the stdlib
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    FastJSONResponse = JSONResponse
+
+@asynccontextmanager
+async def lifespan(app):
+    """Per-process startup: runs in each server process (after serve_workers.py forks)"""
+    if model_state == "not_started":
+        # Serve /health and 503s from /ready while the model loads
+        asyncio.get_running_loop().run_in_executor(None, _load_in_background)
+    else:
+        _start_job_queue()
+    yield
+    _stop_job_queue()
+
+
 app = FastAPI(
     title="Document Forgery Detection API",
     description="Real ML Inference API with Grad-CAM visualization",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
-# Request ID middleware
-@app.middleware("http")
-async def add_request_id(request: Request, call_next):
-    request_id = str(uuid.uuid4())[:8]
-    request.state.request_id = request_id
+# The two middlewares below are plain ASGI rather than @app.middleware("http"): Starlette's
+# BaseHTTPMiddleware listens for disconnects on the request's receive channel once the
+# response starts, which would swallow the rest of a body that is still being streamed
+# (TAR uploads to /predict_batch are answered while they upload)
+
+class RequestIdMiddleware:
+    """Request ID middleware: request.state.request_id and the request_id log record field"""
     
-    # Add to logging context
-    old_factory = logging.getLogRecordFactory()
-    def record_factory(*args, **kwargs):
-        record = old_factory(*args, **kwargs)
-        record.request_id = request_id
-        return record
-    logging.setLogRecordFactory(record_factory)
+    def __init__(self, app):
+        self.app = app
     
-    response = await call_next(request)
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request_id = str(uuid.uuid4())[:8]
+        scope.setdefault("state", {})["request_id"] = request_id
+        
+        # Add to logging context
+        old_factory = logging.getLogRecordFactory()
+        def record_factory(*args, **kwargs):
+            record = old_factory(*args, **kwargs)
+            record.request_id = request_id
+            return record
+        logging.setLogRecordFactory(record_factory)
+        
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            logging.setLogRecordFactory(old_factory)
+
+
+class MetricsMiddleware:
+    """Metrics middleware: in-flight gauge and end-to-end latency per route"""
     
-    logging.setLogRecordFactory(old_factory)
-    return response
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        IN_FLIGHT.inc()
+        start = time.perf_counter()
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                path=route.path if route is not None else "unmatched",
+                status=status
+            )
+
+
+app.add_middleware(RequestIdMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+# Body size limits, enforced while uploads stream in (inside CORS, so 413s carry its headers)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        "/predict_pdf": int(PDF_UPLOAD_MAX_MB * 1024 * 1024) + MULTIPART_OVERHEAD,
+        "/predict_batch": int(BULK_UPLOAD_MAX_MB * 1024 * 1024),
+        "/jobs": int(max(UPLOAD_MAX_MB, PDF_UPLOAD_MAX_MB) * 1024 * 1024) + MULTIPART_OVERHEAD,
+    },
+    default_limit=UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD
+)
 
 # CORS middleware
 app.add_middleware(
@@ -91,37 +294,185 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admission control: CPU-heavy work runs on a sized executor behind a bounded queue
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", str(min(4, os.cpu_count() or 1))))
+INFERENCE_MAX_CONCURRENCY = int(os.environ.get("INFERENCE_MAX_CONCURRENCY", "8"))
+INFERENCE_MAX_QUEUE = int(os.environ.get("INFERENCE_MAX_QUEUE", "32"))
+INFERENCE_QUEUE_TIMEOUT_S = float(os.environ.get("INFERENCE_QUEUE_TIMEOUT_S", "10"))
+INFERENCE_RETRY_AFTER_S = float(os.environ.get("INFERENCE_RETRY_AFTER_S", "1"))
+
+admission = AdmissionController(
+    max_concurrency=INFERENCE_MAX_CONCURRENCY,
+    max_queue=INFERENCE_MAX_QUEUE,
+    threads=INFERENCE_THREADS,
+    queue_timeout_s=INFERENCE_QUEUE_TIMEOUT_S,
+    retry_after_s=INFERENCE_RETRY_AFTER_S,
+    on_stage=observe_stage
+)
+
+def _result_cache_config(loader):
+    """Serving settings that change results, hashed into the result cache keys"""
+    return {**loader.serving_config(), "decode_max_side": DECODE_MAX_SIDE}
+
+
 # Global variables for model
 model_loader = None
+batcher = None
+result_cache = None
+deferred_gradcam = None
+job_store = None
+job_workers = None
 DEVICE = None
+model_state = "not_started"  # -> loading -> ready | failed
+model_ready = False  # loaded and warmed up; /health only reports liveness
+model_load_lock = threading.Lock()
+startup_timings = {}
+profiling_lock = asyncio.Lock()  # one profiled request at a time (profilers are process-wide)
 
-# Load model with error handling
 logger.info("="*60)
 logger.info("STARTING INFERENCE API")
 logger.info("="*60)
-logger.info(f"Model path: {MODEL_PATH}")
-logger.info(f"Model exists: {MODEL_PATH.exists()}")
 
-try:
-    # Try to import and load model
-    import torch
-    DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-    logger.info(f"Device: {DEVICE}")
-    
-    from model_loader import ModelLoader
-    model_loader = ModelLoader(
-        model_path=str(MODEL_PATH),
-        device=DEVICE,
-        img_size=IMG_SIZE
-    )
-    logger.info("Model loaded successfully")
-    logger.info(f"Model device: {model_loader.device}")
-    logger.info(f"Number of classes: {model_loader.num_classes}")
-    
-except Exception as e:
-    logger.error(f"Failed to load model: {e}")
-    logger.info("Server will run in compatibility mode without ML model")
-    model_loader = None
+
+def load_model():
+    """
+    Load and warm up the model, then publish it with its batcher, deferred
+    Grad-CAM store and result cache. Runs once: later calls wait for the
+    first and return its result. Called in the background from lifespan
+    (MODEL_LOAD_BACKGROUND=1), so /health answers and /ready is 503 while
+    it runs.
+    
+    Returns:
+        the ModelLoader, or None if loading failed (compatibility mode)
+    """
+    global model_loader, batcher, result_cache, deferred_gradcam, DEVICE
+    global model_state, model_ready, startup_timings
+    
+    with model_load_lock:
+        if model_state != "not_started":
+            return model_loader
+        model_state = "loading"
+        logger.info(f"Model path: {MODEL_PATH}")
+        logger.info(f"Model exists: {MODEL_PATH.exists()}")
+        
+        startup_start = time.perf_counter()
+        try:
+            # Try to import and load model
+            import torch
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+            logger.info(f"Device: {device}")
+            
+            calibration_images = None
+            if PRECISION_CALIBRATION_DIR:
+                from precision import load_calibration_images
+                calibration_images = load_calibration_images(
+                    PRECISION_CALIBRATION_DIR, limit=PRECISION_CALIBRATION_SAMPLES, max_side=DECODE_MAX_SIDE
+                )
+                logger.info(f"Loaded {len(calibration_images)} calibration images from {PRECISION_CALIBRATION_DIR}")
+            
+            from model_loader import ModelLoader
+            loader = ModelLoader(
+                model_path=str(MODEL_PATH),
+                device=device,
+                img_size=IMG_SIZE,
+                shared_resize=PREPROCESS_SHARED_RESIZE,
+                backend=INFERENCE_BACKEND,
+                backend_artifact=INFERENCE_BACKEND_ARTIFACT,
+                precision=INFERENCE_PRECISION,
+                calibration_images=calibration_images,
+                cascade_path=CASCADE_MODEL_PATH,
+                cascade_margin=CASCADE_MARGIN,
+                cascade_exit_classes=CASCADE_EXIT_CLASSES,
+                cascade_shadow_rate=CASCADE_SHADOW_RATE,
+                freeze=INFERENCE_FREEZE
+            )
+            calibration_images = None
+            logger.info("Model loaded successfully")
+            logger.info(f"Model device: {loader.device}")
+            logger.info(f"Number of classes: {loader.num_classes}")
+            
+            # Before on_stage is set, so warmup does not show up in latency metrics
+            loader.warmup(
+                batch_size=WARMUP_BATCH_SIZE,
+                iterations=WARMUP_ITERATIONS,
+                explain=WARMUP_GRADCAM
+            )
+            loader.on_stage = observe_stage
+            
+            from batching import MicroBatcher
+            new_batcher = MicroBatcher(
+                run_batch=loader.predict_images,
+                max_batch_size=BATCH_MAX_SIZE,
+                max_wait_ms=BATCH_MAX_WAIT_MS,
+                executor=admission.executor
+            )
+            
+            from deferred_gradcam import DeferredGradCAM
+            # Callbacks are defined with the endpoints below, so look them up at call time
+            new_deferred_gradcam = DeferredGradCAM(
+                compute=lambda content, cache_key: _compute_deferred_gradcam(content, cache_key),
+                encode=lambda content, cache_key, heatmap, variant: _encode_deferred_gradcam(
+                    content, cache_key, heatmap, variant
+                ),
+                max_entries=GRADCAM_DEFERRED_ENTRIES,
+                max_bytes=GRADCAM_DEFERRED_MB * 1024 * 1024,
+                ttl_s=GRADCAM_DEFERRED_TTL_S,
+                precompute=GRADCAM_PRECOMPUTE,
+                is_idle=lambda: _admission_idle()
+            )
+            
+            new_result_cache = None
+            if RESULT_CACHE_ENTRIES > 0:
+                from result_cache import ResultCache
+                new_result_cache = ResultCache(
+                    fingerprint=loader.fingerprint,
+                    max_entries=RESULT_CACHE_ENTRIES,
+                    max_heatmap_bytes=RESULT_CACHE_HEATMAP_MB * 1024 * 1024,
+                    disk_dir=RESULT_CACHE_DIR,
+                    max_disk_bytes=RESULT_CACHE_DISK_MB * 1024 * 1024,
+                    config=_result_cache_config(loader)
+                )
+            
+            # Published together once warm: requests never see a half-initialized model
+            DEVICE = device
+            batcher = new_batcher
+            deferred_gradcam = new_deferred_gradcam
+            result_cache = new_result_cache
+            startup_timings = dict(loader.load_timings)
+            model_loader = loader
+            model_ready = True
+            model_state = "ready"
+        
+        except Exception as e:
+            logger.error(f"Failed to load model: {e}", exc_info=True)
+            logger.info("Server will run in compatibility mode without ML model")
+            model_state = "failed"
+        
+        startup_timings["total"] = time.perf_counter() - startup_start
+        logger.info(f"Startup timings (s): {startup_timings}")
+        
+        MODEL_LOADED.set(1 if model_loader is not None else 0)
+        MODEL_READY.set(1 if model_ready else 0)
+        return model_loader
+
+
+
+def _load_in_background():
+    load_model()
+    _start_job_queue()
+
+
+def _check_model_loading():
+    """503 with Retry-After while the model is still loading in the background"""
+    if model_state in ("not_started", "loading"):
+        raise HTTPException(
+            503, "Model is loading, retry shortly",
+            headers={"Retry-After": str(MODEL_LOAD_RETRY_AFTER_S)}
+        )
+
+
+if not MODEL_LOAD_BACKGROUND:
+    load_model()
 
 # ============================================================
 # ENDPOINTS
@@ -136,25 +487,410 @@ async def root():
 
 @app.get("/health")
 async def health(request: Request):
-    """Health check endpoint"""
+    """Liveness check: the process is up (see /ready for readiness)"""
     logger.info("Health check requested")
     return {
         "status": "ok",
         "device": str(DEVICE) if DEVICE else "unknown",
         "model_loaded": model_loader is not None,
+        "ready": model_ready,
+        "model_state": model_state,
         "model_path": str(MODEL_PATH),
         "mode": "ML" if model_loader else "compatibility"
     }
 
+
+@app.get("/ready")
+async def ready():
+    """Readiness check: 200 once the model is loaded and warmed up, 503 otherwise"""
+    body = {"ready": model_ready, "state": model_state, "startup_timings": startup_timings}
+    return JSONResponse(body, status_code=200 if model_ready else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text-format metrics (stage latencies, classes, errors, gauges)"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats/admission")
+async def admission_stats():
+    """Admission control occupancy and rejection counters"""
+    return admission.stats()
+
+
+@app.get("/stats/backend")
+async def backend_stats():
+    """Execution backend and precision in use, per-batch-size forward latency and drift vs fp32"""
+    if model_loader is None:
+        raise HTTPException(503, "Backend unavailable: model not loaded")
+    return {**model_loader.backend.stats(), "drift_vs_fp32": model_loader.precision_report}
+
+
+@app.get("/stats/cascade")
+async def cascade_stats():
+    """Cascade escalation rate, agreement with the full model, per-stage latency and a margin table"""
+    if model_loader is None or model_loader.cascade is None:
+        raise HTTPException(404, "Cascade not enabled (set CASCADE_MODEL_PATH)")
+    return {**model_loader.cascade.stats(), "full_latency": model_loader.backend.stats()}
+
+
+@app.get("/stats/batching")
+async def batching_stats():
+    """Micro-batcher queue depth and achieved batch sizes"""
+    if batcher is None:
+        raise HTTPException(503, "Batching unavailable: model not loaded")
+    return batcher.stats()
+
+
+@app.get("/stats/cache")
+async def cache_stats():
+    """Result cache hit/miss/eviction counters"""
+    if result_cache is None:
+        raise HTTPException(503, "Result cache disabled")
+    return result_cache.stats()
+
+
+@app.post("/cache/invalidate")
+async def cache_invalidate():
+    """Drop all cached results and re-key on the loaded model's weights and settings"""
+    if result_cache is None:
+        raise HTTPException(503, "Result cache disabled")
+    result_cache.invalidate(fingerprint=model_loader.refresh_fingerprint(), config=_result_cache_config(model_loader))
+    return result_cache.stats()
+
+# 1x1 PNG returned in place of the heatmap when Grad-CAM fails
+PLACEHOLDER_GRADCAM = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+
+
+# progress(fraction, message) of the /jobs job running in this context (None for requests)
+JOB_PROGRESS = contextvars.ContextVar("job_progress", default=None)
+
+
+def _report_progress(fraction, message):
+    """Report job progress between stages (raises jobs.JobCancelled once cancelled); no-op for requests"""
+    progress = JOB_PROGRESS.get()
+    if progress is not None:
+        progress(fraction, message)
+
+
+async def _encode_heatmap(heatmap, original_img, fmt, quality):
+    """Overlay + encode a heatmap (gradcam.encode_heatmap) on the inference executor, timed per stage"""
+    from gradcam import encode_heatmap, encode_overlay, heatmap_overlay
+    if fmt == "raw":
+        with STAGE_SECONDS.time(stage="encode"):
+            return await admission.call(encode_heatmap, heatmap, None, fmt)
+    with STAGE_SECONDS.time(stage="overlay"):
+        overlay_img = await admission.call(heatmap_overlay, heatmap, original_img)
+    with STAGE_SECONDS.time(stage="encode"):
+        return await admission.call(encode_overlay, overlay_img, fmt, quality)
+
+
+async def _explain_image(original_img, fmt="png", quality=HEATMAP_QUALITY):
+    """
+    Fused prediction + Grad-CAM for a decoded image, with blocking work on
+    the inference executor. Caller must hold an admission slot.
+    
+    With the cascade enabled, documents that exit at the screening stage
+    get no heatmap (payload and shape None).
+    
+    Returns:
+        tuple (prediction, heatmap payload bytes in `fmt`, heatmap shape)
+    """
+    if model_loader.cascade is not None:
+        prediction, heatmap = await admission.call(model_loader.cascade_explain, original_img)
+        if heatmap is None:
+            return prediction, None, None
+    else:
+        prediction, heatmap = await admission.call(model_loader.predict_and_explain, original_img)
+    _report_progress(0.8, "Encoding heatmap")
+    payload = await _encode_heatmap(heatmap, original_img, fmt, quality)
+    return prediction, payload, list(heatmap.shape)
+
+
+async def _compute_deferred_gradcam(content, cache_key):
+    """DeferredGradCAM compute callback: uint8 heatmap for a held upload"""
+    import numpy as np
+    from gradcam import quantize_heatmap
+    
+    size = model_loader.img_size
+    if cache_key is not None:
+        cached_raw = result_cache.get_heatmap(cache_key, "raw")
+        if cached_raw is not None:
+            return np.frombuffer(base64.b64decode(cached_raw), dtype=np.uint8).reshape(size, size)
+    
+    from image_io import decode_image
+    async with admission.slot():
+        with STAGE_SECONDS.time(stage="decode"):
+            original_img = await admission.call(decode_image, content, DECODE_MAX_SIDE)
+        with STAGE_SECONDS.time(stage="gradcam_deferred"):
+            prediction, heatmap = await admission.call(model_loader.predict_and_explain, original_img)
+    heatmap = quantize_heatmap(heatmap)
+    
+    if cache_key is not None:
+        result_cache.put_prediction(cache_key, prediction)
+        result_cache.put_heatmap(cache_key, base64.b64encode(heatmap.tobytes()).decode("ascii"), "raw")
+    return heatmap
+
+
+async def _encode_deferred_gradcam(content, cache_key, heatmap, variant):
+    """DeferredGradCAM encode callback: payload bytes for variant (fmt, quality)"""
+    from gradcam import heatmap_variant
+    
+    fmt, quality = variant
+    name = heatmap_variant(fmt, quality)
+    if cache_key is not None:
+        cached = result_cache.get_heatmap(cache_key, name)
+        if cached is not None:
+            return base64.b64decode(cached)
+    
+    if fmt == "raw":
+        payload = heatmap.tobytes()
+    else:
+        from image_io import decode_image
+        async with admission.slot():
+            original_img = await admission.call(decode_image, content, DECODE_MAX_SIDE)
+            payload = await _encode_heatmap(heatmap, original_img, fmt, quality)
+    
+    if cache_key is not None:
+        result_cache.put_heatmap(cache_key, base64.b64encode(payload).decode("ascii"), name)
+    return payload
+
+
+def _parse_gradcam_classes(spec):
+    """gradcam_classes query value -> explain_classes kwargs ("all" or "top<k>")"""
+    if spec == "all":
+        return {"class_ids": None, "top_k": None}
+    if spec.startswith("top") and spec[3:].isdigit() and int(spec[3:]) > 0:
+        return {"class_ids": None, "top_k": int(spec[3:])}
+    raise HTTPException(400, 'gradcam_classes must be "all" or "top<k>" (e.g. top3)')
+
+
+async def _explain_classes_upload(content, class_spec, fmt, quality):
+    """
+    Prediction + one heatmap per requested class for an upload. Caller
+    must hold an admission slot.
+    
+    Returns:
+        tuple (prediction, list of dicts with class_id, class_name, score,
+        gradcam (base64 `fmt` payload), gradcam_shape)
+    """
+    from image_io import decode_image
+    
+    with STAGE_SECONDS.time(stage="decode"):
+        original_img = await admission.call(decode_image, content, DECODE_MAX_SIDE)
+    _report_progress(0.3, "Running model")
+    with STAGE_SECONDS.time(stage="gradcam_classes"):
+        prediction, class_ids, heatmaps = await admission.call(
+            model_loader.explain_classes, original_img, **class_spec
+        )
+    logger.info(f"Grad-CAM for classes {class_ids} in one batched backward")
+    _report_progress(0.8, "Encoding heatmaps")
+    
+    entries = []
+    for class_id, heatmap in zip(class_ids, heatmaps):
+        payload = await _encode_heatmap(heatmap, original_img, fmt, quality)
+        entries.append({
+            "class_id": class_id,
+            "class_name": model_loader.class_names[class_id],
+            "score": prediction["scores"][class_id],
+            "gradcam": base64.b64encode(payload).decode("ascii"),
+            "gradcam_shape": list(heatmap.shape),
+        })
+    return prediction, entries
+
+
+async def _analyze_tiled(content, explain, scale, fmt, quality):
+    """
+    Tiled high-resolution analysis of an upload (tiling.analyze_tiled).
+    Caller must hold an admission slot.
+    
+    Returns:
+        tuple (page prediction, gradcam_base64 or None, gradcam_shape, tile info)
+    """
+    from image_io import decode_image
+    from tiling import analyze_tiled
+    
+    with STAGE_SECONDS.time(stage="decode"):
+        page = await admission.call(decode_image, content, TILED_MAX_SIDE)
+    _report_progress(0.3, "Running model on tiles")
+    with STAGE_SECONDS.time(stage="tiled"):
+        result = await admission.call(
+            analyze_tiled, model_loader, page,
+            scale=scale,
+            overlap=TILE_OVERLAP,
+            max_tiles=TILE_MAX_TILES,
+            min_edge_density=TILE_MIN_EDGE_DENSITY,
+            batch_size=TILE_BATCH_SIZE,
+            aggregation=TILE_AGGREGATION,
+            explain=explain
+        )
+    tile_info = {**result["tiles"], "timings": result["timings"]}
+    logger.info(f"Tiled analysis: {tile_info['analyzed']}/{tile_info['grid']} tiles in {result['timings']['total']:.3f}s")
+    
+    heatmap = result["heatmap"]
+    if heatmap is None:
+        return result["prediction"], None, None, tile_info
+    _report_progress(0.8, "Encoding heatmap")
+    payload = await _encode_heatmap(heatmap, page, fmt, quality)
+    return result["prediction"], base64.b64encode(payload).decode("ascii"), list(heatmap.shape), tile_info
+
+
+def _admission_idle():
+    """True when nothing waits for an inference slot and some slot is free"""
+    stats = admission.stats()
+    return stats["waiting"] == 0 and stats["active"] < stats["threads"]
+
+
+async def _predict_single(original_img):
+    """Micro-batched prediction; a profiled request runs alone on its profiling thread"""
+    if EXECUTOR_OVERRIDE.get() is not None:
+        return (await admission.call(model_loader.predict_images, [original_img]))[0]
+    return await batcher.submit(original_img)
+
+
+def _profile_requested(request, profile):
+    """
+    Whether this request asked for profiling; raises 403 on a wrong
+    X-Profile-Token. Only called when PROFILING_ENABLED.
+    """
+    if not (profile or request.headers.get("x-profile") == "1"):
+        return False
+    if PROFILING_TOKEN and not hmac.compare_digest(request.headers.get("x-profile-token", ""), PROFILING_TOKEN):
+        raise HTTPException(403, "Profiling requires a valid X-Profile-Token")
+    if profiling_lock.locked():
+        raise HTTPException(409, "Another profiled request is running")
+    return True
+
+
+@asynccontextmanager
+async def _profile_request(metadata):
+    """Run the with-block under a RequestProfiler (see profiling.py), one at a time"""
+    from profiling import RequestProfiler
+    async with profiling_lock:
+        async with RequestProfiler(PROFILING_DIR, metadata) as profiler:
+            yield profiler
+
+
+async def _analyze_image(content, gradcam, fmt="png", quality=HEATMAP_QUALITY):
+    """
+    Decode an upload and run the model on it, with blocking work on the
+    inference executor. Caller must hold an admission slot.
+    
+    Returns:
+        tuple (prediction, gradcam_base64, gradcam_shape, heatmap_ok);
+        the heatmap is base64 of the `fmt` payload (PNG placeholder on failure)
+    """
+    from image_io import decode_image
+    from jobs import JobCancelled
+    
+    with STAGE_SECONDS.time(stage="decode"):
+        original_img = await admission.call(decode_image, content, DECODE_MAX_SIDE)
+    logger.info(f"Image size: {original_img.size}")
+    _report_progress(0.3, "Running model")
+    
+    gradcam_base64 = None
+    gradcam_shape = None
+    heatmap_ok = False
+    
+    if gradcam:
+        # Fused path: one preprocessing, one forward, one backward
+        logger.info("Starting fused prediction + Grad-CAM...")
+        pred_start = time.time()
+        try:
+            prediction, payload, gradcam_shape = await _explain_image(original_img, fmt, quality)
+            if payload is None:
+                logger.info("  - Cascade early exit: no heatmap")
+            else:
+                gradcam_base64 = base64.b64encode(payload).decode("ascii")
+                logger.info(f"  - Heatmap shape: {gradcam_shape}, format: {fmt}, {len(payload)} bytes")
+                logger.info(f"  - Base64 length: {len(gradcam_base64)} chars")
+                heatmap_ok = True
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"Grad-CAM generation failed: {e}", exc_info=True)
+            ERRORS.inc(type=f"gradcam_{type(e).__name__}")
+            # Fall back to a plain prediction with a placeholder heatmap
+            prediction = await _predict_single(original_img)
+            gradcam_base64 = PLACEHOLDER_GRADCAM
+            gradcam_shape = [256, 256]
+        pred_time = time.time() - pred_start
+        logger.info(f"Prediction + Grad-CAM complete in {pred_time:.3f}s")
+    else:
+        logger.info("Starting model prediction...")
+        pred_start = time.time()
+        prediction = await _predict_single(original_img)
+        pred_time = time.time() - pred_start
+        logger.info(f"Prediction complete in {pred_time:.3f}s")
+    
+    logger.info(f"  - Class ID: {prediction['class_id']}")
+    logger.info(f"  - Class Name: {prediction['class_name']}")
+    logger.info(f"  - Confidence: {prediction['confidence']:.4f}")
+    return prediction, gradcam_base64, gradcam_shape, heatmap_ok
+
+
+EXPLAIN_MODES = ("none", "inline", "deferred")
+
+
 @app.post("/predict")
-async def predict(request: Request, file: UploadFile = File(...)):
+async def predict(
+    request: Request,
+    file: UploadFile = File(...),
+    gradcam: bool = True,
+    explain: Optional[str] = None,
+    heatmap_format: str = "png",
+    heatmap_quality: int = HEATMAP_QUALITY,
+    gradcam_classes: Optional[str] = None,
+    tiled: bool = False,
+    tile_scale: float = TILE_SCALE,
+    profile: bool = False
+):
     """
     Predict forgery class and generate Grad-CAM heatmap.
+    
+    explain selects how the heatmap is produced (default: inline, or none
+    with gradcam=false):
+      - none: class prediction only (micro-batched)
+      - inline: heatmap computed and returned in this response
+      - deferred: prediction only, plus a gradcam_id; the heatmap is
+        computed when GET /gradcam/{gradcam_id} first asks for it
+    
+    heatmap_format picks the inline payload (base64 in "gradcam"): png
+    (default), webp / jpeg at heatmap_quality, or raw (H*W uint8 heatmap,
+    no overlay). Binary payloads are served by GET /gradcam/{id}/binary.
+    
+    gradcam_classes ("all" or "top<k>", inline only) adds one heatmap per
+    class in "gradcam_classes", from one forward and one batched backward.
+    
+    tiled=true analyzes the page at up to TILED_MAX_SIDE pixels as
+    overlapping model-size tiles (after resizing by tile_scale): the
+    verdict aggregates the tile scores and the heatmap is stitched from
+    per-tile Grad-CAM at page resolution. Details are in "tiles".
+    
+    profile=true (or an "X-Profile: 1" header), when the server enables
+    profiling, traces the model work of this call into PROFILING_DIR and
+    returns its trace ID in "profile" and the X-Profile-Id header. The
+    result cache and micro-batching are bypassed for it.
     """
+    from gradcam import heatmap_variant
     
     request_id = request.state.request_id
+    if explain is None:
+        explain = "inline" if gradcam else "none"
+    if explain not in EXPLAIN_MODES:
+        raise HTTPException(400, f"explain must be one of {EXPLAIN_MODES}")
+    _check_heatmap_format(heatmap_format, heatmap_quality)
+    inline = explain == "inline"
+    class_spec = _parse_gradcam_classes(gradcam_classes) if gradcam_classes is not None else None
+    if class_spec is not None and not inline:
+        raise HTTPException(400, "gradcam_classes needs explain=inline")
+    if tiled and (explain == "deferred" or class_spec is not None):
+        raise HTTPException(400, "tiled supports explain=inline or none, without gradcam_classes")
+    if tiled and not 0 < tile_scale <= 4:
+        raise HTTPException(400, "tile_scale must be in (0, 4]")
+    variant = heatmap_variant(heatmap_format, heatmap_quality)
     start_time = time.time()
-    tmp_path = None
     
     logger.info("="*60)
     logger.info(f"NEW PREDICTION REQUEST")
@@ -162,124 +898,719 @@ async def predict(request: Request, file: UploadFile = File(...)):
     logger.info(f"Content-Type: {file.content_type}")
     logger.info(f"Request ID: {request_id}")
     
-    # Validate file type
-    if not file.content_type.startswith("image/"):
-        logger.error(f"Invalid file type: {file.content_type}")
-        raise HTTPException(400, "File must be an image")
+    # The Content-Type is the client's claim: inspect_image checks the file's own bytes
+    if not (file.content_type or "").startswith("image/"):
+        logger.info(f"Content-Type {file.content_type!r} is not image/*; checking the file itself")
+    _check_model_loading()
+    
+    profiled = PROFILING_ENABLED and _profile_requested(request, profile)
+    profiler = None
     
     try:
-        # Save uploaded file temporarily
+        # Uploads are decoded straight from memory
         logger.info("Reading uploaded file...")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
-        logger.info(f"Saved to temp file: {tmp_path}")
+        with STAGE_SECONDS.time(stage="upload_read"):
+            content = await read_upload(file, UPLOAD_MAX_BYTES)
+        logger.info(f"Read {len(content)} bytes")
+        image_info = inspect_image(content, **IMAGE_LIMITS)
+        logger.info(
+            f"Image header: {image_info['format']} {image_info['width']}x{image_info['height']}, "
+            f"mode {image_info['mode']}, {image_info['frames']} frame(s)"
+        )
         
         if model_loader is not None:
-            # Real ML prediction
-            from PIL import Image
-            original_img = Image.open(tmp_path).convert("RGB")
-            logger.info(f"Image size: {original_img.size}")
+            gradcam_base64 = None
+            gradcam_shape = None
+            prediction = None
+            cache_key = None
+            class_heatmaps = None
+            tile_info = None
             
-            # Get prediction
-            logger.info("Starting model prediction...")
-            pred_start = time.time()
-            prediction = model_loader.predict(original_img)
-            pred_time = time.time() - pred_start
+            if result_cache is not None and not tiled and not profiled:
+                cache_key = result_cache.key(content)
+                if class_spec is None:
+                    prediction = result_cache.get_prediction(cache_key)
+                if prediction is not None and inline:
+                    gradcam_base64 = result_cache.get_heatmap(cache_key, variant)
+                    if gradcam_base64 is None:
+                        # Heatmap still needed: the fused pass recomputes both
+                        prediction = None
+                    else:
+                        gradcam_shape = [model_loader.img_size, model_loader.img_size]
             
-            logger.info(f"Prediction complete in {pred_time:.3f}s")
-            logger.info(f"  - Class ID: {prediction['class_id']}")
-            logger.info(f"  - Class Name: {prediction['class_name']}")
-            logger.info(f"  - Confidence: {prediction['confidence']:.4f}")
-            # Generate Grad-CAM visualization
-            logger.info("Generating Grad-CAM heatmap...")
-            try:
-                import torch
-                gradcam_start = time.time()
-                
-                # Get target layer: use backbone.features (last conv layer before pooling/attention)
-                # ForgeryNet structure: backbone.features -> CBAM -> pool -> classifier
-                # We must target backbone.features, NOT CBAM or pool
-                target_layer = model_loader.model.back[-1]  # Last layer of EfficientNet backbone
-                
-                # Prepare all required inputs for ForgeryNet
-                img_tensor = model_loader.transform(original_img).unsqueeze(0).to(DEVICE)
-                edge_tensor = model_loader.extract_edges(original_img).unsqueeze(0).to(DEVICE)
-                ocr_tensor = torch.zeros((1, model_loader.max_ocr_tokens), dtype=torch.long).to(DEVICE)
-                
-                logger.info(f"[GradCAM Setup] Img shape: {img_tensor.shape}, Edge shape: {edge_tensor.shape}, OCR shape: {ocr_tensor.shape}")
-                
-                # Create a wrapper function that handles the multi-input model
-                # This allows Grad-CAM to work with models that take multiple inputs
-                class GradCAMWrapper(torch.nn.Module):
-                    def __init__(self, model, edge_tensor, ocr_tensor):
-                        super().__init__()
-                        self.model = model
-                        self.edge_tensor = edge_tensor
-                        self.ocr_tensor = ocr_tensor
-                    
-                    def forward(self, img):
-                        return self.model(img, self.edge_tensor, self.ocr_tensor)
-                
-                wrapped_model = GradCAMWrapper(model_loader.model, edge_tensor, ocr_tensor)
-                wrapped_model.eval()
-                
-                # Import and run Grad-CAM
-                from gradcam import generate_gradcam
-                
-                gradcam_result = generate_gradcam(
-                    model=wrapped_model,
-                    input_tensor=img_tensor,
-                    original_image=original_img,
-                    target_layer=target_layer,
-                    class_idx=prediction['class_id']
-                )
+            cached = prediction is not None
+            profile_context = nullcontext()
+            if profiled:
+                profile_context = _profile_request({
+                    "request_id": request_id,
+                    "filename": file.filename,
+                    "bytes": len(content),
+                    "explain": explain,
+                    "heatmap_format": heatmap_format,
+                    "tiled": tiled,
+                    "gradcam_classes": gradcam_classes,
+                })
+            async with profile_context as profiler:
+                if cached:
+                    logger.info(f"Result cache hit: {cache_key[:16]}")
+                elif tiled:
+                    # Tiled results depend on the tiling settings and are not cached
+                    async with admission.slot():
+                        prediction, gradcam_base64, gradcam_shape, tile_info = await _analyze_tiled(
+                            content, inline, tile_scale, heatmap_format, heatmap_quality
+                        )
+                elif class_spec is not None:
+                    # Per-class heatmaps are not cached; one pass computes them all
+                    async with admission.slot():
+                        prediction, class_heatmaps = await _explain_classes_upload(
+                            content, class_spec, heatmap_format, heatmap_quality
+                        )
+                    for entry in class_heatmaps:
+                        if entry["class_id"] == prediction["class_id"]:
+                            gradcam_base64 = entry["gradcam"]
+                            gradcam_shape = entry["gradcam_shape"]
+                    if cache_key is not None:
+                        result_cache.put_prediction(cache_key, prediction)
+                else:
+                    async with admission.slot():
+                        prediction, gradcam_base64, gradcam_shape, heatmap_ok = await _analyze_image(
+                            content, inline, heatmap_format, heatmap_quality
+                        )
                 
-                gradcam_base64 = gradcam_result['base64_png']
-                gradcam_shape = gradcam_result['heatmap_shape']
-                
-                gradcam_time = time.time() - gradcam_start
-                logger.info(f"Grad-CAM generated in {gradcam_time:.3f}s")
-                logger.info(f"  - Heatmap shape: {gradcam_shape}")
-                logger.info(f"  - Base64 length: {len(gradcam_base64)} chars")
-                
-            except Exception as e:
-                logger.error(f"Grad-CAM generation failed: {e}", exc_info=True)
-                # Fallback to placeholder if Grad-CAM fails
-                gradcam_base64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
-                gradcam_shape = [256, 256]
+                    if cache_key is not None:
+                        result_cache.put_prediction(cache_key, prediction)
+                        if heatmap_ok:
+                            result_cache.put_heatmap(cache_key, gradcam_base64, variant)
+            
+            gradcam_format = None
+            if gradcam_base64 is not None:
+                # A failed Grad-CAM falls back to the PNG placeholder
+                gradcam_format = heatmap_format if gradcam_base64 is not PLACEHOLDER_GRADCAM else "png"
+            
+            gradcam_id = None
+            if explain == "deferred":
+                gradcam_id = deferred_gradcam.submit(content, cache_key)
+                logger.info(f"Grad-CAM deferred: {gradcam_id}")
             
         else:
             # Model must be loaded - no compatibility mode for production
             logger.error("Model not loaded - cannot proceed with analysis")
             raise HTTPException(500, "ML Model failed to load. Cannot analyze documents without model.")
         
+        PREDICTIONS.inc(class_name=prediction["class_name"])
+        
         # Build response - all real data from model
         response = {
             "filename": file.filename,
             "prediction": prediction,
             "gradcam": gradcam_base64,
             "gradcam_shape": gradcam_shape,
+            "gradcam_format": gradcam_format,
+            "explain": explain,
+            "cached": cached,
             "mode": "ML"  # Always ML mode - no fallback
         }
+        if class_heatmaps is not None:
+            response["gradcam_classes"] = class_heatmaps
+        if tile_info is not None:
+            response["tiles"] = tile_info
+        if gradcam_id is not None:
+            response["gradcam_id"] = gradcam_id
+            response["gradcam_url"] = f"/gradcam/{gradcam_id}"
+        headers = None
+        if profiler is not None and profiler.summary is not None:
+            response["profile"] = profiler.summary
+            headers = {"X-Profile-Id": profiler.trace_id}
         
         total_time = time.time() - start_time
         logger.info(f"TOTAL REQUEST TIME: {total_time:.3f}s")
         logger.info("="*60)
         
-        return JSONResponse(response)
+        return FastJSONResponse(response, headers=headers)
+    
+    except UploadRejected as e:
+        logger.warning(f"Upload rejected: {e.detail}")
+        ERRORS.inc(type=f"upload_rejected_{e.status_code}")
+        raise HTTPException(e.status_code, e.detail)
+    
+    except Overloaded as e:
+        logger.warning(f"Request rejected: {e.detail}")
+        ERRORS.inc(type=f"overloaded_{e.status_code}")
+        raise HTTPException(e.status_code, e.detail, headers=e.headers)
     
     except Exception as e:
         logger.error(f"PREDICTION FAILED: {str(e)}", exc_info=True)
+        ERRORS.inc(type=type(e).__name__)
         raise HTTPException(500, f"Prediction failed: {str(e)}")
+
+
+def _check_heatmap_format(fmt, quality):
+    from gradcam import HEATMAP_FORMATS
+    if fmt not in HEATMAP_FORMATS:
+        raise HTTPException(400, f"heatmap_format must be one of {tuple(HEATMAP_FORMATS)}")
+    if not 1 <= quality <= 100:
+        raise HTTPException(400, "heatmap_quality must be between 1 and 100")
+
+
+def _check_pdf_options(first_page, last_page, stop_threshold):
+    """Page range and early-stop checks that do not need the document"""
+    if first_page is not None and first_page < 1:
+        raise HTTPException(400, "first_page must be 1 or more")
+    if last_page is not None and last_page < 1:
+        raise HTTPException(400, "last_page must be 1 or more")
+    if stop_threshold is not None and not 0 <= stop_threshold <= 1:
+        raise HTTPException(400, "stop_threshold must be between 0 and 1")
+
+
+async def _deferred_payload(gradcam_id, fmt, quality):
+    """Encoded heatmap for a deferred result ID, with HTTP errors mapped"""
+    if deferred_gradcam is None:
+        raise HTTPException(503, "Grad-CAM unavailable: model not loaded")
+    _check_heatmap_format(fmt, quality)
+    try:
+        return await deferred_gradcam.get(gradcam_id, (fmt, quality))
+    except KeyError:
+        raise HTTPException(404, "Unknown or expired gradcam_id")
+    except Overloaded as e:
+        ERRORS.inc(type=f"overloaded_{e.status_code}")
+        raise HTTPException(e.status_code, e.detail, headers=e.headers)
+    except Exception as e:
+        logger.error(f"Deferred Grad-CAM failed: {e}", exc_info=True)
+        ERRORS.inc(type=f"gradcam_{type(e).__name__}")
+        raise HTTPException(500, f"Grad-CAM failed: {str(e)}")
+
+
+@app.get("/gradcam/{gradcam_id}")
+async def get_gradcam(gradcam_id: str, format: str = "png", quality: int = HEATMAP_QUALITY):
+    """
+    Heatmap for a /predict?explain=deferred result, base64 in JSON.
+    Computed on the first request (unless already precomputed), then
+    served from memory until the ID expires; each format is encoded once.
+    """
+    payload, shape = await _deferred_payload(gradcam_id, format, quality)
+    return {
+        "gradcam_id": gradcam_id,
+        "gradcam": base64.b64encode(payload).decode("ascii"),
+        "gradcam_format": format,
+        "gradcam_shape": shape,
+    }
+
+
+@app.get("/gradcam/{gradcam_id}/binary")
+async def get_gradcam_binary(gradcam_id: str, format: str = "png", quality: int = HEATMAP_QUALITY):
+    """
+    Same heatmap as /gradcam/{gradcam_id} as the raw response body (no
+    base64 / JSON). format=raw returns H*W uint8 bytes, row-major; the
+    shape is in the X-Heatmap-Shape header.
+    """
+    from gradcam import HEATMAP_FORMATS
+    
+    payload, shape = await _deferred_payload(gradcam_id, format, quality)
+    headers = {"X-Heatmap-Shape": ",".join(str(d) for d in shape)}
+    if format == "raw":
+        headers["X-Heatmap-Dtype"] = "uint8"
+    return Response(content=payload, media_type=HEATMAP_FORMATS[format], headers=headers)
+
+
+@app.get("/stats/gradcam")
+async def gradcam_stats():
+    """Deferred Grad-CAM store occupancy and counters"""
+    if deferred_gradcam is None:
+        raise HTTPException(503, "Grad-CAM unavailable: model not loaded")
+    return deferred_gradcam.stats()
+
+
+@app.post("/predict_pdf")
+async def predict_pdf(
+    request: Request,
+    file: UploadFile = File(...),
+    first_page: int = None,
+    last_page: int = None,
+    stop_threshold: float = None
+):
+    """
+    Predict forgery class for each page of a PDF document.
+    
+    Pages are rasterized lazily in memory and pipelined with inference.
+    Returns per-page verdicts and a document-level aggregate; with
+    stop_threshold set, analysis stops at the first page flagged as
+    forged with at least that confidence. first_page and last_page are
+    1-based and inclusive; stop_threshold must be in [0, 1].
+    """
+    from pdf_inference import PageRangeError, run_pdf_prediction
+    
+    request_id = request.state.request_id
+    start_time = time.time()
+    tmp_path = None
+    
+    logger.info("="*60)
+    logger.info(f"NEW PDF PREDICTION REQUEST")
+    logger.info(f"Filename: {file.filename}")
+    logger.info(f"Pages: {first_page or 1}-{last_page or 'end'}, stop threshold: {stop_threshold}")
+    logger.info(f"Request ID: {request_id}")
+    
+    if file.content_type != "application/pdf" and not (file.filename or "").lower().endswith(".pdf"):
+        logger.error(f"Invalid file type: {file.content_type}")
+        raise HTTPException(400, "File must be a PDF")
+    _check_pdf_options(first_page, last_page, stop_threshold)
+    
+    _check_model_loading()
+    if model_loader is None:
+        logger.error("Model not loaded - cannot proceed with analysis")
+        raise HTTPException(500, "ML Model failed to load. Cannot analyze documents without model.")
+    
+    try:
+        # Poppler needs a real file; the PDF itself is written once, pages never are
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+            tmp_path = tmp.name
+            await copy_pdf_upload(file, tmp, int(PDF_UPLOAD_MAX_MB * 1024 * 1024))
+        
+        async with admission.slot():
+            result = await run_pdf_prediction(
+                model_loader,
+                tmp_path,
+                first_page=first_page,
+                last_page=last_page,
+                max_side=PDF_MAX_SIDE,
+                stop_threshold=stop_threshold,
+                executor=admission.executor
+            )
+        
+        total_time = time.time() - start_time
+        logger.info(f"Document verdict: {result['document']['verdict']} "
+                    f"({result['document']['pages_analyzed']} pages analyzed)")
+        logger.info(f"TOTAL REQUEST TIME: {total_time:.3f}s")
+        logger.info("="*60)
+        
+        return JSONResponse({"filename": file.filename, **result, "mode": "ML"})
+    
+    except PageRangeError as e:
+        logger.warning(f"Invalid page range: {e}")
+        ERRORS.inc(type="invalid_page_range")
+        raise HTTPException(400, str(e))
+    
+    except UploadRejected as e:
+        logger.warning(f"Upload rejected: {e.detail}")
+        ERRORS.inc(type=f"upload_rejected_{e.status_code}")
+        raise HTTPException(e.status_code, e.detail)
+    
+    except Overloaded as e:
+        logger.warning(f"Request rejected: {e.detail}")
+        ERRORS.inc(type=f"overloaded_{e.status_code}")
+        raise HTTPException(e.status_code, e.detail, headers=e.headers)
+    
+    except Exception as e:
+        logger.error(f"PDF PREDICTION FAILED: {str(e)}", exc_info=True)
+        ERRORS.inc(type=type(e).__name__)
+        raise HTTPException(500, f"PDF prediction failed: {str(e)}")
     
     finally:
-        # Cleanup temp file
         if tmp_path and os.path.exists(tmp_path):
             os.unlink(tmp_path)
             logger.info(f"Cleaned up temp file: {tmp_path}")
 
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for an endpoint that keeps reading the request body
+    while it answers. Starlette's disconnect listener would consume the
+    body messages, so a client disconnect surfaces through the body stream
+    (or the failed send) instead.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@app.post("/predict_batch")
+async def predict_batch(request: Request, gradcam: bool = False):
+    """
+    Predict forgery class for many documents in one call.
+    
+    Accepts either a multipart form with several `files` parts or a single
+    ZIP/TAR archive as the raw request body. Results are streamed as NDJSON
+    (one line per file, then a summary line) so clients can start consuming
+    before the whole upload is processed.
+    
+    A TAR body (optionally compressed) is read while it uploads: members are
+    decoded as they arrive, and the first lines go out before the upload
+    ends. A ZIP body is spooled first (BULK_SPOOL_MAX_MEMORY in memory,
+    then disk) because its central directory comes last; multipart uploads
+    are likewise parsed in full before processing starts.
+    """
+    from bulk import BodyReader, is_archive_content_type, is_zip_content_type, iter_archive, run_bulk_prediction
+    
+    request_id = request.state.request_id
+    content_type = request.headers.get("content-type", "")
+    
+    logger.info("="*60)
+    logger.info(f"NEW BULK PREDICTION REQUEST")
+    logger.info(f"Content-Type: {content_type}")
+    logger.info(f"Grad-CAM: {gradcam}")
+    logger.info(f"Request ID: {request_id}")
+    
+    _check_model_loading()
+    if model_loader is None:
+        logger.error("Model not loaded - cannot proceed with analysis")
+        raise HTTPException(500, "ML Model failed to load. Cannot analyze documents without model.")
+    
+    spool = None
+    body = None
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        uploads = [f for f in form.getlist("files") if hasattr(f, "filename") and hasattr(f, "file")]
+        if not uploads:
+            raise HTTPException(400, "No files provided in 'files' form field")
+        entries = ((upload.filename, upload.file.read()) for upload in uploads)
+    elif is_zip_content_type(content_type):
+        spool = tempfile.SpooledTemporaryFile(max_size=BULK_SPOOL_MAX_MEMORY)
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        entries = iter_archive(spool, content_type, max_member_bytes=UPLOAD_MAX_BYTES)
+    elif is_archive_content_type(content_type):
+        body = BodyReader(request.stream(), asyncio.get_running_loop())
+        entries = iter_archive(body, content_type, max_member_bytes=UPLOAD_MAX_BYTES)
+    else:
+        raise HTTPException(415, "Send multipart 'files' or a ZIP/TAR archive body")
+    
+    # Reject before the streaming response starts; the slot is held until it ends
+    try:
+        admitted_at = await admission.acquire()
+    except Overloaded as e:
+        if spool is not None:
+            spool.close()
+        logger.warning(f"Request rejected: {e.detail}")
+        ERRORS.inc(type=f"overloaded_{e.status_code}")
+        raise HTTPException(e.status_code, e.detail, headers=e.headers)
+    
+    async def stream():
+        try:
+            async for line in run_bulk_prediction(
+                model_loader,
+                entries,
+                batch_size=BATCH_MAX_SIZE,
+                gradcam=gradcam,
+                executor=admission.executor,
+                max_side=DECODE_MAX_SIDE,
+                max_files=BULK_MAX_FILES,
+                image_limits=IMAGE_LIMITS
+            ):
+                yield line
+        finally:
+            admission.release(admitted_at)
+            if spool is not None:
+                spool.close()
+    
+    response_class = BodyStreamingResponse if body is not None else StreamingResponse
+    return response_class(stream(), media_type="application/x-ndjson")
+
+def _start_job_queue():
+    """Open the job store and start its workers in this process (no-op without a model or workers)"""
+    global job_store, job_workers
+    if model_loader is None or JOB_WORKERS <= 0 or job_store is not None:
+        return
+    try:
+        from jobs import JobStore, JobWorkerPool
+        job_store = JobStore(JOBS_DIR, result_ttl_s=JOB_RESULT_TTL_S)
+        job_workers = JobWorkerPool(
+            job_store,
+            handler=_run_job,
+            workers=JOB_WORKERS,
+            lease_s=JOB_LEASE_S,
+            permanent_errors=(UploadRejected, ValueError)
+        )
+        job_workers.start()
+    except Exception as e:
+        logger.error(f"Job queue unavailable: {e}", exc_info=True)
+        job_store = None
+        job_workers = None
+
+
+def _stop_job_queue():
+    if job_workers is not None:
+        job_workers.stop(timeout=5)
+
+
+def _run_job(job, progress):
+    """JobWorkerPool handler: runs one /jobs job on the worker thread's own event loop"""
+    return asyncio.run(_run_job_async(job, progress))
+
+
+async def _run_job_async(job, progress):
+    """
+    Body of a /jobs job, sharing the /predict and /predict_pdf helpers.
+    
+    The micro-batcher and the admission slots belong to the server's
+    event loop, so model work goes straight to the inference executor
+    (concurrency is bounded by JOB_WORKERS instead). The image helpers
+    report progress between decoding, the model and heatmap encoding
+    (JOB_PROGRESS), which is also where a cancel takes effect.
+    
+    Returns:
+        the JSON the matching synchronous endpoint would have answered
+    """
+    EXECUTOR_OVERRIDE.set(admission.executor)
+    JOB_PROGRESS.set(progress)
+    params = job["params"]
+    
+    if job["kind"] == "pdf":
+        from pdf_inference import run_pdf_prediction
+        
+        def on_page(done, expected):
+            progress(done / expected if expected else 1.0, f"Page {done}/{expected}")
+        
+        progress(0.0, "Reading PDF")
+        result = await run_pdf_prediction(
+            model_loader,
+            job["payload_path"],
+            first_page=params["first_page"],
+            last_page=params["last_page"],
+            max_side=PDF_MAX_SIDE,
+            stop_threshold=params["stop_threshold"],
+            executor=admission.executor,
+            on_page=on_page
+        )
+        logger.info(f"Job {job['id']}: document verdict {result['document']['verdict']} "
+                    f"({result['document']['pages_analyzed']} pages analyzed)")
+        return {"filename": params["filename"], **result, "mode": "ML"}
+    
+    if job["kind"] != "image":
+        raise ValueError(f"Unknown job kind: {job['kind']}")
+    
+    content = Path(job["payload_path"]).read_bytes()
+    fmt, quality = params["heatmap_format"], params["heatmap_quality"]
+    inline = params["explain"] == "inline"
+    class_heatmaps = None
+    tile_info = None
+    
+    progress(0.1, "Decoding image")
+    if params["tiled"]:
+        prediction, gradcam_base64, gradcam_shape, tile_info = await _analyze_tiled(
+            content, inline, params["tile_scale"], fmt, quality
+        )
+    elif params["gradcam_classes"] is not None:
+        prediction, class_heatmaps = await _explain_classes_upload(
+            content, _parse_gradcam_classes(params["gradcam_classes"]), fmt, quality
+        )
+        gradcam_base64 = gradcam_shape = None
+        for entry in class_heatmaps:
+            if entry["class_id"] == prediction["class_id"]:
+                gradcam_base64 = entry["gradcam"]
+                gradcam_shape = entry["gradcam_shape"]
+    else:
+        prediction, gradcam_base64, gradcam_shape, _ = await _analyze_image(content, inline, fmt, quality)
+    PREDICTIONS.inc(class_name=prediction["class_name"])
+    
+    gradcam_format = None
+    if gradcam_base64 is not None:
+        gradcam_format = fmt if gradcam_base64 is not PLACEHOLDER_GRADCAM else "png"
+    result = {
+        "filename": params["filename"],
+        "prediction": prediction,
+        "gradcam": gradcam_base64,
+        "gradcam_shape": gradcam_shape,
+        "gradcam_format": gradcam_format,
+        "explain": params["explain"],
+        "mode": "ML"
+    }
+    if class_heatmaps is not None:
+        result["gradcam_classes"] = class_heatmaps
+    if tile_info is not None:
+        result["tiles"] = tile_info
+    return result
+
+
+def _job_view(job):
+    """Public status of a job (no params or result)"""
+    view = {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "priority": job["priority"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "cancel_requested": job["cancel_requested"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "expires_at": job["expires_at"],
+        "status_url": f"/jobs/{job['id']}",
+        "result_url": f"/jobs/{job['id']}/result",
+    }
+    if job["status"] == "queued":
+        view["queue_position"] = job_store.queue_position(job["id"])
+    return view
+
+
+def _get_job(job_id):
+    if job_store is None:
+        raise HTTPException(503, "Jobs unavailable: model not loaded or JOB_WORKERS=0")
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown or expired job_id")
+    return job
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    request: Request,
+    file: UploadFile = File(...),
+    priority: int = 0,
+    gradcam: bool = True,
+    heatmap_format: str = "png",
+    heatmap_quality: int = HEATMAP_QUALITY,
+    gradcam_classes: Optional[str] = None,
+    tiled: bool = False,
+    tile_scale: float = TILE_SCALE,
+    first_page: int = None,
+    last_page: int = None,
+    stop_threshold: float = None
+):
+    """
+    Queue a long-running analysis and return its job_id at once (202).
+    
+    A PDF upload runs like /predict_pdf (first_page, last_page,
+    stop_threshold); an image runs like /predict (gradcam,
+    heatmap_format, heatmap_quality, gradcam_classes, tiled, tile_scale).
+    Jobs with a higher priority run first. Poll GET /jobs/{job_id} for
+    status and progress, fetch the response of the synchronous endpoint
+    from GET /jobs/{job_id}/result, and stop a job with POST
+    /jobs/{job_id}/cancel. Queued jobs survive a restart; jobs whose
+    worker died are retried up to JOB_MAX_ATTEMPTS times. Results are
+    kept for JOB_RESULT_TTL_S seconds.
+    """
+    request_id = request.state.request_id
+    
+    logger.info("="*60)
+    logger.info(f"NEW JOB REQUEST")
+    logger.info(f"Filename: {file.filename}")
+    logger.info(f"Priority: {priority}")
+    logger.info(f"Request ID: {request_id}")
+    
+    _check_model_loading()
+    if job_store is None:
+        raise HTTPException(503, "Jobs unavailable: model not loaded or JOB_WORKERS=0")
+    _check_heatmap_format(heatmap_format, heatmap_quality)
+    if gradcam_classes is not None:
+        _parse_gradcam_classes(gradcam_classes)
+        if not gradcam:
+            raise HTTPException(400, "gradcam_classes needs gradcam=true")
+    if tiled and gradcam_classes is not None:
+        raise HTTPException(400, "tiled does not support gradcam_classes")
+    if tiled and not 0 < tile_scale <= 4:
+        raise HTTPException(400, "tile_scale must be in (0, 4]")
+    _check_pdf_options(first_page, last_page, stop_threshold)
+    if job_store.count("queued") >= JOB_MAX_QUEUED:
+        ERRORS.inc(type="jobs_queue_full")
+        raise HTTPException(429, f"Job queue full ({JOB_MAX_QUEUED} queued)")
+    
+    tmp_path = None
+    try:
+        head = await file.read(PDF_HEADER_WINDOW)
+        await file.seek(0)
+        if is_pdf(head):
+            kind = "pdf"
+            params = {
+                "filename": file.filename,
+                "first_page": first_page,
+                "last_page": last_page,
+                "stop_threshold": stop_threshold,
+            }
+            # Streamed next to the payloads, then renamed into place by submit
+            with tempfile.NamedTemporaryFile(delete=False, dir=job_store.payload_dir, suffix=".upload") as tmp:
+                tmp_path = tmp.name
+                size = await copy_pdf_upload(file, tmp, int(PDF_UPLOAD_MAX_MB * 1024 * 1024))
+            job_id = await asyncio.to_thread(
+                job_store.submit, kind, params, payload_file=tmp_path, priority=priority, max_attempts=JOB_MAX_ATTEMPTS
+            )
+            tmp_path = None
+        else:
+            kind = "image"
+            params = {
+                "filename": file.filename,
+                "explain": "inline" if gradcam else "none",
+                "heatmap_format": heatmap_format,
+                "heatmap_quality": heatmap_quality,
+                "gradcam_classes": gradcam_classes,
+                "tiled": tiled,
+                "tile_scale": tile_scale,
+            }
+            content = await read_upload(file, UPLOAD_MAX_BYTES)
+            size = len(content)
+            inspect_image(content, **IMAGE_LIMITS)
+            job_id = await asyncio.to_thread(
+                job_store.submit, kind, params, payload=content, priority=priority, max_attempts=JOB_MAX_ATTEMPTS
+            )
+    
+    except UploadRejected as e:
+        logger.warning(f"Upload rejected: {e.detail}")
+        ERRORS.inc(type=f"upload_rejected_{e.status_code}")
+        raise HTTPException(e.status_code, e.detail)
+    
+    except Exception as e:
+        logger.error(f"JOB SUBMISSION FAILED: {str(e)}", exc_info=True)
+        ERRORS.inc(type=type(e).__name__)
+        raise HTTPException(500, f"Job submission failed: {str(e)}")
+    
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    
+    job_workers.notify()
+    logger.info(f"Job {job_id} queued: {kind}, {size} bytes")
+    logger.info("="*60)
+    return JSONResponse(_job_view(job_store.get(job_id)), status_code=202)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status, progress (0..1 with a message) and attempts of a job"""
+    return _job_view(_get_job(job_id))
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    """
+    Result of a finished job: 200 with "result" (the response of the
+    synchronous endpoint) once succeeded, 202 with the status while queued
+    or running, 409 with the error if it failed or was cancelled, 404
+    once expired.
+    """
+    job = _get_job(job_id)
+    if job["status"] == "succeeded":
+        return FastJSONResponse({"job_id": job_id, "status": job["status"], "result": job["result"]})
+    status_code = 202 if job["status"] in ("queued", "running") else 409
+    return JSONResponse(_job_view(job), status_code=status_code)
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Cancel a job. Queued jobs are cancelled at once; running jobs stop at
+    their next progress step (status stays "running" with cancel_requested
+    until then). Finished jobs are unchanged.
+    """
+    _get_job(job_id)
+    job = await asyncio.to_thread(job_store.cancel, job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown or expired job_id")
+    return _job_view(job)
+
+
+@app.get("/stats/jobs")
+async def jobs_stats():
+    """Job counts per status, oldest queued job and worker activity"""
+    if job_store is None:
+        raise HTTPException(503, "Jobs unavailable: model not loaded or JOB_WORKERS=0")
+    return {**job_store.stats(), "workers": job_workers.stats()}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -7,7 +7,15 @@ from PIL import Image
 import numpy as np
 import cv2
 from pathlib import Path
+import hashlib
+import pickle
 import logging
+import threading
+import time
+
+from backends import create_backend
+from precision import build_precision_plan, compare_logits, parse_modes
+from preprocessing import Preprocessor
 
 logger = logging.getLogger(__name__)
 
@@ -58,29 +66,52 @@ class CBAM(nn.Module):
         return x
 
 
+# Final feature channels of each supported backbone
+BACKBONE_CHANNELS = {
+    "efficientnet_b3": 1536,
+    "efficientnet_b0": 1280,
+}
+
+
 class ForgeryNet(nn.Module):
-    def __init__(self, img_size=256, num_classes=7, ocr_vocab_size=128, max_ocr_tokens=64):
+    def __init__(self, img_size=256, num_classes=7, ocr_vocab_size=128, max_ocr_tokens=64,
+                 backbone=None, feature_channels=None):
+        """
+        Args:
+            backbone: "efficientnet_b3" / "efficientnet_b0" to build that
+                architecture without pretrained weights (for loading a
+                checkpoint). None = notebook behaviour: ImageNet-pretrained
+                B3, falling back to B0.
+            feature_channels: backbone output channels; probed with a dummy
+                forward when None
+        """
         super().__init__()
         self.img_size = img_size
         self.num_classes = num_classes
         self.max_ocr_tokens = max_ocr_tokens
 
-        # Backbone: EfficientNet-B3 (fallback to B0)
-        try:
-            weights = models.EfficientNet_B3_Weights.DEFAULT
-            backbone = models.efficientnet_b3(weights=weights)
-        except:
+        if backbone is not None:
+            # Weights come from the checkpoint: no download, no fallback
+            backbone = getattr(models, backbone)(weights=None)
+        else:
+            # Backbone: EfficientNet-B3 (fallback to B0)
             try:
-                backbone = models.efficientnet_b0(weights=models.EfficientNet_B0_Weights.DEFAULT)
+                weights = models.EfficientNet_B3_Weights.DEFAULT
+                backbone = models.efficientnet_b3(weights=weights)
             except:
-                backbone = models.efficientnet_b0(pretrained=True)
+                try:
+                    backbone = models.efficientnet_b0(weights=models.EfficientNet_B0_Weights.DEFAULT)
+                except:
+                    backbone = models.efficientnet_b0(pretrained=True)
 
         self.back = backbone.features
 
-        # Probe output channels
-        with torch.no_grad():
-            dummy = torch.zeros(1, 3, img_size, img_size)
-            ch = self.back(dummy).shape[1]
+        ch = feature_channels
+        if ch is None:
+            # Probe output channels
+            with torch.no_grad():
+                dummy = torch.zeros(1, 3, img_size, img_size)
+                ch = self.back(dummy).shape[1]
 
         self.cbam = CBAM(ch)
         self.pool = nn.AdaptiveAvgPool2d(1)
@@ -110,19 +141,104 @@ class ForgeryNet(nn.Module):
         )
 
     def forward(self, img, edge, ocr):
-        x = self.back(img)
+        return self.forward_head(self.forward_features(img), edge, ocr)
+
+    def forward_features(self, img):
+        """Backbone feature maps (output of back[-1], the Grad-CAM layer)"""
+        return self.back(img)
+
+    def forward_head(self, x, edge, ocr):
+        """Everything after the backbone: CBAM, pooling, edge/OCR branches, classifier"""
         x = self.cbam(x)
         x = self.pool(x).view(x.size(0), -1)
 
         e = self.edge_branch(edge)
+        o = self.ocr_features(ocr)
+
+        f = torch.cat([x, e, o], dim=1)
+        return self.classifier(f)
 
+    def ocr_features(self, ocr):
+        """32-d OCR branch output for (B, max_ocr_tokens) token ids"""
         o = self.ocr_emb(ocr)
         o = o.permute(0, 2, 1)
         o = self.ocr_pool(o).squeeze(-1)
-        o = self.ocr_head(o.float())
+        return self.ocr_head(o.float())
 
-        f = torch.cat([x, e, o], dim=1)
-        return self.classifier(f)
+
+def state_dict_fingerprint(state_dict):
+    """
+    Stable hex digest of a state_dict (names, shapes, dtypes and values).
+    Used to tell results of different model weights apart.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(state_dict):
+        tensor = state_dict[name].detach().cpu().contiguous()
+        digest.update(name.encode("utf-8"))
+        digest.update(str(tuple(tensor.shape)).encode("utf-8"))
+        digest.update(str(tensor.dtype).encode("utf-8"))
+        digest.update(tensor.view(-1).view(torch.uint8).numpy().tobytes())
+    return digest.hexdigest()
+
+
+def unwrap_state_dict(checkpoint):
+    """Return the state_dict inside a training checkpoint (or the dict itself)"""
+    for key in ("model_state_dict", "state_dict", "model"):
+        if isinstance(checkpoint, dict) and isinstance(checkpoint.get(key), dict):
+            return checkpoint[key]
+    return checkpoint
+
+
+def load_state_dict_file(model_path):
+    """
+    Load a state_dict without deserializing tensors up front.
+
+    `.safetensors` files (if the package is installed) and torch zip
+    checkpoints are memory-mapped, so tensor data is paged in from the file
+    on first use instead of being copied at load time. Legacy pickles that
+    need `weights_only=False` are still loaded eagerly; convert them once
+    with convert_checkpoint.py.
+
+    Returns:
+        tuple (state_dict, format) with format "safetensors", "mmap" or "pickle"
+    """
+    model_path = str(model_path)
+    if model_path.endswith(".safetensors"):
+        from safetensors.torch import load_file
+        return load_file(model_path, device="cpu"), "safetensors"
+
+    try:
+        checkpoint = torch.load(model_path, map_location="cpu", mmap=True, weights_only=True)
+        return unwrap_state_dict(checkpoint), "mmap"
+    except (RuntimeError, pickle.UnpicklingError) as e:
+        # Old (non-zip) serialization, or pickled objects beyond plain tensors
+        logger.warning(
+            f"Checkpoint cannot be memory-mapped ({type(e).__name__}); loading it eagerly. "
+            f"Run convert_checkpoint.py once for faster startup."
+        )
+    checkpoint = torch.load(model_path, map_location="cpu", weights_only=False)
+    return unwrap_state_dict(checkpoint), "pickle"
+
+
+def checkpoint_architecture(state_dict):
+    """
+    ForgeryNet constructor arguments implied by a state_dict's shapes.
+
+    Returns:
+        dict with backbone, feature_channels, num_classes, ocr_vocab_size
+    """
+    channels = state_dict["cbam.ca.fc.0.weight"].shape[1]
+    backbones = {ch: name for name, ch in BACKBONE_CHANNELS.items()}
+    if channels not in backbones:
+        raise ValueError(f"Unsupported backbone: checkpoint has {channels} feature channels")
+    classifier_weights = [k for k in state_dict if k.startswith("classifier.") and k.endswith(".weight")]
+    last_layer = max(classifier_weights, key=lambda k: int(k.split(".")[1]))
+    return {
+        "backbone": backbones[channels],
+        "feature_channels": channels,
+        "num_classes": state_dict[last_layer].shape[0],
+        "ocr_vocab_size": state_dict["ocr_emb.weight"].shape[0],
+    }
 
 
 # ============================================================
@@ -130,7 +246,32 @@ class ForgeryNet(nn.Module):
 # ============================================================
 
 class ModelLoader:
-    def __init__(self, model_path, device="cpu", img_size=256):
+    def __init__(self, model_path, device="cpu", img_size=256, shared_resize=False,
+                 backend="eager", backend_artifact=None, precision="fp32", calibration_images=None,
+                 cascade_path=None, cascade_margin=0.9, cascade_exit_classes=("positive",),
+                 cascade_shadow_rate=0.0, freeze=False):
+        """
+        Args:
+            model_path: checkpoint (.pth/.pt, or .safetensors); None = random weights
+            device: torch device
+            img_size: model input resolution
+            shared_resize: see Preprocessor
+            backend: execution backend for predictions (see backends.BACKENDS);
+                Grad-CAM always runs on the eager model
+            backend_artifact: exported TorchScript / ONNX file for the backend
+            precision: precision modes for the eager backend, e.g. "bf16" or
+                "channels_last,static_int8" (see precision.PRECISION_MODES)
+            calibration_images: PIL images used to calibrate static int8 and
+                to measure drift against fp32
+            cascade_path: screening-stage checkpoint from distill_screening.py;
+                enables the confidence-gated cascade (see cascade.Cascade)
+            cascade_margin: top-1 minus top-2 probability needed to exit early
+            cascade_exit_classes: classes allowed to exit at the screening stage
+            cascade_shadow_rate: fraction of early exits also run on the full model
+            freeze: replace the model by its inference-specialized form
+                (freeze.FrozenForgeryNet: conv+BN fused, constant OCR branch
+                folded); predictions and Grad-CAM both use it
+        """
         logger.info("Initializing ModelLoader...")
         self.device = torch.device(device)
         self.img_size = img_size
@@ -150,24 +291,63 @@ class ModelLoader:
         logger.info(f"Classes: {self.class_names}")
         
         # Load model
-        logger.info("Creating ForgeryNet model...")
-        self.model = ForgeryNet(
-            img_size=img_size,
-            num_classes=self.num_classes,
-            ocr_vocab_size=128,
-            max_ocr_tokens=self.max_ocr_tokens
-        )
-        
-        logger.info(f"Loading weights from: {model_path}")
-        state_dict = torch.load(model_path, map_location=self.device, weights_only=False)
-        logger.info(f"State dict keys: {len(state_dict)} parameters")
+        timings = {}
+        if model_path is None:
+            # Random weights (benchmarks / smoke tests): real init, no checkpoint
+            logger.info("No model path given: creating randomly initialized ForgeryNet")
+            start = time.perf_counter()
+            self.model = ForgeryNet(
+                img_size=img_size,
+                num_classes=self.num_classes,
+                ocr_vocab_size=128,
+                max_ocr_tokens=self.max_ocr_tokens,
+                backbone="efficientnet_b3",
+                feature_channels=BACKBONE_CHANNELS["efficientnet_b3"]
+            )
+            timings["build"] = time.perf_counter() - start
+        else:
+            logger.info(f"Loading weights from: {model_path}")
+            start = time.perf_counter()
+            state_dict, checkpoint_format = load_state_dict_file(model_path)
+            timings["load_weights"] = time.perf_counter() - start
+            logger.info(f"State dict keys: {len(state_dict)} parameters ({checkpoint_format})")
+            
+            arch = checkpoint_architecture(state_dict)
+            logger.info(f"Creating ForgeryNet model: {arch}")
+            if arch["num_classes"] != self.num_classes:
+                raise ValueError(f"Checkpoint has {arch['num_classes']} classes, expected {self.num_classes}")
+            
+            # Built on the meta device: parameters are not allocated or initialized,
+            # load_state_dict(assign=True) adopts the (memory-mapped) checkpoint tensors
+            start = time.perf_counter()
+            with torch.device("meta"):
+                self.model = ForgeryNet(
+                    img_size=img_size,
+                    max_ocr_tokens=self.max_ocr_tokens,
+                    **arch
+                )
+            self.model.load_state_dict(state_dict, assign=True)
+            timings["build"] = time.perf_counter() - start
         
-        self.model.load_state_dict(state_dict)
         self.model.to(self.device)
         self.model.eval()
+        self.load_timings = timings
         logger.info(f"Model moved to device: {self.device}")
         logger.info("Model set to eval mode")
         
+        self._fingerprint = None
+        self.frozen = freeze
+        if freeze:
+            from freeze import freeze_for_inference
+            start = time.perf_counter()
+            self.fingerprint  # of the loaded weights, before folding changes them
+            self.model = freeze_for_inference(self.model)
+            timings["freeze"] = time.perf_counter() - start
+        
+        # One Grad-CAM explainer for the lifetime of the model, shared by all threads
+        from gradcam import Explainer
+        self.explainer = Explainer(self.model)
+        
         # Image preprocessing
         self.transform = transforms.Compose([
             transforms.Resize((img_size, img_size)),
@@ -175,6 +355,179 @@ class ModelLoader:
             transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
         ])
         logger.info("Transform pipeline created")
+        
+        # Batched preprocessing for both branches (same numbers as transform/extract_edges)
+        self.preprocessor = Preprocessor(img_size, shared_resize=shared_resize)
+        # Per-thread input tensors reused across batches of the same size (see prepare_batch)
+        self._batch_buffers = threading.local()
+        
+        # Optional callback(stage, seconds) for per-stage latency metrics
+        self.on_stage = None
+        
+        # Execution backend for plain predictions (falls back to eager fp32)
+        start = time.perf_counter()
+        self.precision_report = None
+        plan = self._precision_plan(backend, precision, calibration_images)
+        try:
+            self.backend = create_backend(
+                backend, self.model, artifact=backend_artifact, precision=plan,
+                fingerprint=self.fingerprint if backend_artifact else None
+            )
+        except Exception as e:
+            logger.error(f"Failed to create {backend!r} backend ({e}); using eager PyTorch")
+            self.backend = create_backend("eager", self.model, precision=plan)
+        self.backend.precision = plan.name if plan is not None else "fp32"
+        self.backend_artifact = backend_artifact if self.backend.name != "eager" else None
+        timings["backend"] = time.perf_counter() - start
+        logger.info(f"Inference backend: {self.backend.name} ({self.backend.precision})")
+        
+        if plan is not None and plan.modes and calibration_images:
+            self.precision_report = self.measure_drift(calibration_images)
+            logger.info(f"Drift vs fp32 on {len(calibration_images)} calibration images: {self.precision_report}")
+        
+        self.cascade = None
+        self.cascade_path = cascade_path
+        if cascade_path is not None:
+            self.cascade = self._load_cascade(
+                cascade_path, cascade_margin, cascade_exit_classes, cascade_shadow_rate
+            )
+    
+    def _precision_plan(self, backend, precision, calibration_images):
+        """PrecisionPlan for the eager backend, or None (fp32 / other backends)"""
+        try:
+            if not parse_modes(precision):
+                return None
+        except ValueError as e:
+            logger.error(f"{e}; using fp32")
+            return None
+        if backend != "eager":
+            logger.warning(f"Precision {precision!r} only applies to the eager backend; ignored for {backend!r}")
+            return None
+        try:
+            calibration = None
+            if calibration_images:
+                calibration = [
+                    self.prepare_batch(calibration_images[i:i + 8])
+                    for i in range(0, len(calibration_images), 8)
+                ]
+            return build_precision_plan(self.model, precision, calibration)
+        except Exception as e:
+            logger.error(f"Failed to apply precision {precision!r} ({e}); using fp32")
+            return None
+    
+    def _load_cascade(self, path, margin, exit_classes, shadow_rate):
+        """Screening stage for the cascade (None, with an error logged, if it cannot be used)"""
+        from cascade import Cascade, load_screening_model
+
+        try:
+            screening, meta = load_screening_model(path, self.device)
+            cascade = Cascade(screening, self.class_names, margin=margin, exit_classes=exit_classes,
+                              shadow_rate=shadow_rate)
+        except Exception as e:
+            logger.error(f"Cannot load cascade screening model {path} ({e}); cascade disabled")
+            return None
+        teacher = meta.get("teacher_fingerprint")
+        if teacher is not None and teacher != self.fingerprint:
+            logger.warning(
+                f"Screening model was distilled from model {teacher}, not the loaded {self.fingerprint}; "
+                "check /stats/cascade agreement before relying on early exits"
+            )
+        logger.info(
+            f"Cascade enabled: {meta['arch']} @ {meta['input_size']}px screening, exit classes "
+            f"{list(exit_classes)} at margin >= {margin}, shadow rate {shadow_rate}"
+        )
+        return cascade
+
+    def measure_drift(self, images):
+        """
+        Compare the backend's logits with the fp32 eager model's on `images`.
+
+        Returns:
+            dict from precision.compare_logits
+        """
+        reference, candidate = [], []
+        for i in range(0, len(images), 8):
+            batch = self.prepare_batch(images[i:i + 8])
+            with torch.no_grad():
+                reference.append(self.model(*batch))
+            candidate.append(self.backend(*batch))
+        self.backend.reset_stats()
+        return compare_logits(torch.cat(reference), torch.cat(candidate))
+    
+    def warmup(self, batch_size=1, iterations=1, explain=False):
+        """
+        Run dummy batches through the model so the first real request does
+        not pay for lazy initialization (allocator, kernel selection, pages
+        of memory-mapped weights).
+
+        Args:
+            batch_size: images per warmup batch (0 = skip)
+            iterations: number of warmup batches
+            explain: also run the Grad-CAM path once
+
+        Returns:
+            float seconds spent warming up
+        """
+        if batch_size <= 0 or iterations <= 0:
+            return 0.0
+        start = time.perf_counter()
+        blank = Image.new("RGB", (self.img_size, self.img_size), (255, 255, 255))
+        for _ in range(iterations):
+            self.predict_images([blank] * batch_size)
+        if explain:
+            self.explain_images([blank])
+        self.backend.reset_stats()
+        if self.cascade is not None:
+            self.cascade.reset_stats()
+        elapsed = time.perf_counter() - start
+        self.load_timings["warmup"] = elapsed
+        logger.info(f"Warmup done: {iterations} x batch {batch_size} in {elapsed:.3f}s")
+        return elapsed
+    
+    def _observe(self, stage, seconds):
+        if self.on_stage is not None:
+            self.on_stage(stage, seconds)
+    
+    @property
+    def fingerprint(self):
+        """Digest of the loaded weights (computed on first use)"""
+        if self._fingerprint is None:
+            self._fingerprint = state_dict_fingerprint(self.model.state_dict())
+            logger.info(f"Model fingerprint: {self._fingerprint[:16]}")
+        return self._fingerprint
+    
+    def refresh_fingerprint(self):
+        """
+        Recompute the fingerprint after the weights changed in place. A frozen
+        model keeps the fingerprint taken before freezing: its folded weights
+        hash differently from the checkpoint they come from.
+        """
+        if not self.frozen:
+            self._fingerprint = None
+        return self.fingerprint
+    
+    def serving_config(self):
+        """
+        Settings besides the weights that change predictions or heatmaps
+        (execution backend, precision, cascade, preprocessing, freezing),
+        as a JSON-serializable dict.
+        """
+        cascade = None
+        if self.cascade is not None:
+            cascade = {
+                "path": str(self.cascade_path),
+                "margin": self.cascade.margin,
+                "exit_classes": list(self.cascade.exit_classes),
+            }
+        return {
+            "backend": self.backend.name,
+            "precision": self.backend.precision,
+            "backend_artifact": str(self.backend_artifact) if self.backend_artifact else None,
+            "cascade": cascade,
+            "img_size": self.img_size,
+            "shared_resize": self.preprocessor.shared_resize,
+            "frozen": self.frozen,
+        }
     
     def extract_edges(self, pil_img):
         """Extract edge map using Canny edge detection"""
@@ -191,6 +544,210 @@ class ModelLoader:
         edge = cv2.Canny(gray, lower, upper).astype("float32") / 255.0
         return torch.from_numpy(edge).unsqueeze(0).float()
     
+    def prepare_batch(self, images, reuse=False):
+        """
+        Preprocess a list of PIL images into stacked model inputs.
+
+        Args:
+            images: list of PIL Images
+            reuse: write into this thread's preallocated tensors for the batch
+                size instead of allocating new ones (see batch_buffers). The
+                result is overwritten by the thread's next reuse=True call
+                with the same batch size, so only callers that are done with
+                the batch before preparing another one should set it.
+
+        Returns:
+            tuple (img_batch (B, 3, H, W), edge_batch (B, 1, H, W), ocr_batch (B, T))
+            on the model device
+        """
+        start = time.perf_counter()
+        if reuse:
+            host, device, ocr_batch = self.batch_buffers(len(images))
+            img_batch, edge_batch = self.preprocessor(images, out=host)
+            if device is not host:
+                img_batch = device[0].copy_(img_batch, non_blocking=True)
+                edge_batch = device[1].copy_(edge_batch, non_blocking=True)
+            self._observe("preprocess", time.perf_counter() - start)
+            return img_batch, edge_batch, ocr_batch
+
+        img_batch, edge_batch = self.preprocessor(images)
+        ocr_batch = torch.zeros((len(images), self.max_ocr_tokens), dtype=torch.long)
+        self._observe("preprocess", time.perf_counter() - start)
+        return (
+            img_batch.to(self.device),
+            edge_batch.to(self.device),
+            ocr_batch.to(self.device),
+        )
+
+    def batch_buffers(self, batch_size):
+        """
+        This thread's reusable input tensors for one batch size, allocated on
+        first use. On CPU the preprocessor writes straight into the model
+        inputs; on CUDA it writes into pinned host tensors that are copied
+        asynchronously into device tensors.
+
+        Returns:
+            tuple ((img, edge) preprocessor output, (img, edge) on the model
+            device, all-zero ocr_batch on the model device)
+        """
+        buffers = getattr(self._batch_buffers, "by_size", None)
+        if buffers is None:
+            buffers = self._batch_buffers.by_size = {}
+        if batch_size not in buffers:
+            host = self.preprocessor.allocate(batch_size)
+            if self.device.type == "cuda":
+                host = tuple(t.pin_memory() for t in host)
+                device = tuple(torch.empty_like(t, device=self.device) for t in host)
+            else:
+                device = host
+            ocr_batch = torch.zeros((batch_size, self.max_ocr_tokens), dtype=torch.long, device=self.device)
+            buffers[batch_size] = (host, device, ocr_batch)
+            logger.info(f"Allocated reusable input tensors for batch size {batch_size} on {self.device}")
+        return buffers[batch_size]
+
+    def predict_images(self, images):
+        """
+        Predict forgery classes for several images in one forward pass.
+
+        Args:
+            images: list of PIL Images
+
+        Returns:
+            list of dicts (one per image) with keys: class_id, class_name, scores, confidence
+        """
+        batch = self.prepare_batch(images, reuse=True)
+        logger.info(f"Running batched inference, batch size: {len(images)}")
+
+        if self.cascade is not None:
+            return self._predict_cascade(batch)
+
+        start = time.perf_counter()
+        logits = self.backend(*batch)
+        self._observe("forward", time.perf_counter() - start)
+        return self.logits_to_predictions(logits)
+
+    def _predict_cascade(self, batch):
+        """predict_images through the cascade: rows failing the screening gate run the full model"""
+        start = time.perf_counter()
+        screening_logits, exits, needs_full = self.cascade.screen(batch)
+        self._observe("screening", time.perf_counter() - start)
+        predictions = self.logits_to_predictions(screening_logits)
+        for prediction in predictions:
+            prediction["cascade_stage"] = 1
+
+        full_class_ids = [None] * len(exits)
+        rows = [row for row, needed in enumerate(needs_full) if needed]
+        if rows:
+            start = time.perf_counter()
+            index = torch.tensor(rows, device=batch[0].device)
+            logits = self.backend(*(t.index_select(0, index) for t in batch))
+            self._observe("forward", time.perf_counter() - start)
+            for row, prediction in zip(rows, self.logits_to_predictions(logits)):
+                full_class_ids[row] = prediction["class_id"]
+                if not exits[row]:
+                    predictions[row] = {**prediction, "cascade_stage": 2}
+        self.cascade.record(screening_logits, full_class_ids)
+        return predictions
+
+    def logits_to_predictions(self, logits):
+        """Convert a (B, num_classes) logits tensor into prediction dicts"""
+        probs = torch.softmax(logits.detach().float(), dim=1).cpu()
+        class_ids = torch.argmax(probs, dim=1).tolist()
+        return [
+            {
+                "class_id": class_id,
+                "class_name": self.class_names[class_id],
+                "confidence": probs[row, class_id].item(),
+                "scores": probs[row].numpy().tolist()
+            }
+            for row, class_id in enumerate(class_ids)
+        ]
+
+    def explain_images(self, images, class_idx=None):
+        """
+        Batched single-pass prediction + Grad-CAM.
+
+        Args:
+            images: list of PIL Images
+            class_idx: class to explain (None = predicted class of each image)
+
+        Returns:
+            tuple (list of prediction dicts, heatmaps (B, H, W) numpy array in [0, 1])
+        """
+        timings = {}
+        logits, _, heatmaps = self.explainer.explain(
+            self.prepare_batch(images, reuse=True), class_idx=class_idx, timings=timings
+        )
+        for stage, seconds in timings.items():
+            self._observe(stage, seconds)
+        return self.logits_to_predictions(logits), heatmaps
+
+    def predict_and_explain(self, pil_img, class_idx=None):
+        """
+        Predict and compute the Grad-CAM heatmap in a single pass.
+
+        Preprocesses once, does one forward with activations captured at
+        the last backbone stage and one backward for the heatmap.
+
+        Args:
+            pil_img: PIL Image
+            class_idx: class to explain (None = predicted class)
+
+        Returns:
+            tuple (prediction dict, heatmap (H, W) numpy array in [0, 1])
+        """
+        predictions, heatmaps = self.explain_images([pil_img], class_idx=class_idx)
+        return predictions[0], heatmaps[0]
+
+    def cascade_explain(self, pil_img):
+        """
+        predict_and_explain behind the cascade gate: a document that exits at
+        the screening stage gets its screening prediction and no heatmap.
+
+        Returns:
+            tuple (prediction dict with cascade_stage, heatmap (H, W) numpy array or None)
+        """
+        batch = self.prepare_batch([pil_img], reuse=True)
+        start = time.perf_counter()
+        screening_logits, exits, needs_full = self.cascade.screen(batch)
+        self._observe("screening", time.perf_counter() - start)
+
+        if not needs_full[0]:
+            self.cascade.record(screening_logits, [None])
+            return {**self.logits_to_predictions(screening_logits)[0], "cascade_stage": 1}, None
+
+        timings = {}
+        logits, _, heatmaps = self.explainer.explain(batch, timings=timings)
+        for stage, seconds in timings.items():
+            self._observe(stage, seconds)
+        prediction = self.logits_to_predictions(logits)[0]
+        self.cascade.record(screening_logits, [prediction["class_id"]])
+        if exits[0]:
+            # Shadowed exit: the full pass only measured agreement
+            return {**self.logits_to_predictions(screening_logits)[0], "cascade_stage": 1}, None
+        return {**prediction, "cascade_stage": 2}, heatmaps[0]
+
+    def explain_classes(self, pil_img, class_ids=None, top_k=None):
+        """
+        Grad-CAM heatmaps for several classes of one image, from one forward
+        and one batched backward (see gradcam.Explainer.explain_classes).
+
+        Args:
+            pil_img: PIL Image
+            class_ids: classes to explain (None = all classes)
+            top_k: explain the k highest-scoring classes instead
+
+        Returns:
+            tuple (prediction dict, explained class ids, heatmaps (K, H, W) numpy array in [0, 1])
+        """
+        timings = {}
+        logits, targets, heatmaps = self.explainer.explain_classes(
+            self.prepare_batch([pil_img], reuse=True), class_ids=class_ids, top_k=top_k, timings=timings
+        )
+        for stage, seconds in timings.items():
+            self._observe(stage, seconds)
+        return self.logits_to_predictions(logits)[0], targets[0], heatmaps[0]
+
     def predict(self, image_path_or_pil):
         """
         Predict forgery class for an image.
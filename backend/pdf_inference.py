@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+
+from pdf_to_images import DEFAULT_MAX_SIDE, count_pdf_pages, iter_pdf_pages
+
+logger = logging.getLogger(__name__)
+
+
+class PageRangeError(ValueError):
+    """first_page / last_page do not select any page of the document"""
+
+
+def _next_page(pages):
+    return next(pages, None)
+
+
+async def run_pdf_prediction(model_loader, pdf_path, first_page=None, last_page=None,
+                             max_side=DEFAULT_MAX_SIDE, stop_threshold=None, executor=None, on_page=None):
+    """
+    Classify the pages of a PDF with rasterization and inference pipelined.
+
+    Page N+1 is rasterized in the executor while page N runs through the
+    model. With `stop_threshold` set, analysis stops at the first page
+    flagged as forged with at least that confidence.
+
+    Args:
+        model_loader: ModelLoader instance
+        pdf_path: path to the PDF file
+        first_page: 1-based first page (None = 1; 0 is not a page)
+        last_page: 1-based last page, inclusive (None = last page; 0 is not a page)
+        max_side: longest side of the rendered pages in pixels
+        stop_threshold: confidence in [0, 1] for early stopping (None = analyze all pages)
+        executor: concurrent.futures executor (None = loop default)
+        on_page: optional callback(pages_done, pages_expected) after each
+            page; an exception it raises aborts the analysis
+
+    Returns:
+        dict with keys: pages (per-page verdicts) and document (aggregate)
+
+    Raises:
+        PageRangeError: first_page below 1 or past the end, or last_page before first_page
+    """
+    loop = asyncio.get_running_loop()
+    start_time = time.time()
+    positive_id = model_loader.class_names.index("positive")
+
+    total_pages = await loop.run_in_executor(executor, count_pdf_pages, pdf_path)
+    first = 1 if first_page is None else first_page
+    last = total_pages if last_page is None else min(last_page, total_pages)
+    if not 1 <= first <= total_pages:
+        raise PageRangeError(f"first_page {first} is outside the document (pages 1-{total_pages})")
+    if last < first:
+        raise PageRangeError(f"last_page {last_page} is before first_page {first}")
+    expected = last - first + 1
+    pages = iter_pdf_pages(pdf_path, first_page=first, last_page=last, max_side=max_side, total_pages=total_pages)
+
+    def infer(img):
+        return model_loader.predict_images([img])[0]
+
+    results = []
+    stopped_early = False
+    pending = loop.run_in_executor(executor, _next_page, pages)
+
+    try:
+        while True:
+            page = await pending
+            if page is None:
+                break
+            page_number, img = page
+
+            # Start rasterizing the next page before running this one
+            pending = loop.run_in_executor(executor, _next_page, pages)
+
+            page_start = time.time()
+            prediction = await loop.run_in_executor(executor, infer, img)
+            flagged = prediction["class_id"] != positive_id
+            results.append({
+                "page": page_number,
+                "size": list(img.size),
+                "prediction": prediction,
+                "forgery_score": 1.0 - prediction["scores"][positive_id],
+                "flagged": flagged,
+                "time_s": round(time.time() - page_start, 3),
+            })
+            logger.info(
+                f"[PDF] Page {page_number}: {prediction['class_name']} "
+                f"({prediction['confidence']:.4f})"
+            )
+
+            if on_page is not None:
+                on_page(len(results), expected)
+
+            if stop_threshold is not None and flagged and prediction["confidence"] >= stop_threshold:
+                logger.info(f"[PDF] Stopping early at page {page_number}")
+                stopped_early = True
+                break
+    finally:
+        # Let the in-flight rasterization finish before the generator is dropped
+        # (early stop, or an error in inference or on_page)
+        if not pending.done():
+            await asyncio.wait({pending})
+
+    flagged_pages = [r["page"] for r in results if r["flagged"]]
+    most_suspicious = max(results, key=lambda r: r["forgery_score"]) if results else None
+
+    document = {
+        "pages_total": total_pages,
+        "pages_analyzed": len(results),
+        "flagged_pages": flagged_pages,
+        "verdict": "forged" if flagged_pages else "genuine",
+        "max_forgery_score": most_suspicious["forgery_score"] if most_suspicious else 0.0,
+        "most_suspicious_page": most_suspicious["page"] if most_suspicious else None,
+        "most_suspicious_class": most_suspicious["prediction"]["class_name"] if most_suspicious else None,
+        "stopped_early": stopped_early,
+        "total_time_s": round(time.time() - start_time, 3),
+    }
+    return {"pages": results, "document": document}
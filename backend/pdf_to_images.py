@@ -1,9 +1,13 @@
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from pathlib import Path
 
 UPLOAD_DIR = Path("uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+# Longest page side when rasterizing for inference: well above the
+# model's 256px input, small enough to keep a page cheap to hold
+DEFAULT_MAX_SIDE = 1024
+
 def convert_pdf_to_images(pdf_path):
     pages = convert_from_path(str(pdf_path))
     image_paths = []
@@ -16,3 +20,39 @@ def convert_pdf_to_images(pdf_path):
         image_paths.append(str(img_path))
 
     return image_paths
+
+def count_pdf_pages(pdf_path):
+    """Number of pages in a PDF (reads metadata only)"""
+    return int(pdfinfo_from_path(str(pdf_path))["Pages"])
+
+def iter_pdf_pages(pdf_path, first_page=None, last_page=None, max_side=DEFAULT_MAX_SIDE, total_pages=None):
+    """
+    Lazily rasterize PDF pages one at a time, in memory.
+
+    Each page is rendered on demand with its longest side scaled to
+    `max_side` pixels, so only one page bitmap is resident at a time and
+    nothing is written to disk.
+
+    Args:
+        pdf_path: path to the PDF file
+        first_page: 1-based first page (None = 1)
+        last_page: 1-based last page, inclusive (None = last page of the document)
+        max_side: longest side of the rendered page in pixels
+        total_pages: page count when the caller already has it (None = read it with pdfinfo)
+
+    Yields:
+        (page_number, PIL Image in RGB)
+    """
+    total = count_pdf_pages(pdf_path) if total_pages is None else total_pages
+    first = max(1, first_page or 1)
+    last = min(total, last_page or total)
+
+    for page_number in range(first, last + 1):
+        pages = convert_from_path(
+            str(pdf_path),
+            first_page=page_number,
+            last_page=page_number,
+            size=max_side
+        )
+        if pages:
+            yield page_number, pages[0].convert("RGB")
@@ -0,0 +1,183 @@
+import copy
+import logging
+import time
+from pathlib import Path
+
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+PRECISION_MODES = ("fp32", "channels_last", "bf16", "dynamic_int8", "static_int8")
+
+# Submodules of ForgeryNet holding the Linear layers (dynamic int8)
+LINEAR_MODULES = ("cbam", "ocr_head", "classifier")
+
+
+def parse_modes(modes):
+    """
+    Normalize a precision setting ("fp32", "channels_last,bf16", ...) into
+    a set of modes. Raises ValueError on unknown or conflicting modes.
+    """
+    if isinstance(modes, str):
+        modes = [m.strip() for m in modes.split(",")]
+    modes = {m for m in modes if m and m != "fp32"}
+    unknown = modes - set(PRECISION_MODES)
+    if unknown:
+        raise ValueError(f"Unknown precision mode(s) {sorted(unknown)}; expected {PRECISION_MODES}")
+    if "bf16" in modes and modes & {"dynamic_int8", "static_int8"}:
+        raise ValueError("bf16 cannot be combined with int8 quantization")
+    return modes
+
+
+def bf16_supported():
+    """True if oneDNN has native bf16 kernels on this CPU"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def load_calibration_images(directory, limit=64, max_side=1024):
+    """Decode up to `limit` images from a folder of sample documents (sorted by name)"""
+    from bulk import IMAGE_EXTENSIONS
+    from image_io import decode_image
+
+    paths = sorted(
+        p for p in Path(directory).rglob("*")
+        if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS
+    )[:limit]
+    if not paths:
+        raise ValueError(f"No calibration images found in {directory}")
+    return [decode_image(p.read_bytes(), max_side) for p in paths]
+
+
+def _shallow_copy(model):
+    """Copy of a module sharing all submodules, whose children can be swapped independently"""
+    clone = copy.copy(model)
+    clone._modules = dict(model._modules)
+    return clone
+
+
+def quantize_linear_dynamic(model):
+    """
+    Dynamic int8 for the Linear layers (CBAM MLP, OCR head, classifier).
+    The backbone and edge branch are shared with `model`, not copied.
+    """
+    from torch.ao.quantization import quantize_dynamic
+
+    quantized = _shallow_copy(model)
+    for name in LINEAR_MODULES:
+        setattr(quantized, name, quantize_dynamic(getattr(model, name), {nn.Linear}, dtype=torch.qint8))
+    return quantized
+
+
+def quantize_backbone_static(model, calibration_batches):
+    """
+    Static int8 (FX graph mode, x86 backend) for the EfficientNet backbone,
+    with activation ranges observed on `calibration_batches`.
+
+    Args:
+        model: fp32 eval-mode ForgeryNet
+        calibration_batches: list of preprocessed (img, edge, ocr) batches
+
+    Returns:
+        copy of `model` whose `back` is the quantized backbone (the rest is shared)
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    if not calibration_batches:
+        raise ValueError("static_int8 needs calibration images")
+
+    torch.backends.quantized.engine = "x86"
+    example = (calibration_batches[0][0][:1],)
+    prepared = prepare_fx(copy.deepcopy(model.back).eval(), get_default_qconfig_mapping("x86"), example)
+    with torch.no_grad():
+        for img, _, _ in calibration_batches:
+            prepared(img)
+
+    quantized = _shallow_copy(model)
+    quantized.back = convert_fx(prepared)
+    return quantized
+
+
+class PrecisionPlan:
+    """
+    How to run predictions for a set of precision modes.
+
+    `module` is the model to call (the fp32 model itself, or a copy with
+    quantized parts); `autocast_dtype` and `channels_last` describe how to
+    call it. The fp32 model is never modified except for the in-place
+    channels_last layout change, so Grad-CAM keeps running on it.
+    """
+
+    def __init__(self, module, modes, autocast_dtype=None, channels_last=False):
+        self.module = module
+        self.modes = modes
+        self.autocast_dtype = autocast_dtype
+        self.channels_last = channels_last
+
+    @property
+    def name(self):
+        return ",".join(sorted(self.modes)) or "fp32"
+
+
+def build_precision_plan(model, modes, calibration_batches=None):
+    """
+    Prepare `model` (fp32, eval mode) for the requested precision modes.
+
+    Args:
+        model: ForgeryNet with weights loaded
+        modes: setting accepted by parse_modes
+        calibration_batches: preprocessed batches for static_int8
+
+    Returns:
+        PrecisionPlan
+    """
+    modes = parse_modes(modes)
+    module = model
+    autocast_dtype = None
+
+    if "channels_last" in modes:
+        model.to(memory_format=torch.channels_last)
+
+    if "bf16" in modes:
+        if bf16_supported():
+            autocast_dtype = torch.bfloat16
+        else:
+            logger.warning("bf16 requested but this CPU has no native bf16 support; staying in fp32")
+            modes.discard("bf16")
+
+    if "static_int8" in modes:
+        start = time.perf_counter()
+        module = quantize_backbone_static(module, calibration_batches)
+        logger.info(
+            f"Backbone quantized to static int8 with {len(calibration_batches)} calibration batches "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    if "dynamic_int8" in modes:
+        module = quantize_linear_dynamic(module)
+        logger.info(f"Linear layers quantized to dynamic int8: {LINEAR_MODULES}")
+
+    return PrecisionPlan(module, modes, autocast_dtype=autocast_dtype, channels_last="channels_last" in modes)
+
+
+def compare_logits(reference, candidate):
+    """
+    Drift of `candidate` logits against fp32 `reference` logits.
+
+    Returns:
+        dict with top1_agreement, max_abs_logit_diff, max_abs_prob_diff, n
+    """
+    reference = reference.float()
+    candidate = candidate.float()
+    ref_probs = torch.softmax(reference, dim=1)
+    cand_probs = torch.softmax(candidate, dim=1)
+    return {
+        "n": reference.shape[0],
+        "top1_agreement": (ref_probs.argmax(1) == cand_probs.argmax(1)).float().mean().item(),
+        "max_abs_logit_diff": (reference - candidate).abs().max().item(),
+        "max_abs_prob_diff": (ref_probs - cand_probs).abs().max().item(),
+    }
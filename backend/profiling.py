@@ -0,0 +1,188 @@
+import asyncio
+import cProfile
+import io
+import json
+import logging
+import pstats
+import resource
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from admission import EXECUTOR_OVERRIDE
+
+logger = logging.getLogger(__name__)
+
+# Rows kept in the text summaries
+TOP_ROWS = 40
+# Frames recorded per tracemalloc allocation
+TRACEMALLOC_FRAMES = 16
+
+
+def _rss_mb():
+    """(current RSS, peak RSS) of this process in MB"""
+    current = peak = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return current, peak
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class RequestProfiler:
+    """
+    Profile the blocking work of one request.
+
+    Used as `async with RequestProfiler(...)`: inside the block, every
+    AdmissionController.call of the current request runs on a dedicated
+    thread on which torch.profiler (CPU ops, shapes, tensor memory) and
+    cProfile are active, while tracemalloc traces Python allocations (it
+    is process-wide). On exit the results are written to
+    `<trace_dir>/<trace_id>/`:
+
+      torch_trace.json  Chrome trace (chrome://tracing, Perfetto)
+      torch_ops.txt     op table by self CPU time
+      python.pstats     cProfile stats (snakeviz, pstats)
+      python_top.txt    functions by cumulative time
+      memory.json       tracemalloc peak and top allocation sites, RSS
+      summary.json      request metadata, wall time and the above paths
+
+    Work that does not go through AdmissionController.call (the event
+    loop itself, the micro-batcher) is not profiled, and tracemalloc and
+    the RSS peak also see concurrent requests: profile on a quiet server.
+    """
+
+    def __init__(self, trace_dir, metadata=None, trace_id=None):
+        """
+        Args:
+            trace_dir: directory receiving one sub-directory per trace
+            metadata: JSON-serializable request details stored in summary.json
+            trace_id: name of the trace (default: random hex)
+        """
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.path = Path(trace_dir) / self.trace_id
+        self.metadata = metadata or {}
+        self.summary = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"profile-{self.trace_id[:8]}")
+        self._token = None
+        self._torch_profiler = None
+        self._python_profiler = None
+        self._started_tracemalloc = False
+        self._start = None
+        self._rss_start = None
+        self._peak_rss_reset = False
+
+    def _begin(self):
+        """Runs on the profiling thread: start all profilers"""
+        from torch.profiler import ProfilerActivity, profile
+
+        self._peak_rss_reset = _reset_peak_rss()
+        self._rss_start = _rss_mb()[0]
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        tracemalloc.reset_peak()
+        # torch.profiler only records ops of the thread that started it
+        self._torch_profiler = profile(
+            activities=[ProfilerActivity.CPU], record_shapes=True, profile_memory=True, with_stack=False
+        )
+        self._torch_profiler.start()
+        self._python_profiler = cProfile.Profile()
+        self._python_profiler.enable()
+        self._start = time.perf_counter()
+
+    def _finish(self):
+        """Runs on the profiling thread: stop the profilers and write the trace files"""
+        wall_s = time.perf_counter() - self._start
+        self._python_profiler.disable()
+        self._torch_profiler.stop()
+        traced_current, traced_peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        rss_end, rss_peak = _rss_mb()
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        files = {}
+
+        self._torch_profiler.export_chrome_trace(str(self.path / "torch_trace.json"))
+        files["chrome_trace"] = "torch_trace.json"
+        ops = self._torch_profiler.key_averages()
+        (self.path / "torch_ops.txt").write_text(ops.table(sort_by="self_cpu_time_total", row_limit=TOP_ROWS))
+        files["torch_ops"] = "torch_ops.txt"
+
+        self._python_profiler.dump_stats(str(self.path / "python.pstats"))
+        files["pstats"] = "python.pstats"
+        text = io.StringIO()
+        pstats.Stats(self._python_profiler, stream=text).sort_stats("cumulative").print_stats(TOP_ROWS)
+        (self.path / "python_top.txt").write_text(text.getvalue())
+        files["python_top"] = "python_top.txt"
+
+        top = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ]).statistics("lineno")[:TOP_ROWS]
+        memory = {
+            "python_peak_mb": traced_peak / 2**20,
+            "python_current_mb": traced_current / 2**20,
+            "rss_start_mb": self._rss_start,
+            "rss_end_mb": rss_end,
+            # Process-wide high-water mark, since the request started if the kernel allows a reset
+            "rss_peak_mb": rss_peak,
+            "rss_peak_scope": "request" if self._peak_rss_reset else "process",
+            "top_allocations": [
+                {"site": str(stat.traceback[0]), "size_kb": stat.size / 1024, "count": stat.count}
+                for stat in top
+            ],
+        }
+        (self.path / "memory.json").write_text(json.dumps(memory, indent=2))
+        files["memory"] = "memory.json"
+
+        self.summary = {
+            "trace_id": self.trace_id,
+            "path": str(self.path),
+            "wall_s": wall_s,
+            "python_peak_mb": memory["python_peak_mb"],
+            "rss_peak_mb": rss_peak,
+            "files": files,
+        }
+        (self.path / "summary.json").write_text(json.dumps({**self.summary, "request": self.metadata}, indent=2))
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._begin)
+        self._token = EXECUTOR_OVERRIDE.set(self._executor)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        EXECUTOR_OVERRIDE.reset(self._token)
+        loop = asyncio.get_running_loop()
+        try:
+            if exc_type is not None:
+                self.metadata["error"] = f"{exc_type.__name__}: {exc}"
+            await loop.run_in_executor(self._executor, self._finish)
+            logger.info(
+                f"Profile {self.trace_id} written to {self.path} "
+                f"({self.summary['wall_s']:.3f}s, Python peak {self.summary['python_peak_mb']:.1f} MB)"
+            )
+        except Exception as e:
+            logger.error(f"Writing profile {self.trace_id} failed: {e}", exc_info=True)
+        finally:
+            self._executor.shutdown(wait=False)
+        return False
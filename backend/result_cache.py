@@ -0,0 +1,291 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+def namespace_digest(fingerprint, config=None):
+    """
+    Digest of the model weights plus the serving settings that change its
+    results (backend, precision, cascade, preprocessing, decode size)
+    """
+    digest = hashlib.sha256()
+    digest.update(fingerprint.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(config or {}, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def content_key(content, fingerprint):
+    """Cache key for uploaded bytes scored by the model with `fingerprint` (or a namespace_digest)"""
+    digest = hashlib.sha256()
+    digest.update(fingerprint.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(content)
+    return digest.hexdigest()
+
+
+class _LRU:
+    """Size-bounded LRU map (caller holds the lock)"""
+
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.bytes = 0
+
+    def get(self, key):
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key][0]
+
+    def put(self, key, value, size):
+        """Insert and return the number of evicted entries"""
+        if key in self.items:
+            self.bytes -= self.items.pop(key)[1]
+        self.items[key] = (value, size)
+        self.bytes += size
+
+        evicted = 0
+        while self.items and (
+            len(self.items) > self.max_entries
+            or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            _, (_, old_size) = self.items.popitem(last=False)
+            self.bytes -= old_size
+            evicted += 1
+        return evicted
+
+    def clear(self):
+        self.items.clear()
+        self.bytes = 0
+
+
+class ResultCache:
+    """
+    Content-addressed cache of predictions and encoded heatmaps.
+
+    Keys are derived from the uploaded bytes, the model fingerprint and
+    the serving config, so results of different weights or settings (a
+    cascade, int8 precision, another decode size) never mix, including on
+    disk across restarts. Predictions and heatmaps
+    are stored separately: a prediction-only hit does not pay for loading
+    a heatmap. A bounded in-memory LRU tier is backed by an optional
+    on-disk tier that survives restarts. The disk tier is kept under
+    max_disk_bytes by deleting the least recently used files (oldest
+    mtime; hits refresh it), files of earlier models or settings first.
+    Each process tracks its own writes, so workers sharing a directory
+    can together exceed the budget until they next write.
+    """
+
+    def __init__(self, fingerprint, max_entries=1024, max_heatmap_bytes=256 * 1024 * 1024, disk_dir=None,
+                 config=None, max_disk_bytes=1024 * 1024 * 1024):
+        """
+        Args:
+            fingerprint: digest of the currently loaded model weights
+            max_entries: max cached predictions (and heatmaps) in memory
+            max_heatmap_bytes: memory budget for encoded heatmaps
+            disk_dir: directory for the persistent tier (None = memory only)
+            config: JSON-serializable serving settings that change results
+            max_disk_bytes: size budget for the files under disk_dir
+        """
+        self.fingerprint = fingerprint
+        self.config = dict(config or {})
+        self.namespace = namespace_digest(fingerprint, self.config)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._lock = threading.Lock()
+        self._predictions = _LRU(max_entries)
+        self._heatmaps = _LRU(max_entries, max_heatmap_bytes)
+        self._counters = Counter()
+        self.max_disk_bytes = max_disk_bytes
+        self._disk_files = OrderedDict()  # path -> size, least recently used first
+        self._disk_bytes = 0
+
+        if self.disk_dir is not None:
+            self._model_dir().mkdir(parents=True, exist_ok=True)
+            self._scan_disk()
+            logger.info(
+                f"[ResultCache] Disk tier at {self._model_dir()} "
+                f"({len(self._disk_files)} files, {self._disk_bytes / 2**20:.1f} MB)"
+            )
+            self._evict_disk()
+
+    def key(self, content):
+        """Cache key for uploaded bytes under the current model"""
+        return content_key(content, self.namespace)
+
+    # ---------------------------------------------------------------
+    # Disk tier
+    # ---------------------------------------------------------------
+
+    def _model_dir(self):
+        return self.disk_dir / self.namespace[:16]
+
+    def _disk_path(self, key, kind):
+        return self._model_dir() / key[:2] / f"{key}.{kind}"
+
+    def _scan_disk(self):
+        """Index the files already under disk_dir (all namespaces), oldest first"""
+        files = []
+        for path in self.disk_dir.rglob("*"):
+            try:
+                if path.is_file() and not path.name.endswith(".tmp"):
+                    stat = path.stat()
+                    files.append((stat.st_mtime, str(path), stat.st_size))
+            except OSError:
+                continue
+        for _, path, size in sorted(files):
+            self._disk_files[path] = size
+            self._disk_bytes += size
+
+    def _disk_read(self, key, kind):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key, kind)
+        try:
+            text = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"[ResultCache] Disk read failed for {path}: {e}")
+            return None
+        with self._lock:
+            if str(path) in self._disk_files:
+                self._disk_files.move_to_end(str(path))
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return text
+
+    def _disk_write(self, key, kind, text):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key, kind)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_path.write_text(text, encoding="utf-8")
+            size = tmp_path.stat().st_size
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"[ResultCache] Disk write failed for {path}: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += size - self._disk_files.pop(str(path), 0)
+            self._disk_files[str(path)] = size
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used files until the disk tier fits max_disk_bytes"""
+        if self.max_disk_bytes is None:
+            return
+        evicted = []
+        with self._lock:
+            while self._disk_files and self._disk_bytes > self.max_disk_bytes:
+                path, size = self._disk_files.popitem(last=False)
+                self._disk_bytes -= size
+                kind = Path(path).suffix.lstrip(".")
+                self._counters[f"{kind}_evictions"] += 1
+                evicted.append(path)
+        for path in evicted:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    # ---------------------------------------------------------------
+    # Lookups
+    # ---------------------------------------------------------------
+
+    def _get(self, lru, key, kind, decode):
+        with self._lock:
+            value = lru.get(key)
+            if value is not None:
+                self._counters[f"{kind}_memory_hits"] += 1
+                return value
+
+        text = self._disk_read(key, kind)
+        if text is None:
+            with self._lock:
+                self._counters[f"{kind}_misses"] += 1
+            return None
+
+        value = decode(text)
+        with self._lock:
+            self._counters[f"{kind}_disk_hits"] += 1
+            self._counters[f"{kind}_evictions"] += lru.put(key, value, len(text))
+        return value
+
+    def _put(self, lru, key, kind, value, text):
+        with self._lock:
+            self._counters[f"{kind}_evictions"] += lru.put(key, value, len(text))
+        self._disk_write(key, kind, text)
+
+    def get_prediction(self, key):
+        """Cached prediction dict or None"""
+        return self._get(self._predictions, key, "prediction", json.loads)
+
+    def put_prediction(self, key, prediction):
+        self._put(self._predictions, key, "prediction", prediction, json.dumps(prediction))
+
+    def get_heatmap(self, key, variant="png"):
+        """Cached encoded heatmap (str) for an output variant, or None"""
+        return self._get(self._heatmaps, f"{key}-{variant}", "heatmap", str)
+
+    def put_heatmap(self, key, encoded, variant="png"):
+        self._put(self._heatmaps, f"{key}-{variant}", "heatmap", encoded, encoded)
+
+    # ---------------------------------------------------------------
+    # Maintenance
+    # ---------------------------------------------------------------
+
+    def invalidate(self, fingerprint=None, config=None):
+        """
+        Drop all cached results. With a new `fingerprint` or `config`,
+        subsequent keys are derived from them (use after loading different
+        weights or changing settings).
+        """
+        with self._lock:
+            old_dir = self._model_dir() if self.disk_dir is not None else None
+            self._predictions.clear()
+            self._heatmaps.clear()
+            self._counters["invalidations"] += 1
+            if fingerprint is not None:
+                self.fingerprint = fingerprint
+            if config is not None:
+                self.config = dict(config)
+            self.namespace = namespace_digest(self.fingerprint, self.config)
+
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+            self._model_dir().mkdir(parents=True, exist_ok=True)
+            prefix = str(old_dir) + os.sep
+            with self._lock:
+                for path in [p for p in self._disk_files if p.startswith(prefix)]:
+                    self._disk_bytes -= self._disk_files.pop(path)
+        logger.info(f"[ResultCache] Invalidated (fingerprint: {self.fingerprint[:16]})")
+
+    def stats(self):
+        """Hit/miss/eviction counters and current occupancy"""
+        with self._lock:
+            return {
+                "fingerprint": self.fingerprint[:16],
+                "namespace": self.namespace[:16],
+                "config": self.config,
+                "disk_dir": str(self.disk_dir) if self.disk_dir else None,
+                "predictions_in_memory": len(self._predictions.items),
+                "heatmaps_in_memory": len(self._heatmaps.items),
+                "heatmap_bytes_in_memory": self._heatmaps.bytes,
+                "disk_files": len(self._disk_files),
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes if self.disk_dir else None,
+                **dict(self._counters),
+            }
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Multi-process serving with one shared copy of the model weights.
+
+The parent process imports the API and loads ModelLoader once, moves
+the parameters into shared memory, binds the listening socket and forks
+N uvicorn workers that all reuse the same weights. Each worker gets its
+own slice of the CPU for torch intra-op threads so workers do not
+oversubscribe cores. Dead workers are re-forked.
+
+    python serve_workers.py --workers 4 --port 8000
+
+With --mode independent every worker loads its own model instead
+(equivalent to `uvicorn --workers N`), for comparison.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger("serve_workers")
+
+
+def threads_per_worker(workers, cpus=None):
+    """Split the machine's cores evenly across workers (at least one each)"""
+    cpus = cpus or os.cpu_count() or 1
+    return max(1, cpus // max(1, workers))
+
+
+def share_model_memory(model_loader):
+    """Move all parameters and buffers into shared memory; returns bytes shared"""
+    model_loader.model.share_memory()
+    return sum(
+        t.numel() * t.element_size()
+        for t in list(model_loader.model.parameters()) + list(model_loader.model.buffers())
+    )
+
+
+def bind_socket(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index, sock, args):
+    """Child process body: configure torch threads and serve on the shared socket"""
+    import torch
+    import uvicorn
+
+    torch.set_num_threads(args.threads)
+    logging.getLogger(__name__).info(
+        f"[worker {index}] pid={os.getpid()} torch threads={torch.get_num_threads()}"
+    )
+
+    # Shared mode: the parent already imported the app (and the model)
+    import main_inference_fixed
+
+    config = uvicorn.Config(
+        main_inference_fixed.app,
+        log_level=args.log_level,
+        access_log=False,
+        timeout_keep_alive=5,
+    )
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def spawn_worker(index, sock, args):
+    pid = os.fork()
+    if pid == 0:
+        # Child: default signal handling, uvicorn installs its own
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(index, sock, args)
+        except Exception:
+            logger.exception(f"[worker {index}] crashed")
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info(f"Started worker {index} (pid {pid})")
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from N forked workers sharing one model")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads", type=int, default=None,
+                        help="torch threads per worker (default: cores / workers)")
+    parser.add_argument("--mode", choices=["shared", "independent"], default="shared")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+    args.threads = args.threads or threads_per_worker(args.workers)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    # Admission threads follow the per-worker core budget unless set explicitly
+    os.environ.setdefault("INFERENCE_THREADS", str(args.threads))
+
+    if args.mode == "shared":
+        import torch
+        # Keep the parent single-threaded: workers size their own pools after fork
+        torch.set_num_threads(1)
+
+        import main_inference_fixed
+        # Loaded before forking so workers share it (their lifespan then skips the background load)
+        if main_inference_fixed.load_model() is None:
+            logger.error("Model failed to load in parent; refusing to start workers")
+            sys.exit(1)
+        shared = share_model_memory(main_inference_fixed.model_loader)
+        logger.info(f"Shared {shared / 2**20:.1f} MB of model weights across {args.workers} workers")
+
+    sock = bind_socket(args.host, args.port)
+    logger.info(f"Listening on {args.host}:{args.port} with {args.workers} workers x {args.threads} threads")
+
+    workers = {}
+    for index in range(args.workers):
+        workers[spawn_worker(index, sock, args)] = index
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = workers.pop(pid, None)
+        if index is None:
+            continue
+        if not stopping:
+            logger.warning(f"Worker {index} (pid {pid}) exited with status {status}; restarting")
+            time.sleep(0.5)
+            workers[spawn_worker(index, sock, args)] = index
+
+    sock.close()
+    logger.info("All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def make_documents(count, seed=0):
+    """Synthetic scans: light pages with dark text-like lines, noise, varied sizes"""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        height = int(rng.integers(300, 700))
+        width = int(rng.integers(250, 600))
+        page = np.full((height, width, 3), 230, dtype=np.uint8)
+        for _ in range(height // 30):
+            y = int(rng.integers(0, height - 6))
+            page[y:y + 4, int(rng.integers(0, width // 3)):int(rng.integers(width // 2, width))] = 40
+        page = np.clip(page.astype(np.int16) + rng.integers(-20, 20, page.shape), 0, 255).astype(np.uint8)
+        images.append(Image.fromarray(page))
+    return images
+
+
+@pytest.fixture(scope="session")
+def documents():
+    return make_documents(4)
+
+
+@pytest.fixture(scope="session")
+def model_loader():
+    """ModelLoader around a randomly initialized ForgeryNet (no checkpoint needed)"""
+    from model_loader import ModelLoader
+
+    torch.manual_seed(0)
+    return ModelLoader(None)
+
+
+@pytest.fixture(scope="session")
+def batch(model_loader, documents):
+    """(img, edge, ocr) model inputs for the synthetic documents"""
+    return model_loader.prepare_batch(documents)
+
+
+@pytest.fixture(scope="session")
+def api(model_loader, tmp_path_factory):
+    """
+    TestClient for main_inference_fixed serving the random model, with small
+    upload limits, no result cache and no job workers (lifespan is not run)
+    """
+    path = tmp_path_factory.mktemp("model") / "random_forgerynet.pth"
+    torch.save(model_loader.model.state_dict(), str(path))
+    env = {
+        "MODEL_PATH": str(path),
+        "UPLOAD_MAX_MB": "1",
+        "RESULT_CACHE_ENTRIES": "0",
+        "WARMUP_BATCH_SIZE": "0",
+        "WARMUP_GRADCAM": "0",
+        "JOB_WORKERS": "0",
+    }
+    with pytest.MonkeyPatch.context() as mp:
+        for name, value in env.items():
+            mp.setenv(name, value)
+        import main_inference_fixed
+        from fastapi.testclient import TestClient
+
+        assert main_inference_fixed.load_model() is not None
+        yield TestClient(main_inference_fixed.app)
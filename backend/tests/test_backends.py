@@ -0,0 +1,80 @@
+"""Exported TorchScript / ONNX backends against eager PyTorch (python -m pytest tests)"""
+
+import pytest
+import torch
+
+from backends import create_backend, export_onnx, save_torchscript, trace_model
+
+ATOL = 1e-4
+
+
+@pytest.fixture(scope="module")
+def inputs(model_loader, batch):
+    """Preprocessed documents with random OCR token ids"""
+    img, edge, ocr = batch
+    generator = torch.Generator().manual_seed(0)
+    vocab = model_loader.model.ocr_emb.num_embeddings
+    return img, edge, torch.randint(0, vocab, ocr.shape, generator=generator, dtype=ocr.dtype)
+
+
+@pytest.fixture(scope="module")
+def reference(model_loader, inputs):
+    return create_backend("eager", model_loader.model)(*inputs)
+
+
+@pytest.fixture(scope="module")
+def torchscript_artifact(model_loader, tmp_path_factory):
+    path = tmp_path_factory.mktemp("artifacts") / "model.ts"
+    save_torchscript(trace_model(model_loader.model), path, fingerprint=model_loader.fingerprint)
+    return path
+
+
+@pytest.fixture(scope="module")
+def onnx_artifact(model_loader, tmp_path_factory):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    path = tmp_path_factory.mktemp("artifacts") / "model.onnx"
+    export_onnx(model_loader.model, path, fingerprint=model_loader.fingerprint)
+    return path
+
+
+def test_traced_matches_eager(model_loader, inputs, reference):
+    backend = create_backend("torchscript", model_loader.model)
+    torch.testing.assert_close(backend(*inputs), reference, atol=ATOL, rtol=0)
+
+
+def test_torchscript_artifact_matches_eager(model_loader, inputs, reference, torchscript_artifact):
+    backend = create_backend("torchscript", model_loader.model, artifact=torchscript_artifact,
+                             fingerprint=model_loader.fingerprint)
+    torch.testing.assert_close(backend(*inputs), reference, atol=ATOL, rtol=0)
+
+
+def test_onnx_artifact_matches_eager(model_loader, inputs, reference, onnx_artifact):
+    backend = create_backend("onnx", model_loader.model, artifact=onnx_artifact,
+                             fingerprint=model_loader.fingerprint)
+    torch.testing.assert_close(backend(*inputs), reference, atol=ATOL, rtol=0)
+
+
+@pytest.mark.parametrize("name", ["torchscript", "onnx"])
+def test_artifact_from_other_weights_is_refused(name, model_loader, request):
+    artifact = request.getfixturevalue(f"{name}_artifact")
+    with pytest.raises(ValueError, match="exported from model"):
+        create_backend(name, model_loader.model, artifact=artifact, fingerprint="0" * 64)
+
+
+def test_artifact_without_fingerprint_is_refused(model_loader, tmp_path):
+    path = tmp_path / "model.ts"
+    save_torchscript(trace_model(model_loader.model), path)
+    with pytest.raises(ValueError, match="no model fingerprint"):
+        create_backend("torchscript", model_loader.model, artifact=path, fingerprint=model_loader.fingerprint)
+
+
+def test_model_loader_falls_back_to_eager_on_mismatch(tmp_path, model_loader):
+    from model_loader import ModelLoader
+
+    path = tmp_path / "model.ts"
+    save_torchscript(trace_model(model_loader.model), path, fingerprint="0" * 64)
+    torch.manual_seed(1)
+    loader = ModelLoader(None, backend="torchscript", backend_artifact=str(path))
+    assert loader.backend.name == "eager"
+    assert loader.backend_artifact is None
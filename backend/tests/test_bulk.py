@@ -0,0 +1,77 @@
+"""Bulk prediction over archives streamed from the request body (python -m pytest tests)"""
+
+import asyncio
+import io
+import json
+import tarfile
+
+from bulk import BodyReader, iter_archive, run_bulk_prediction
+from conftest import make_documents
+
+
+def make_tar(images):
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w") as tf:
+        for i, img in enumerate(images):
+            data = io.BytesIO()
+            img.save(data, format="PNG")
+            info = tarfile.TarInfo(f"page{i}.png")
+            info.size = len(data.getvalue())
+            tf.addfile(info, io.BytesIO(data.getvalue()))
+    return buf.getvalue()
+
+
+async def upload(data, chunk_size, sent):
+    """Request-body stand-in: yields the archive in chunks, counting how many went out"""
+    for start in range(0, len(data), chunk_size):
+        sent.append(start + chunk_size >= len(data))
+        yield data[start:start + chunk_size]
+        await asyncio.sleep(0)
+
+
+def test_body_reader_reads_tar_in_any_chunking():
+    images = [img.resize((64, 80)) for img in make_documents(3, seed=1)]
+    data = make_tar(images)
+
+    async def names(chunk_size):
+        loop = asyncio.get_running_loop()
+        body = BodyReader(upload(data, chunk_size, []), loop)
+        return await loop.run_in_executor(
+            None, lambda: [name for name, _ in iter_archive(body, "application/x-tar")]
+        )
+
+    for chunk_size in (7, 511, 4096, len(data)):
+        assert asyncio.run(names(chunk_size)) == ["page0.png", "page1.png", "page2.png"]
+
+
+def test_results_stream_before_the_upload_ends(model_loader):
+    data = make_tar(make_documents(6, seed=2))
+    sent = []
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        entries = iter_archive(BodyReader(upload(data, 4096, sent), loop), "application/x-tar")
+        lines = []
+        async for line in run_bulk_prediction(model_loader, entries, batch_size=1):
+            lines.append((json.loads(line), any(sent)))
+        return lines
+
+    lines = asyncio.run(run())
+    first, upload_done = lines[0]
+    assert first["filename"] == "page0.png" and "prediction" in first
+    assert not upload_done
+    assert lines[-1][0]["summary"]["files"] == 6
+    assert lines[-1][0]["summary"]["errors"] == 0
+
+
+def test_truncated_archive_reports_an_error_line(model_loader):
+    data = make_tar(make_documents(2, seed=3))
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        entries = iter_archive(BodyReader(upload(data[:len(data) // 2], 4096, []), loop), "application/x-tar")
+        return [json.loads(line) async for line in run_bulk_prediction(model_loader, entries, batch_size=1)]
+
+    lines = asyncio.run(run())
+    assert any("Could not read the upload" in line.get("error", "") for line in lines)
+    assert lines[-1]["summary"]["errors"] >= 1
@@ -0,0 +1,80 @@
+"""Frozen inference model against the original ForgeryNet (python -m pytest tests)"""
+
+import pytest
+import torch
+
+from freeze import freeze_for_inference
+from model_loader import ModelLoader, state_dict_fingerprint
+
+ATOL = 1e-4
+
+
+@pytest.fixture(scope="module")
+def frozen(model_loader):
+    return freeze_for_inference(model_loader.model)
+
+
+@pytest.fixture(scope="module")
+def ocr_tokens(model_loader, batch):
+    """Random OCR token ids with a padded tail, like real OCR"""
+    _, _, ocr = batch
+    vocab = model_loader.model.ocr_emb.num_embeddings
+    tokens = torch.randint(1, vocab, ocr.shape, generator=torch.Generator().manual_seed(0), dtype=ocr.dtype)
+    tokens[:, tokens.shape[1] // 2:] = 0
+    return tokens
+
+
+def test_frozen_matches_original_without_ocr(model_loader, frozen, batch):
+    img, edge, ocr = batch
+    with torch.no_grad():
+        torch.testing.assert_close(frozen(img, edge, ocr), model_loader.model(img, edge, ocr), atol=ATOL, rtol=0)
+
+
+def test_frozen_matches_original_with_ocr_tokens(model_loader, frozen, batch, ocr_tokens):
+    img, edge, _ = batch
+    with torch.no_grad():
+        torch.testing.assert_close(
+            frozen(img, edge, ocr_tokens), model_loader.model(img, edge, ocr_tokens), atol=ATOL, rtol=0
+        )
+
+
+def test_freezing_leaves_the_original_untouched(model_loader, frozen):
+    assert any(isinstance(m, torch.nn.BatchNorm2d) for m in model_loader.model.modules())
+
+
+def test_frozen_loader_keeps_the_checkpoint_fingerprint(model_loader):
+    torch.manual_seed(0)
+    loader = ModelLoader(None, freeze=True)
+    assert loader.frozen
+    assert loader.fingerprint == model_loader.fingerprint
+    assert loader.refresh_fingerprint() == model_loader.fingerprint
+    assert state_dict_fingerprint(loader.model.state_dict()) != model_loader.fingerprint
+
+
+@pytest.fixture(scope="module")
+def mixed_ocr(batch, ocr_tokens):
+    """Batch whose first rows carry OCR tokens and the rest none"""
+    _, _, ocr = batch
+    mixed = ocr.clone()
+    mixed[:2] = ocr_tokens[:2]
+    return mixed
+
+
+@pytest.mark.parametrize("name", ["torchscript", "onnx"])
+def test_exported_frozen_model_keeps_ocr_tokens(name, model_loader, frozen, batch, mixed_ocr, tmp_path):
+    from backends import create_backend, export_onnx
+
+    if name == "onnx":
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+        artifact = tmp_path / "frozen.onnx"
+        export_onnx(frozen, artifact)
+        backend = create_backend("onnx", frozen, artifact=artifact)
+    else:
+        # Traced on the default all-zero OCR example input
+        backend = create_backend("torchscript", frozen)
+    img, edge, ocr = batch
+    with torch.no_grad():
+        for tokens in (ocr, mixed_ocr):
+            torch.testing.assert_close(backend(img, edge, tokens), model_loader.model(img, edge, tokens),
+                                       atol=ATOL, rtol=0)
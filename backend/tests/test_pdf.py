@@ -0,0 +1,56 @@
+"""PDF page ranges and early-stop options (python -m pytest tests)"""
+
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+import pdf_inference
+import pdf_to_images
+from pdf_inference import PageRangeError, run_pdf_prediction
+
+
+@pytest.fixture(scope="module")
+def pdf():
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 80), (255, 255, 255)).save(buf, format="PDF")
+    return buf.getvalue()
+
+
+def test_iter_pdf_pages_uses_the_given_page_count(monkeypatch):
+    def pdfinfo(path):
+        raise AssertionError("page count already known")
+
+    rendered = []
+
+    def convert(path, first_page, last_page, size):
+        rendered.append(first_page)
+        return [Image.new("L", (8, 8))]
+
+    monkeypatch.setattr(pdf_to_images, "count_pdf_pages", pdfinfo)
+    monkeypatch.setattr(pdf_to_images, "convert_from_path", convert)
+    pages = list(pdf_to_images.iter_pdf_pages("doc.pdf", first_page=2, last_page=9, total_pages=3))
+    assert [number for number, _ in pages] == [2, 3] == rendered
+
+
+@pytest.mark.parametrize("first_page, last_page", [(0, None), (None, 0), (3, 2), (6, None)])
+def test_pages_outside_the_document_are_rejected(model_loader, monkeypatch, first_page, last_page):
+    monkeypatch.setattr(pdf_inference, "count_pdf_pages", lambda path: 5)
+    with pytest.raises(PageRangeError):
+        asyncio.run(run_pdf_prediction(model_loader, "doc.pdf", first_page=first_page, last_page=last_page))
+
+
+@pytest.mark.parametrize("query", [
+    "stop_threshold=1.5", "stop_threshold=-0.1", "first_page=0", "last_page=0", "last_page=-2",
+])
+def test_invalid_pdf_options_are_400(api, pdf, monkeypatch, query):
+    import main_inference_fixed
+
+    response = api.post(f"/predict_pdf?{query}", files={"file": ("doc.pdf", pdf, "application/pdf")})
+    assert response.status_code == 400
+
+    # Checked before anything is queued
+    monkeypatch.setattr(main_inference_fixed, "job_store", object())
+    response = api.post(f"/jobs?{query}", files={"file": ("doc.pdf", pdf, "application/pdf")})
+    assert response.status_code == 400
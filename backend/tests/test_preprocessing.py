@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from conftest import make_documents
+from preprocessing import Preprocessor, uint8_median
+
+
+def reference_batch(model_loader, images):
+    """Per-image reference path: ModelLoader.transform + extract_edges, stacked"""
+    img = torch.stack([model_loader.transform(image.convert("RGB")) for image in images])
+    edge = torch.stack([model_loader.extract_edges(image.convert("RGB")) for image in images])
+    return img, edge
+
+
+def test_uint8_median_matches_numpy():
+    rng = np.random.default_rng(0)
+    for size in (1, 2, 7, 256 * 256):
+        values = rng.integers(0, 256, size, dtype=np.uint8)
+        assert uint8_median(values) == np.median(values)
+
+
+def test_preprocessor_is_bit_exact(model_loader, documents):
+    ref_img, ref_edge = reference_batch(model_loader, documents)
+    img, edge = Preprocessor(model_loader.img_size)(documents)
+    assert torch.equal(img, ref_img)
+    assert torch.equal(edge, ref_edge)
+
+
+def test_preprocessor_converts_modes(model_loader):
+    images = [image.convert(mode) for image, mode in zip(make_documents(3, seed=1), ("L", "RGBA", "P"))]
+    ref_img, ref_edge = reference_batch(model_loader, images)
+    img, edge = Preprocessor(model_loader.img_size)(images)
+    assert torch.equal(img, ref_img)
+    assert torch.equal(edge, ref_edge)
+
+
+def test_preallocated_output_is_reused(model_loader, documents):
+    preprocessor = Preprocessor(model_loader.img_size)
+    out = preprocessor.allocate(len(documents) + 2)
+    img, edge = preprocessor(documents, out=out)
+    assert img.data_ptr() == out[0].data_ptr()
+    assert edge.data_ptr() == out[1].data_ptr()
+    assert torch.equal(img, preprocessor(documents)[0])
+
+
+def test_prepare_batch_uses_exact_preprocessing(model_loader, documents, batch):
+    ref_img, ref_edge = reference_batch(model_loader, documents)
+    img, edge, ocr = batch
+    assert torch.equal(img, ref_img)
+    assert torch.equal(edge, ref_edge)
+    assert ocr.shape == (len(documents), model_loader.max_ocr_tokens)
+    assert not ocr.any()
+
+
+def test_reused_batch_buffers_are_exact_and_stable(model_loader, documents, batch):
+    img, edge, ocr = model_loader.prepare_batch(documents, reuse=True)
+    host, device, zeros = model_loader.batch_buffers(len(documents))
+    assert img.data_ptr() == device[0].data_ptr() and edge.data_ptr() == device[1].data_ptr()
+    assert ocr.data_ptr() == zeros.data_ptr()
+    for got, expected in zip((img, edge, ocr), batch):
+        assert torch.equal(got, expected)
+
+    # Same batch size: the same tensors are rewritten in place
+    others = make_documents(len(documents), seed=7)
+    again = model_loader.prepare_batch(others, reuse=True)
+    assert again[0].data_ptr() == img.data_ptr()
+    ref_img, ref_edge = reference_batch(model_loader, others)
+    assert torch.equal(again[0], ref_img) and torch.equal(again[1], ref_edge)
+
+    # Another batch size gets its own tensors
+    single = model_loader.prepare_batch(documents[:1], reuse=True)
+    assert single[0].data_ptr() != img.data_ptr()
+    assert torch.equal(single[0], batch[0][:1])
+
+
+def test_predictions_match_with_reused_buffers(model_loader, documents, batch):
+    with torch.no_grad():
+        expected = model_loader.logits_to_predictions(model_loader.backend(*batch))
+    for _ in range(2):
+        assert model_loader.predict_images(documents) == expected
+
+
+def test_shared_resize_only_changes_edges(model_loader, documents):
+    exact_img, _ = Preprocessor(model_loader.img_size)(documents)
+    img, edge = Preprocessor(model_loader.img_size, shared_resize=True)(documents)
+    assert torch.equal(img, exact_img)
+    assert set(edge.unique().tolist()) <= {0.0, 1.0}
+
+
+@pytest.mark.parametrize("size", [(256, 256), (255, 1001)])
+def test_uniform_page_has_no_edges(model_loader, size):
+    img, edge = Preprocessor(model_loader.img_size)([Image.new("RGB", size, (250, 250, 250))])
+    assert not edge.any()
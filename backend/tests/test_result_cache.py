@@ -0,0 +1,99 @@
+"""Result cache tiers, eviction and invalidation (python -m pytest tests)"""
+
+import os
+import time
+
+from result_cache import ResultCache
+
+PREDICTION = {"class_id": 1, "class_name": "copy_move", "confidence": 0.9}
+
+
+def test_memory_hit_and_miss():
+    cache = ResultCache("f" * 64)
+    key = cache.key(b"upload")
+    assert cache.get_prediction(key) is None
+    cache.put_prediction(key, PREDICTION)
+    assert cache.get_prediction(key) == PREDICTION
+    assert cache.get_heatmap(key, "png") is None
+    stats = cache.stats()
+    assert stats["prediction_memory_hits"] == 1
+    assert stats["prediction_misses"] == 1
+    assert stats["heatmap_misses"] == 1
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache("f" * 64, max_entries=2)
+    keys = [cache.key(bytes([i])) for i in range(3)]
+    for key in keys:
+        cache.put_prediction(key, PREDICTION)
+    assert cache.get_prediction(keys[0]) is None
+    assert cache.get_prediction(keys[2]) == PREDICTION
+    assert cache.stats()["prediction_evictions"] == 1
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    cache = ResultCache("f" * 64, disk_dir=tmp_path)
+    key = cache.key(b"upload")
+    cache.put_prediction(key, PREDICTION)
+    cache.put_heatmap(key, "aGVhdG1hcA==", "webp-q80")
+
+    restarted = ResultCache("f" * 64, disk_dir=tmp_path)
+    assert restarted.get_prediction(key) == PREDICTION
+    assert restarted.get_heatmap(key, "webp-q80") == "aGVhdG1hcA=="
+    assert restarted.get_heatmap(key, "png") is None
+    stats = restarted.stats()
+    assert stats["prediction_disk_hits"] == 1 and stats["heatmap_disk_hits"] == 1
+    assert stats["disk_files"] == 2 and stats["disk_bytes"] > 0
+
+
+def test_disk_tier_stays_under_its_budget(tmp_path):
+    heatmap = "x" * 1000
+    cache = ResultCache("f" * 64, max_entries=1, disk_dir=tmp_path, max_disk_bytes=3500)
+    keys = [cache.key(bytes([i])) for i in range(5)]
+    for key in keys:
+        cache.put_heatmap(key, heatmap)
+
+    stats = cache.stats()
+    assert stats["disk_bytes"] <= 3500 and stats["disk_files"] == 3
+    assert stats["heatmap_evictions"] == 4 + 2  # memory: 4, disk: 2
+    files = sorted(p.name for p in tmp_path.rglob("*.heatmap"))
+    assert files == sorted(f"{key}-png.heatmap" for key in keys[2:])
+    assert cache.get_heatmap(keys[0]) is None
+    assert cache.get_heatmap(keys[4]) == heatmap
+
+
+def test_disk_eviction_follows_mtime_across_restarts(tmp_path):
+    cache = ResultCache("f" * 64, max_entries=1, disk_dir=tmp_path)
+    keys = [cache.key(bytes([i])) for i in range(3)]
+    for key in keys:
+        cache.put_heatmap(key, "x" * 1000)
+    # The first file was used most recently
+    newest = next(tmp_path.rglob(f"{keys[0]}-png.heatmap"))
+    now = time.time()
+    os.utime(newest, (now + 10, now + 10))
+
+    restarted = ResultCache("f" * 64, max_entries=1, disk_dir=tmp_path, max_disk_bytes=2500)
+    assert restarted.stats()["disk_files"] == 2
+    assert restarted.get_heatmap(keys[1]) is None
+    assert restarted.get_heatmap(keys[0]) is not None
+
+
+def test_invalidate_drops_memory_and_disk_and_rekeys(tmp_path):
+    cache = ResultCache("f" * 64, disk_dir=tmp_path, config={"backend": "eager"})
+    key = cache.key(b"upload")
+    cache.put_prediction(key, PREDICTION)
+
+    cache.invalidate(config={"backend": "onnx"})
+    assert cache.get_prediction(key) is None
+    assert cache.key(b"upload") != key
+    stats = cache.stats()
+    assert stats["invalidations"] == 1
+    assert stats["disk_files"] == 0 and stats["disk_bytes"] == 0
+    assert not list(tmp_path.rglob("*.prediction"))
+
+
+def test_config_changes_the_keys():
+    a = ResultCache("f" * 64, config={"precision": "fp32"})
+    b = ResultCache("f" * 64, config={"precision": "int8"})
+    assert a.key(b"upload") != b.key(b"upload")
+    assert ResultCache("e" * 64).key(b"upload") != ResultCache("f" * 64).key(b"upload")
@@ -0,0 +1,49 @@
+"""Tiled high-resolution analysis (python -m pytest tests)"""
+
+import numpy as np
+import pytest
+
+from conftest import make_documents
+from tiling import aggregate_scores, analyze_tiled, authentic_class_id
+
+
+@pytest.fixture(scope="module")
+def page():
+    return make_documents(1, seed=5)[0].resize((700, 900))
+
+
+def test_authentic_class_is_looked_up_by_name(model_loader):
+    assert authentic_class_id(model_loader.class_names) == model_loader.class_names.index("positive")
+    assert authentic_class_id(["copy_move", "positive"]) == 1
+    assert authentic_class_id(["copy_move", "inpaint"]) is None
+
+
+def test_max_aggregation_takes_the_weakest_authentic_tile():
+    tile_probs = np.array([[0.9, 0.1], [0.6, 0.4]])
+    np.testing.assert_allclose(aggregate_scores(tile_probs, "max", authentic_class=0), [0.6, 0.4])
+    np.testing.assert_allclose(aggregate_scores(tile_probs, "max", authentic_class=1), [0.9 / 1.0, 0.1 / 1.0])
+
+
+def test_explain_runs_one_class_and_keeps_the_prediction(model_loader, page, monkeypatch):
+    plain = analyze_tiled(model_loader, page, max_tiles=4, min_edge_density=0.0, explain=False)
+
+    explained_classes = []
+    explain = model_loader.explainer.explain
+
+    def explain_spy(inputs, class_idx=None, timings=None):
+        explained_classes.append(class_idx)
+        return explain(inputs, class_idx=class_idx, timings=timings)
+
+    def all_classes(*args, **kwargs):
+        raise AssertionError("tiled Grad-CAM must not explain every class")
+
+    monkeypatch.setattr(model_loader.explainer, "explain", explain_spy)
+    monkeypatch.setattr(model_loader.explainer, "explain_classes", all_classes)
+    result = analyze_tiled(model_loader, page, max_tiles=4, min_edge_density=0.0, batch_size=3, explain=True)
+
+    assert result["prediction"] == plain["prediction"]
+    assert explained_classes == [result["prediction"]["class_id"]] * 2
+    heatmap = result["heatmap"]
+    assert heatmap.shape == (page.height, page.width)
+    assert 0.0 <= heatmap.min() and heatmap.max() <= 1.0
+    assert set(result["timings"]) >= {"predict", "gradcam", "stitch"}
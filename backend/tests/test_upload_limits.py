@@ -0,0 +1,157 @@
+"""Upload validation and body size limits (python -m pytest tests)"""
+
+import asyncio
+import io
+import json
+import struct
+import zlib
+
+import pytest
+from PIL import Image
+
+from upload_limits import BodySizeLimitMiddleware, UploadRejected, inspect_image, read_upload
+
+
+def encode(img, fmt, **kwargs):
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **kwargs)
+    return buf.getvalue()
+
+
+def png_header_only(width, height):
+    """A PNG whose header claims width x height with a tiny (invalid) body: a pixel bomb as far as the header goes"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"\0" * 64)) + chunk(b"IEND", b"")
+
+
+@pytest.fixture(scope="module")
+def png():
+    return encode(Image.new("RGB", (64, 48), (200, 200, 200)), "PNG")
+
+
+def test_valid_image_is_described(png):
+    info = inspect_image(png)
+    assert (info["format"], info["width"], info["height"], info["frames"]) == ("PNG", 64, 48, 1)
+
+
+@pytest.mark.parametrize("data", [b"not an image at all", b"%PDF-1.4\n", b""])
+def test_bad_magic_bytes_are_415(data):
+    with pytest.raises(UploadRejected) as e:
+        inspect_image(data)
+    assert e.value.status_code == 415
+
+
+def test_disallowed_format_is_415():
+    gif = encode(Image.new("P", (8, 8)), "GIF")
+    with pytest.raises(UploadRejected) as e:
+        inspect_image(gif)
+    assert e.value.status_code == 415 and "GIF" in e.value.detail
+
+
+def test_pixel_bomb_header_is_413():
+    data = png_header_only(30000, 30000)
+    assert len(data) < 200
+    with pytest.raises(UploadRejected) as e:
+        inspect_image(data, max_pixels=50_000_000)
+    assert e.value.status_code == 413
+
+
+def test_multi_frame_image_is_413():
+    frames = [Image.new("L", (16, 16), shade) for shade in range(0, 250, 25)]
+    tiff = encode(frames[0], "TIFF", save_all=True, append_images=frames[1:])
+    assert inspect_image(tiff, max_frames=10)["frames"] == 10
+    with pytest.raises(UploadRejected) as e:
+        inspect_image(tiff, max_frames=4)
+    assert e.value.status_code == 413
+
+
+def test_read_upload_stops_past_the_limit():
+    class Upload:
+        reads = 0
+
+        async def read(self, size):
+            self.reads += 1
+            return b"x" * size
+
+    upload = Upload()
+    with pytest.raises(UploadRejected) as e:
+        asyncio.run(read_upload(upload, max_bytes=10_000, chunk_size=4096))
+    assert e.value.status_code == 413
+    assert upload.reads == 3
+
+
+def run_middleware(headers, chunks, limit=1000):
+    """Run BodySizeLimitMiddleware around an app that reads the whole body; returns (status, messages read)"""
+    received = []
+
+    async def app(scope, receive, send):
+        while True:
+            message = await receive()
+            if not message.get("more_body"):
+                break
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def receive():
+        body = chunks[len(received)]
+        received.append(body)
+        return {"type": "http.request", "body": body, "more_body": len(received) < len(chunks)}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": "/predict", "headers": headers}
+    asyncio.run(BodySizeLimitMiddleware(app, default_limit=limit)(scope, receive, send))
+    return sent[0]["status"], len(received), sent
+
+
+def test_content_length_over_the_limit_is_413_before_reading():
+    status, reads, sent = run_middleware([(b"content-length", b"5000")], [b"x" * 5000])
+    assert status == 413 and reads == 0
+    assert "limit" in json.loads(sent[1]["body"])["detail"]
+
+
+def test_streaming_body_over_the_limit_is_413_without_reading_the_rest():
+    status, reads, _ = run_middleware([], [b"x" * 400] * 10)
+    assert status == 413 and reads == 3
+
+
+def test_body_under_the_limit_passes():
+    status, reads, _ = run_middleware([(b"content-length", b"800")], [b"x" * 400] * 2)
+    assert status == 200 and reads == 2
+
+
+def test_predict_trusts_the_bytes_not_the_content_type(api, png):
+    response = api.post("/predict?gradcam=false", files={"file": ("scan.png", png, "application/octet-stream")})
+    assert response.status_code == 200
+    assert "prediction" in response.json()
+
+
+def test_predict_without_a_part_content_type(api, png):
+    body = (
+        b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"scan.png\"\r\n\r\n"
+        + png + b"\r\n--b--\r\n"
+    )
+    response = api.post("/predict?gradcam=false", content=body,
+                        headers={"content-type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 200
+
+
+def test_predict_rejects_non_images_from_their_bytes(api):
+    response = api.post("/predict", files={"file": ("scan.png", b"plain text", "image/png")})
+    assert response.status_code == 415
+
+
+def test_predict_rejects_pixel_bombs(api):
+    response = api.post("/predict", files={"file": ("bomb.png", png_header_only(30000, 30000), "image/png")})
+    assert response.status_code == 413
+
+
+def test_predict_rejects_oversized_uploads(api):
+    data = b"\x89PNG\r\n\x1a\n" + b"\0" * (2 * 1024 * 1024)
+    response = api.post("/predict", files={"file": ("big.png", data, "image/png")})
+    assert response.status_code == 413
@@ -0,0 +1,225 @@
+import logging
+import time
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Class that means "no forgery" (looked up in model_loader.class_names); every other class is forgery evidence
+AUTHENTIC_CLASS_NAME = "positive"
+
+
+def authentic_class_id(class_names):
+    """Index of the no-forgery class in `class_names`, or None if the model has none"""
+    return class_names.index(AUTHENTIC_CLASS_NAME) if AUTHENTIC_CLASS_NAME in class_names else None
+
+
+def tile_boxes(width, height, tile, overlap):
+    """
+    Overlapping tile grid covering a page.
+
+    Args:
+        width, height: page size in pixels
+        tile: tile side in pixels
+        overlap: fraction of a tile shared with its neighbour (0 <= overlap < 1)
+
+    Returns:
+        list of (left, top, right, bottom) boxes; the last row / column is
+        shifted back to end on the page border, and a page smaller than a
+        tile is a single (smaller) box
+    """
+    stride = max(1, int(round(tile * (1 - overlap))))
+
+    def starts(length):
+        if length <= tile:
+            return [0]
+        positions = list(range(0, length - tile + 1, stride))
+        if positions[-1] != length - tile:
+            positions.append(length - tile)
+        return positions
+
+    return [
+        (left, top, min(left + tile, width), min(top + tile, height))
+        for top in starts(height)
+        for left in starts(width)
+    ]
+
+
+def edge_density(gray, boxes):
+    """
+    Fraction of Canny edge pixels inside each box, from one edge map of the
+    whole page and its integral image (O(1) per tile).
+    """
+    median = np.median(gray)
+    edges = cv2.Canny(gray, int(max(0, 0.7 * median)), int(min(255, 1.3 * median)))
+    integral = cv2.integral((edges > 0).astype(np.uint8))
+    return np.array([
+        (integral[b, r] - integral[t, r] - integral[b, l] + integral[t, l]) / max(1, (r - l) * (b - t))
+        for l, t, r, b in boxes
+    ])
+
+
+def aggregate_scores(tile_probs, method="max", authentic_class=None):
+    """
+    Page-level class probabilities from per-tile probabilities.
+
+    "max": a forgery anywhere on the page counts, so every forgery class
+    takes its strongest tile and the authentic class its weakest tile
+    before renormalizing. "mean": plain average (dilutes small forgeries).
+
+    Args:
+        tile_probs: (N, num_classes) array
+        method: "max" or "mean"
+        authentic_class: index of the no-forgery class (None = every class is a forgery class)
+
+    Returns:
+        (num_classes,) array summing to 1
+    """
+    if method == "mean":
+        return tile_probs.mean(axis=0)
+    if method != "max":
+        raise ValueError(f"Unknown tile aggregation {method!r}; expected 'max' or 'mean'")
+    scores = tile_probs.max(axis=0)
+    if authentic_class is not None:
+        scores[authentic_class] = tile_probs[:, authentic_class].min()
+    return scores / scores.sum()
+
+
+def _blend_window(size):
+    """2-D weight that fades towards tile borders, so overlaps blend smoothly"""
+    ramp = np.hanning(size + 2)[1:-1].astype(np.float32)
+    return np.outer(ramp, ramp)
+
+
+def analyze_tiled(model_loader, page, scale=1.0, overlap=0.25, max_tiles=32, min_edge_density=0.02,
+                  batch_size=8, aggregation="max", explain=True):
+    """
+    Tiled high-resolution inference for one page.
+
+    The page is scaled by `scale` and cut into overlapping tiles of the
+    model's input size, so small details keep their native resolution
+    instead of being squashed into a 256px thumbnail. Near-blank tiles are
+    skipped using the edge density of one page-wide Canny map, and at
+    most `max_tiles` tiles (the most detailed ones) are analyzed. Tiles run
+    through the inference backend in batches and their scores are
+    aggregated into the page prediction. With `explain` the analyzed tiles
+    then go through the Grad-CAM explainer for the page-level class only
+    (one backward per batch); each tile's map is weighted by that tile's
+    probability for the class and stitched into one page heatmap.
+
+    Args:
+        model_loader: ModelLoader
+        page: PIL Image (decoded at high resolution)
+        scale: resize factor applied to `page` before tiling
+        overlap: fraction of overlap between neighbouring tiles
+        max_tiles: tile budget per page (bounds latency)
+        min_edge_density: tiles with fewer edge pixels are treated as blank
+        batch_size: tiles per forward pass
+        aggregation: "max" or "mean" (see aggregate_scores)
+        explain: also build the stitched Grad-CAM heatmap
+
+    Returns:
+        dict with keys:
+            - prediction: page-level prediction dict (class_id, class_name, confidence, scores)
+            - heatmap: (H, W) float array in [0, 1] at the scaled page size, or None
+            - tiles: grid / blank / capped / analyzed counts and the strongest tiles
+            - timings: seconds per stage
+    """
+    timings = {}
+    start = time.perf_counter()
+    if page.mode != "RGB":
+        page = page.convert("RGB")
+    if scale != 1.0:
+        page = page.resize((max(1, round(page.width * scale)), max(1, round(page.height * scale))),
+                           Image.BILINEAR)
+    tile = model_loader.img_size
+    boxes = tile_boxes(page.width, page.height, tile, overlap)
+    density = edge_density(np.asarray(page.convert("L")), boxes)
+
+    candidates = [i for i in np.argsort(-density) if density[i] >= min_edge_density]
+    blank = len(boxes) - len(candidates)
+    kept = sorted(candidates[:max_tiles])
+    capped = len(candidates) - len(kept)
+    timings["tiling"] = time.perf_counter() - start
+    logger.info(
+        f"Tiled page {page.width}x{page.height}: {len(boxes)} tiles, {blank} blank, "
+        f"{capped} over the cap, {len(kept)} analyzed"
+    )
+
+    tile_info = {
+        "scale": scale,
+        "tile_size": tile,
+        "overlap": overlap,
+        "page_size": [page.width, page.height],
+        "grid": len(boxes),
+        "blank": blank,
+        "capped": capped,
+        "analyzed": len(kept),
+    }
+    if not kept:
+        # Nothing but whitespace: fall back to the whole page
+        prediction = model_loader.predict_images([page])[0]
+        heatmap = np.zeros((page.height, page.width), dtype=np.float32) if explain else None
+        timings["total"] = time.perf_counter() - start
+        return {"prediction": prediction, "heatmap": heatmap, "tiles": {**tile_info, "top": []},
+                "timings": timings}
+
+    crops = [page.crop(boxes[i]) for i in kept]
+    start_predict = time.perf_counter()
+    batches = [model_loader.prepare_batch(crops[offset:offset + batch_size])
+               for offset in range(0, len(crops), batch_size)]
+    logits = [model_loader.backend(*inputs) for inputs in batches]
+    tile_probs = torch.softmax(torch.cat(logits).float(), dim=1).cpu().numpy()
+    timings["predict"] = time.perf_counter() - start_predict
+
+    page_scores = aggregate_scores(tile_probs, aggregation, authentic_class_id(model_loader.class_names))
+    class_id = int(page_scores.argmax())
+    prediction = {
+        "class_id": class_id,
+        "class_name": model_loader.class_names[class_id],
+        "confidence": float(page_scores[class_id]),
+        "scores": page_scores.tolist(),
+        "aggregation": aggregation,
+    }
+
+    strongest = np.argsort(-tile_probs[:, class_id])[:5]
+    tile_info["top"] = [
+        {
+            "box": list(boxes[kept[i]]),
+            "class_name": model_loader.class_names[int(tile_probs[i].argmax())],
+            "score": float(tile_probs[i, class_id]),
+        }
+        for i in strongest
+    ]
+
+    heatmap = None
+    if explain:
+        start_gradcam = time.perf_counter()
+        tile_maps = np.concatenate([
+            model_loader.explainer.explain(inputs, class_idx=class_id)[2] for inputs in batches
+        ])
+        timings["gradcam"] = time.perf_counter() - start_gradcam
+
+        start_stitch = time.perf_counter()
+        accumulated = np.zeros((page.height, page.width), dtype=np.float32)
+        weights = np.zeros((page.height, page.width), dtype=np.float32)
+        window = _blend_window(tile)
+        for index, tile_map in enumerate(tile_maps):
+            left, top, right, bottom = boxes[kept[index]]
+            w, h = right - left, bottom - top
+            if (h, w) != tile_map.shape:
+                tile_map = cv2.resize(tile_map, (w, h))
+            blend = window if (h, w) == window.shape else cv2.resize(window, (w, h))
+            accumulated[top:bottom, left:right] += blend * tile_map * tile_probs[index, class_id]
+            weights[top:bottom, left:right] += blend
+        heatmap = np.divide(accumulated, weights, out=np.zeros_like(accumulated), where=weights > 0)
+        peak = heatmap.max()
+        if peak > 0:
+            heatmap /= peak
+        timings["stitch"] = time.perf_counter() - start_stitch
+
+    timings["total"] = time.perf_counter() - start
+    return {"prediction": prediction, "heatmap": heatmap, "tiles": tile_info, "timings": timings}
@@ -0,0 +1,240 @@
+import json
+import logging
+import warnings
+from io import BytesIO
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the image formats uploads may use (WEBP is RIFF....WEBP)
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+    (b"BM", "BMP"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+)
+DEFAULT_IMAGE_FORMATS = ("JPEG", "PNG", "TIFF", "WEBP", "BMP")
+
+# PIL's own decompression-bomb warning threshold (~89.5 MP, e.g. A4 at ~1000 DPI)
+DEFAULT_MAX_PIXELS = Image.MAX_IMAGE_PIXELS
+# Only the first frame is analyzed; more than this is not a document scan
+DEFAULT_MAX_FRAMES = 64
+
+# A PDF header may be preceded by up to this many bytes of junk
+PDF_HEADER_WINDOW = 1024
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadRejected(Exception):
+    """Upload refused before any decoding (status_code: HTTP status to answer with)"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _too_large(max_bytes):
+    return UploadRejected(413, f"Upload exceeds the {max_bytes / 2**20:.0f} MB limit")
+
+
+def sniff_image_format(head):
+    """Image format from the first bytes of a file, or None if unrecognized"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for signature, fmt in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return fmt
+    return None
+
+
+def is_pdf(head):
+    """Whether the first bytes of a file carry a PDF header"""
+    return b"%PDF-" in head[:PDF_HEADER_WINDOW]
+
+
+def inspect_image(data, allowed_formats=DEFAULT_IMAGE_FORMATS, max_pixels=DEFAULT_MAX_PIXELS,
+                  max_frames=DEFAULT_MAX_FRAMES):
+    """
+    Validate an encoded image from its magic bytes and header only.
+
+    Image.open only parses the header, so dimensions, mode and frame
+    count are known before any pixel is decoded; decompression bombs
+    (a few KB of PNG that inflate to gigabytes) and oversized scans are
+    refused at that point.
+
+    Args:
+        data: encoded image bytes
+        allowed_formats: accepted formats (sniffed, not the client's Content-Type)
+        max_pixels: width * height limit
+        max_frames: frame / page limit (multi-page TIFF, animated GIF / WEBP)
+
+    Returns:
+        dict with format, width, height, mode, frames, pixels
+
+    Raises:
+        UploadRejected: 415 for unknown or disallowed formats, 400 for a
+        corrupt header, 413 for too many pixels or frames
+    """
+    fmt = sniff_image_format(data[:16])
+    if fmt is None:
+        raise UploadRejected(415, "Unrecognized image format")
+    if fmt not in allowed_formats:
+        raise UploadRejected(415, f"{fmt} images are not accepted (allowed: {', '.join(allowed_formats)})")
+
+    try:
+        with warnings.catch_warnings():
+            # Size is checked against max_pixels below
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            img = Image.open(BytesIO(data))
+            width, height = img.size
+            frames = getattr(img, "n_frames", 1)
+    except Image.DecompressionBombError as e:
+        raise UploadRejected(413, f"Image rejected as a decompression bomb: {e}")
+    except Exception as e:
+        raise UploadRejected(400, f"Corrupt {fmt} image header: {e}")
+
+    pixels = width * height
+    if pixels > max_pixels:
+        raise UploadRejected(
+            413, f"Image is {width}x{height} ({pixels / 1e6:.1f} MP); the limit is {max_pixels / 1e6:.1f} MP"
+        )
+    if frames > max_frames:
+        raise UploadRejected(413, f"Image has {frames} frames; the limit is {max_frames}")
+    return {"format": fmt, "width": width, "height": height, "mode": img.mode, "frames": frames, "pixels": pixels}
+
+
+async def read_upload(upload, max_bytes, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Read an UploadFile in chunks, failing as soon as it exceeds max_bytes.
+
+    Raises:
+        UploadRejected: 413 when the upload is larger than max_bytes
+    """
+    buffer = bytearray()
+    while chunk := await upload.read(chunk_size):
+        buffer += chunk
+        if len(buffer) > max_bytes:
+            raise _too_large(max_bytes)
+    return bytes(buffer)
+
+
+async def copy_pdf_upload(upload, fileobj, max_bytes, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Stream an UploadFile into fileobj, checking the PDF header on the
+    first chunk and the size on every chunk.
+
+    Returns:
+        number of bytes written
+
+    Raises:
+        UploadRejected: 415 if it is not a PDF, 413 past max_bytes
+    """
+    written = 0
+    while chunk := await upload.read(chunk_size):
+        if written == 0 and not is_pdf(chunk):
+            raise UploadRejected(415, "File is not a PDF (no %PDF- header)")
+        written += len(chunk)
+        if written > max_bytes:
+            raise _too_large(max_bytes)
+        fileobj.write(chunk)
+    if written == 0:
+        raise UploadRejected(400, "Empty upload")
+    return written
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class BodySizeLimitMiddleware:
+    """
+    ASGI middleware enforcing a request body limit per path.
+
+    A Content-Length over the limit is answered with 413 before any of the
+    body is read. Otherwise bytes are counted as the application receives
+    them, and the request fails with 413 as soon as the limit is crossed
+    (chunked uploads included), so an oversized upload is never fully
+    buffered or spooled to disk by the multipart parser.
+    """
+
+    def __init__(self, app, limits=None, default_limit=None):
+        """
+        Args:
+            app: ASGI application
+            limits: dict of exact path -> max body bytes (None = unlimited)
+            default_limit: max body bytes for other paths (None = unlimited)
+        """
+        self.app = app
+        self.limits = dict(limits or {})
+        self.default_limit = default_limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        limit = self.limits.get(scope["path"], self.default_limit)
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = None
+                if declared is not None and declared > limit:
+                    logger.warning(f"Rejected {scope['path']}: Content-Length {declared} over {limit} bytes")
+                    return await self._reject(send, limit)
+                break
+
+        received = 0
+        exceeded = False
+        started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if exceeded:
+                # Whatever the app answers to its truncated body (400, 500) becomes a 413
+                if message["type"] == "http.response.start" and not started:
+                    started = True
+                    await self._reject(send, limit)
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # _BodyTooLarge, or whatever the app wrapped it in
+            if not exceeded:
+                raise
+        if exceeded:
+            logger.warning(f"Rejected {scope['path']}: body over {limit} bytes")
+            if not started:
+                await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send, limit):
+        body = json.dumps({"detail": f"Request body exceeds the {limit / 2**20:.0f} MB limit"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})